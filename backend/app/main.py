@@ -1,13 +1,35 @@
+from app.utils.startup_profile import startup_profile
 from fastapi import FastAPI
-from app.routes import (
-    products_routes,
-    consumptionPredictor_routes,  # Esta es tu nueva ruta
-    productivityEstimation_routes,
-    data_routes,
-    expirationDateManagement_routes
-)
 
-app = FastAPI(title="GateGroup Hack Backend")
+with startup_profile.stage("import_routes"):
+    from app.routes import (
+        products_routes,
+        consumptionPredictor_routes,  # Esta es tu nueva ruta
+        productivityEstimation_routes,
+        data_routes,
+        expirationDateManagement_routes,
+        screenBundles_routes,
+        health_routes,
+        metrics_routes,
+        profiling_routes,
+        changes_routes
+    )
+from app.utils.http_cache import conditional_cache_middleware
+from app.utils.compression_cache import compression_cache_middleware
+from app.utils.metrics import metrics_middleware, TimedJSONResponse
+from app.utils.profiling import profiling_middleware
+
+app = FastAPI(title="GateGroup Hack Backend", default_response_class=TimedJSONResponse)
+
+# El último middleware registrado es el más externo: primero se resuelven
+# los 304 y después se sirven los cuerpos precomprimidos
+app.middleware("http")(compression_cache_middleware)
+# ETag / Last-Modified / 304 según la versión de los datasets
+app.middleware("http")(conditional_cache_middleware)
+# Perfilado opcional (PROFILING_ENABLED): quita los headers de caché para que el endpoint corra
+app.middleware("http")(profiling_middleware)
+# Métricas por ruta: el más externo, así también cuenta los 304 y los cuerpos precomprimidos
+app.middleware("http")(metrics_middleware)
 
 # Registrar routers
 app.include_router(products_routes.router)
@@ -15,6 +37,17 @@ app.include_router(consumptionPredictor_routes.router)  # Agrega esta línea
 app.include_router(productivityEstimation_routes.router)
 app.include_router(data_routes.router)
 app.include_router(expirationDateManagement_routes.router)
+app.include_router(screenBundles_routes.router)
+app.include_router(health_routes.router)
+app.include_router(metrics_routes.router)
+app.include_router(profiling_routes.router)
+app.include_router(changes_routes.router)
+
+startup_profile.mark("app_created")
+
+@app.on_event("startup")
+async def mark_startup_complete():
+    startup_profile.mark("startup_complete")
 
 @app.get("/")
 def root():
@@ -1 +1 @@
-from . import expirationDateManagement_routes, consumptionPredictor_routes, productivityEstimation_routes, data_routes
+from . import expirationDateManagement_routes, consumptionPredictor_routes, productivityEstimation_routes, data_routes, products_routes, screenBundles_routes, health_routes, metrics_routes, profiling_routes
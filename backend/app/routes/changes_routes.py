@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from app.utils.changelog import change_log
+# Los routers de datos registran sus entidades (products, flights, sessions) al importarse
+from app.routes import products_routes, data_routes, productivityEstimation_routes
+
+router = APIRouter(prefix="/changes", tags=["Change Data Capture"])
+
+MAX_LIMIT = 10000
+
+@router.get("")
+def get_changes(
+    since: Optional[int] = Query(None, description="Último número de secuencia ya aplicado por el cliente"),
+    entities: Optional[str] = Query(None, description="Entidades separadas por coma (products, flights, sessions)"),
+    limit: int = Query(1000, ge=1, le=MAX_LIMIT, description="Máximo de cambios por respuesta")
+):
+    """
+    Cambios (insert, update, delete) con secuencia mayor a `since`, en orden.
+    Sin `since` devuelve solo el cursor actual: el cliente carga los datasets
+    completos y desde ahí sincroniza de forma incremental con next_since.
+    Las entidades en reset_required deben recargarse completas.
+    """
+    try:
+        names = [name.strip() for name in entities.split(",") if name.strip()] if entities else None
+        unknown = [name for name in names or [] if name not in change_log.entities()]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Entidades desconocidas: {unknown}. Disponibles: {change_log.entities()}"
+            )
+
+        # Recarga (y captura) las entidades cuyos datasets cambiaron desde la última vez
+        change_log.refresh(names)
+
+        if since is None:
+            latest = change_log.latest_seq()
+            return {
+                "since": None,
+                "next_since": latest,
+                "latest_seq": latest,
+                "has_more": False,
+                "reset_required": names or change_log.entities(),
+                "changes": []
+            }
+        return change_log.since(since, names, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@router.get("/stats")
+def get_change_log_stats():
+    """
+    Tamaño del registro de cambios y estado de cada entidad
+    """
+    return change_log.stats()
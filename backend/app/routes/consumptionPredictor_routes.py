@@ -1,31 +1,36 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Body
 import pandas as pd
 import os
-from typing import Dict, Any, List, Optional
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-import joblib
+from typing import Dict, Any, List, Optional, Tuple
 import numpy as np
+from app.utils.utils import get_data_path
+from app.utils.http_cache import bump_version
+from app.utils.singleflight import single_flight
+from app.utils.metrics import time_stage, timed_stage, time_inference
+from app.utils.warmup import model_warmup
+from app.services.featureStore_service import get_feature_store, ingest_live_records, route_key
+from app.services.consumptionPipeline_service import FEATURE_SETS, TARGET_COLUMNS, build_training_frame, consumption_pipeline
+from app.services.forestQuantiles_service import ForestQuantiles, parse_quantiles, quantile_key
+from app.services.loadingOptimizer_service import optimize_schedule
+from app.services.wasteSimulator_service import DEFAULT_POLICIES, MAX_WORKERS, load_network, parse_policies, run_simulation, shutdown_pool
 
 router = APIRouter(prefix="/prediction", tags=["Food Consumption Prediction"])
 
 # Variables globales para el modelo
 rf_model = None
+rich_model = None
 model_trained = False
+training_reports: Dict[str, Dict[str, Any]] = {}
+# Tabla de nodos de cada bosque para los intervalos de predicción
+forest_quantiles: Dict[str, ForestQuantiles] = {}
 
+@single_flight("prediction:products", datasets=['products_data_augmented.csv'])
 def load_food_consumption_data() -> pd.DataFrame:
     """
     Carga los datos de consumo de alimentos desde el archivo CSV
     """
     try:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        app_dir = os.path.dirname(current_dir)  # Salir de routes a app
-        backend_dir = os.path.dirname(app_dir)  # Salir de app a backend
-        project_root = os.path.dirname(backend_dir)  # Salir de backend al root del proyecto
-        data_dir = os.path.join(project_root, 'data')  # Entrar a data
-        
-        csv_path = os.path.join(data_dir, 'products_data_augmented.csv')
-        csv_path = os.path.abspath(csv_path)
+        csv_path = get_data_path('products_data_augmented.csv')
         
         print(f"Buscando archivo de datos de consumo en: {csv_path}")
         print(f"¿Existe el archivo?: {os.path.exists(csv_path)}")
@@ -34,7 +39,8 @@ def load_food_consumption_data() -> pd.DataFrame:
             raise FileNotFoundError(f"Archivo no encontrado: {csv_path}")
         
         # Leer el CSV
-        df = pd.read_csv(csv_path)
+        with time_stage("csv_load", "products_data_augmented.csv"):
+            df = pd.read_csv(csv_path)
         print(f"CSV de consumo leído correctamente. Filas: {len(df)}")
         print(f"Columnas: {df.columns.tolist()}")
         
@@ -45,57 +51,205 @@ def load_food_consumption_data() -> pd.DataFrame:
         print(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
-def train_prediction_model():
+@single_flight("prediction:flights", datasets=['flight_data.csv'])
+def load_flight_schedule_data() -> pd.DataFrame:
     """
-    Entrena el modelo de predicción de consumo de alimentos
+    Carga el calendario de salidas desde flight_data.csv
     """
-    global rf_model, model_trained
+    try:
+        csv_path = get_data_path('flight_data.csv')
+
+        if not os.path.exists(csv_path):
+            raise FileNotFoundError(f"Archivo no encontrado: {csv_path}")
+
+        with time_stage("csv_load", "flight_data.csv"):
+            df = pd.read_csv(csv_path)
+        print(f"CSV de vuelos leído correctamente. Filas: {len(df)}")
+
+        return df
+
+    except Exception as e:
+        error_msg = f"Error leyendo CSV de vuelos: {str(e)}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@single_flight("prediction:past_flights", datasets=['pastFlights_data.csv'])
+def load_past_flights_data() -> pd.DataFrame:
+    """
+    Carga el historial de consumo por vuelo y producto desde pastFlights_data.csv
+    """
+    try:
+        csv_path = get_data_path('pastFlights_data.csv')
+
+        if not os.path.exists(csv_path):
+            raise FileNotFoundError(f"Archivo no encontrado: {csv_path}")
+
+        with time_stage("csv_load", "pastFlights_data.csv"):
+            df = pd.read_csv(csv_path)
+        print(f"CSV de historial de vuelos leído correctamente. Filas: {len(df)}")
+
+        return df
+
+    except Exception as e:
+        error_msg = f"Error leyendo CSV de historial de vuelos: {str(e)}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@single_flight("prediction:product_prices", datasets=['products_data.csv'])
+def load_product_prices() -> pd.DataFrame:
+    """
+    Costo, precio al consumidor y reutilización por producto desde products_data.csv
+    """
+    try:
+        csv_path = get_data_path('products_data.csv')
+
+        if not os.path.exists(csv_path):
+            raise FileNotFoundError(f"Archivo no encontrado: {csv_path}")
+
+        with time_stage("csv_load", "products_data.csv"):
+            df = pd.read_csv(csv_path, usecols=['product_id', 'unit_cost', 'precio_consumidor', 'reusable'])
+        print(f"CSV de precios de productos leído correctamente. Filas: {len(df)}")
+
+        return df.drop_duplicates('product_id').set_index('product_id')
+
+    except Exception as e:
+        error_msg = f"Error leyendo CSV de precios de productos: {str(e)}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@timed_stage("enrichment")
+def build_item_costs(items: pd.DataFrame, default_margin: float) -> pd.DataFrame:
+    """
+    Costo unitario, precio de venta y si el producto es reutilizable para cada
+    fila vuelo x producto. El precio sale de products_data.csv; si el producto no
+    está, del costo y el margen histórico (profit_margin) del historial, y si
+    tampoco hay margen, del costo con default_margin.
+    """
+    history = load_past_flights_data()
+    by_product = history.groupby('product_id').agg(
+        unit_cost=('unit_cost', 'mean'),
+        profit_margin=('profit_margin', 'mean'),
+        reusable=('is_reusable', 'first')
+    )
+    prices = load_product_prices()
+
+    product_ids = items['product_id']
+    unit_cost = product_ids.map(prices['unit_cost']).fillna(product_ids.map(by_product['unit_cost']))
+    margin = product_ids.map(by_product['profit_margin']).fillna(default_margin)
+    listed_price = product_ids.map(prices['precio_consumidor'])
+    price = listed_price.fillna(unit_cost * (1 + margin / 100))
+    reusable = product_ids.map(prices['reusable']).fillna(product_ids.map(by_product['reusable']))
+
+    return pd.DataFrame({
+        'unit_cost': unit_cost.fillna(0).to_numpy(),
+        'price': price.fillna(0).to_numpy(),
+        'reusable': reusable.astype(str).str.lower().eq('true').to_numpy(),
+        'price_source': np.where(listed_price.notna(), 'catalog', 'margin')
+    }, index=items.index)
+
+@timed_stage("enrichment")
+def build_catering_plan_items(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                              with_rates: bool = True) -> pd.DataFrame:
+    """
+    Une las salidas del rango de fechas con el historial de productos.
+    Devuelve una fila por vuelo x producto con las features del modelo.
+    Con with_rates=False no se consultan las tasas del feature store.
+    """
+    flights = load_flight_schedule_data()
+    departure_dates = pd.to_datetime(flights['departure_date'], errors='coerce')
+
+    mask = pd.Series(True, index=flights.index)
+    if start_date:
+        mask &= departure_dates >= pd.Timestamp(start_date)
+    if end_date:
+        mask &= departure_dates <= pd.Timestamp(end_date)
+    flights = flights[mask]
+
+    history = load_past_flights_data().rename(columns={'quantity_returned': 'units_returned'})
+    history_columns = ['product_id', 'product_name', 'product_category', 'standard_quantity', 'units_returned']
+
+    # Historial propio de cada vuelo (promedio si el vuelo se repite en el historial)
+    flight_history = (
+        history.groupby(['flight_id', 'product_id'], as_index=False)
+        .agg(product_name=('product_name', 'first'),
+             product_category=('product_category', 'first'),
+             standard_quantity=('standard_quantity', 'mean'),
+             units_returned=('units_returned', 'mean'))
+    )
+    flight_columns = ['flight_id', 'airline', 'aircraft', 'origin', 'destination', 'departure_date']
+    own = flights[flight_columns].merge(flight_history, on='flight_id', how='inner')
+    own['history_source'] = 'flight'
+
+    # Vuelos sin historial propio: usar el promedio de la aerolínea por producto
+    missing = flights[~flights['flight_id'].isin(flight_history['flight_id'])]
+    if not missing.empty:
+        airline_history = (
+            history.groupby(['airline', 'product_id'], as_index=False)
+            .agg(product_name=('product_name', 'first'),
+                 product_category=('product_category', 'first'),
+                 standard_quantity=('standard_quantity', 'mean'),
+                 units_returned=('units_returned', 'mean'))
+        )
+        fallback = missing[flight_columns].merge(airline_history, on='airline', how='inner')
+        fallback['history_source'] = 'airline'
+        own = pd.concat([own, fallback], ignore_index=True)
+
+    if not with_rates:
+        return own[flight_columns + ['history_source'] + history_columns]
+
+    # Tasas históricas del feature store, unidas por nivel de agregación (del más específico al más general)
+    meal_by_flight = history.drop_duplicates('flight_id').set_index('flight_id')['meal_service_type']
+    store = get_feature_store(load_past_flights_data)
+    routes = own[['origin', 'destination']].drop_duplicates()
+    routes['route'] = [route_key(origin, destination) for origin, destination in zip(routes['origin'], routes['destination'])]
+    keys = own[['origin', 'destination', 'aircraft', 'product_id']].merge(routes, on=['origin', 'destination'], how='left')
+    keys['meal_service_type'] = own['flight_id'].map(meal_by_flight).to_numpy()
+    rates = store.lookup_frame(keys, ['consumption_rate_rolling_mean', 'waste_rate_rolling_mean'])
+    own['consumption_rate'] = rates['consumption_rate_rolling_mean'].to_numpy()
+    own['waste_rate'] = rates['waste_rate_rolling_mean'].to_numpy()
+
+    return own[flight_columns + ['history_source'] + history_columns + ['consumption_rate', 'waste_rate']]
+
+def train_prediction_model(feature_set: str = "basic", n_jobs: Optional[int] = None, measure_size: bool = False):
+    """
+    Entrena el modelo de predicción de consumo de alimentos.
+    feature_set="basic" reemplaza el modelo que usan /predict y /catering-plan;
+    feature_set="rich" entrena el modelo con features de vuelo y producto.
+    """
+    global rf_model, rich_model, model_trained
     
     try:
-        print("Iniciando entrenamiento del modelo de predicción...")
+        print(f"Iniciando entrenamiento del modelo de predicción ({feature_set})...")
         df = load_food_consumption_data()
         
-        # Verificar que las columnas necesarias existan
-        required_columns = ['standard_quantity', 'units_returned', 'suggested_units', 'overload_units']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            raise ValueError(f"Columnas faltantes en el dataset: {missing_columns}")
-        
-        # Seleccionar features y targets
-        X = df[['standard_quantity', 'units_returned']]  # features
-        y = df[['suggested_units', 'overload_units']]   # targets
-        
-        print(f"Dimensiones de X: {X.shape}")
-        print(f"Dimensiones de y: {y.shape}")
+        if feature_set != "basic":
+            df = build_training_frame(df, load_past_flights_data())
         
-        # Dividir datos
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        
-        # Entrenar modelo
-        rf_model = RandomForestRegressor(n_estimators=200, random_state=42)
-        rf_model.fit(X_train, y_train)
-        
-        # Evaluar modelo
-        y_pred = rf_model.predict(X_test)
-        mse = np.mean((y_test - y_pred) ** 2)
-        r2 = rf_model.score(X_test, y_test)
+        model, report = consumption_pipeline.fit(df, feature_set=feature_set, n_jobs=n_jobs, measure_size=measure_size)
         
         print("Modelo entrenado exitosamente:")
-        print(f"Mean Squared Error: {mse:.4f}")
-        print(f"R^2 Score: {r2:.4f}")
+        print(f"Mean Squared Error: {report['metrics']['mean_squared_error']:.4f}")
+        print(f"R^2 Score: {report['metrics']['r2_score']:.4f}")
+        print(f"Tiempo total: {report['cost']['total_seconds']:.4f}s "
+              f"(caché de features: {'sí' if report['cost']['feature_cache_hit'] else 'no'})")
         
-        model_trained = True
+        if feature_set == "basic":
+            rf_model = model
+            model_trained = True
+        else:
+            rich_model = model
+        training_reports[feature_set] = report
+        bump_version("model:consumption")
+        if feature_set == "basic":
+            model_warmup.mark_ready("consumption")
         
         return {
             "status": "success",
             "message": "Modelo entrenado exitosamente",
-            "metrics": {
-                "mean_squared_error": round(mse, 4),
-                "r2_score": round(r2, 4),
-                "training_samples": len(X_train),
-                "test_samples": len(X_test)
-            }
+            "feature_set": feature_set,
+            "features": report["features"],
+            "metrics": report["metrics"],
+            "training_cost": report["cost"]
         }
         
     except Exception as e:
@@ -103,24 +257,96 @@ def train_prediction_model():
         print(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
+def get_forest_quantiles(feature_set: str = "basic") -> ForestQuantiles:
+    """
+    Tabla de predicciones por árbol del modelo vigente; se reconstruye si el modelo se reentrenó
+    """
+    model = rf_model if feature_set == "basic" else rich_model
+    cached = forest_quantiles.get(feature_set)
+    if cached is None or cached.model is not model:
+        cached = forest_quantiles[feature_set] = ForestQuantiles(model, TARGET_COLUMNS)
+    return cached
+
+def parse_quantile_params(quantiles: str, service_level: float) -> Tuple[List[float], List[float]]:
+    """
+    Cuantiles pedidos más el nivel de servicio (necesario para el stock de seguridad)
+    """
+    try:
+        requested = parse_quantiles(quantiles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return requested, sorted(set(requested) | {service_level})
+
+def predict_with_intervals(X: pd.DataFrame, quantiles: List[float], service_level: float):
+    """
+    Evalúa los 200 árboles en una sola pasada y devuelve, por fila, media y
+    cuantiles de suggested/overload/total y el stock de seguridad
+    (cuantil del nivel de servicio menos la media del total), más el total del lote
+    """
+    requested, levels = parse_quantile_params(quantiles, service_level)
+    forest = get_forest_quantiles("basic")
+    
+    with time_inference("consumption_intervals", len(X)):
+        per_tree = forest.per_tree(X)
+    tree_totals = per_tree.sum(axis=2)
+    
+    suggested = forest.summarize(per_tree[:, :, 0], levels)
+    overload = forest.summarize(per_tree[:, :, 1], levels)
+    total = forest.summarize(tree_totals, levels)
+    safety_stock = total[quantile_key(service_level)] - total["mean"]
+    keys = ["mean"] + [quantile_key(q) for q in requested]
+    
+    def pick(summary, i):
+        return {key: round(float(summary[key][i]), 2) for key in keys}
+    
+    rows = [
+        {
+            "suggested_units": pick(suggested, i),
+            "overload_units": pick(overload, i),
+            "total_required": pick(total, i),
+            "safety_stock": round(float(safety_stock[i]), 2)
+        }
+        for i in range(len(X))
+    ]
+    
+    # Total del lote: suma por árbol y luego cuantiles (no suma de cuantiles)
+    batch = forest.summarize(tree_totals.sum(axis=0), levels)
+    summary = {
+        "total_required": {key: round(float(batch[key]), 2) for key in keys},
+        "safety_stock": round(float(batch[quantile_key(service_level)] - batch["mean"]), 2),
+        "service_level": service_level,
+        "quantiles": requested,
+        "trees": forest.n_trees
+    }
+    return rows, summary
+
 @router.on_event("startup")
 async def startup_event():
     """
-    Entrena el modelo automáticamente al iniciar la aplicación
+    Entrena el modelo al iniciar la aplicación en segundo plano (ver MODEL_WARMUP);
+    mientras tanto las predicciones responden 503 y /health/ready lo reporta
     """
-    try:
-        print("Iniciando entrenamiento del modelo al startup...")
-        train_prediction_model()
-    except Exception as e:
-        print(f"Error durante startup del modelo: {e}")
+    print("Iniciando entrenamiento del modelo al startup...")
+    model_warmup.start("consumption", train_prediction_model)
+
+@router.on_event("shutdown")
+def shutdown_simulation_pool():
+    shutdown_pool()
 
 @router.get("/train-model")
-def train_model():
+def train_model(
+    feature_set: str = Query("basic", description="Conjunto de features: 'basic' o 'rich'"),
+    n_jobs: Optional[int] = Query(None, description="Núcleos para entrenar en paralelo (-1 = todos; por defecto TRAINING_N_JOBS)"),
+    measure_size: bool = Query(False, description="Reporta el tamaño serializado del modelo (lo serializa completo)")
+):
     """
     Endpoint para entrenar el modelo manualmente
     """
     try:
-        result = train_prediction_model()
+        if feature_set not in FEATURE_SETS:
+            raise HTTPException(status_code=400, detail=f"Conjunto de features inválido: {feature_set}. Opciones: {list(FEATURE_SETS)}")
+        
+        result = train_prediction_model(feature_set=feature_set, n_jobs=n_jobs, measure_size=measure_size)
         return result
     except HTTPException:
         raise
@@ -148,7 +374,8 @@ def predict_consumption(
         })
         
         # Realizar predicción
-        prediction = rf_model.predict(new_data)
+        with time_inference("consumption", len(new_data)):
+            prediction = rf_model.predict(new_data)
         
         suggested_units = round(float(prediction[0][0]), 2)
         overload_units = round(float(prediction[0][1]), 2)
@@ -185,6 +412,60 @@ def predict_consumption(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en la predicción: {str(e)}")
 
+@router.get("/predict-rich")
+def predict_consumption_rich(
+    standard_quantity: float = Query(..., description="Cantidad estándar del producto"),
+    units_returned: float = Query(..., description="Unidades devueltas históricamente"),
+    duration: float = Query(..., description="Duración del vuelo en horas"),
+    tickets_sold: float = Query(..., description="Boletos vendidos"),
+    passenger_count: float = Query(..., description="Número de pasajeros"),
+    aerolinea: str = Query(..., description="Aerolínea"),
+    tipo: str = Query(..., description="Tipo de producto"),
+    meal_service_type: str = Query(..., description="Tipo de servicio de comida")
+):
+    """
+    Predice el consumo con el modelo entrenado sobre features de vuelo y producto
+    """
+    global rich_model
+    
+    try:
+        if rich_model is None:
+            raise HTTPException(status_code=503, detail="Modelo enriquecido no entrenado. Use /prediction/train-model?feature_set=rich")
+        
+        new_data = pd.DataFrame({
+            'standard_quantity': [standard_quantity],
+            'units_returned': [units_returned],
+            'duration': [duration],
+            'tickets_sold': [tickets_sold],
+            'Passenger_Count': [passenger_count],
+            'aerolinea': [aerolinea],
+            'tipo': [tipo],
+            'meal_service_type': [meal_service_type]
+        })
+        X = consumption_pipeline.transform(new_data, feature_set="rich")
+        
+        with time_inference("consumption_rich", len(X)):
+            prediction = rich_model.predict(X)
+        suggested_units = round(float(prediction[0][0]), 2)
+        overload_units = round(float(prediction[0][1]), 2)
+        
+        unseen = [column for column in FEATURE_SETS["rich"]["categorical"] if X[column].iat[0] == -1]
+        
+        return {
+            "prediction": {
+                "suggested_units": suggested_units,
+                "overload_units": overload_units,
+                "total_required": round(suggested_units + overload_units, 2)
+            },
+            "unseen_categories": unseen,
+            "input_parameters": new_data.iloc[0].to_dict()
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la predicción: {str(e)}")
+
 @router.get("/batch-predict")
 def batch_predict_consumption(
     flight_data: str = Query(..., description="Datos de vuelos en formato: 'cantidad1,devueltos1;cantidad2,devueltos2;...'")
@@ -213,7 +494,8 @@ def batch_predict_consumption(
                         'units_returned': [units_ret]
                     })
                     
-                    prediction = rf_model.predict(new_data)
+                    with time_inference("consumption", len(new_data)):
+                        prediction = rf_model.predict(new_data)
                     suggested_units = round(float(prediction[0][0]), 2)
                     overload_units = round(float(prediction[0][1]), 2)
                     
@@ -255,6 +537,51 @@ def batch_predict_consumption(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en predicción por lote: {str(e)}")
 
+@router.get("/predict-intervals")
+def predict_consumption_intervals(
+    flight_data: str = Query(..., description="Datos en formato: 'cantidad1,devueltos1;cantidad2,devueltos2;...'"),
+    quantiles: str = Query("50,90,95", description="Cuantiles de las predicciones de los árboles, separados por coma"),
+    service_level: float = Query(95, gt=0, lt=100, description="Nivel de servicio (%) para el stock de seguridad")
+):
+    """
+    Intervalos de predicción a partir de los árboles del bosque: media, cuantiles
+    y stock de seguridad por entrada y para el lote completo
+    """
+    global rf_model, model_trained
+    
+    try:
+        if not model_trained or rf_model is None:
+            raise HTTPException(status_code=503, detail="Modelo no entrenado. Por favor, espere o entrene el modelo primero.")
+        
+        entries = []
+        for i, entry in enumerate(flight_data.split(';')):
+            if not entry.strip():
+                continue
+            try:
+                std_qty, units_ret = map(float, entry.split(','))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Formato incorrecto en entrada {i+1}: {entry}. Use 'cantidad,devueltos'")
+            entries.append({'standard_quantity': std_qty, 'units_returned': units_ret})
+        
+        if not entries:
+            raise HTTPException(status_code=400, detail="No se recibieron entradas")
+        
+        X = pd.DataFrame(entries, columns=['standard_quantity', 'units_returned'])
+        rows, summary = predict_with_intervals(X, quantiles, service_level)
+        
+        return {
+            "predictions": [
+                {"flight_id": f"FLIGHT_{i+1}", "input": entry, **row}
+                for i, (entry, row) in enumerate(zip(entries, rows))
+            ],
+            "summary": {"total_flights": len(entries), **summary}
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la predicción por intervalos: {str(e)}")
+
 @router.get("/model-info")
 def get_model_info():
     """
@@ -290,6 +617,15 @@ def get_model_info():
             "model_parameters": {
                 "n_estimators": rf_model.n_estimators,
                 "random_state": rf_model.random_state
+            },
+            "rich_model": {
+                "status": "trained" if rich_model is not None else "not_trained",
+                "features": training_reports["rich"]["features"] if "rich" in training_reports else FEATURE_SETS["rich"]["numeric"] + FEATURE_SETS["rich"]["categorical"]
+            },
+            "training_reports": training_reports,
+            "feature_cache": {
+                "hits": consumption_pipeline.cache_hits,
+                "misses": consumption_pipeline.cache_misses
             }
         }
         
@@ -352,4 +688,419 @@ def get_flight_recommendation(flight_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generando recomendación para vuelo: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error generando recomendación para vuelo: {str(e)}")
+
+@router.get("/catering-plan")
+def get_catering_plan(
+    start_date: Optional[str] = Query(None, description="Fecha inicial de salida (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Fecha final de salida (YYYY-MM-DD)"),
+    quantiles: Optional[str] = Query(None, description="Cuantiles del total por vuelo (ej. '50,90,95'); activa el stock de seguridad"),
+    service_level: float = Query(95, gt=0, lt=100, description="Nivel de servicio (%) para el stock de seguridad")
+):
+    """
+    Plan de catering para todas las salidas de un rango de fechas.
+    Predice suggested_units/overload_units por vuelo x producto en una sola inferencia.
+    Con quantiles agrega, por vuelo y para el calendario, los cuantiles del total
+    requerido según los árboles del bosque y el stock de seguridad al nivel de servicio.
+    """
+    global rf_model, model_trained
+    
+    try:
+        if not model_trained or rf_model is None:
+            raise HTTPException(status_code=503, detail="Modelo no entrenado. Por favor, espere o entrene el modelo primero.")
+        
+        for value in (start_date, end_date):
+            if value:
+                try:
+                    pd.Timestamp(value)
+                except ValueError:
+                    raise HTTPException(status_code=400, detail=f"Fecha inválida: {value}. Use 'YYYY-MM-DD'")
+        
+        if quantiles is not None:
+            requested, levels = parse_quantile_params(quantiles, service_level)
+        
+        items = build_catering_plan_items(start_date, end_date)
+        
+        if items.empty:
+            return {
+                "date_range": {"start_date": start_date, "end_date": end_date},
+                "flights": [],
+                "products": [],
+                "suggested_units": [],
+                "overload_units": [],
+                "summary": {"total_flights": 0, "total_items": 0}
+            }
+        
+        # Una sola inferencia para todo el calendario
+        with time_inference("consumption", len(items)):
+            prediction = rf_model.predict(items[['standard_quantity', 'units_returned']])
+        items = items.assign(
+            suggested_units=np.round(prediction[:, 0], 2),
+            overload_units=np.round(prediction[:, 1], 2)
+        )
+        items['expected_waste_units'] = items['suggested_units'] * items['waste_rate'].fillna(0) / 100
+        
+        # Matriz compacta vuelo x producto (None donde el vuelo no lleva el producto)
+        flight_ids = list(dict.fromkeys(items['flight_id']))
+        product_ids = sorted(items['product_id'].unique())
+        row_idx = pd.Index(flight_ids).get_indexer(items['flight_id'])
+        col_idx = pd.Index(product_ids).get_indexer(items['product_id'])
+        
+        suggested_matrix = np.full((len(flight_ids), len(product_ids)), np.nan)
+        overload_matrix = np.full((len(flight_ids), len(product_ids)), np.nan)
+        suggested_matrix[row_idx, col_idx] = items['suggested_units'].to_numpy()
+        overload_matrix[row_idx, col_idx] = items['overload_units'].to_numpy()
+        
+        def to_rows(matrix):
+            return [[None if np.isnan(v) else float(v) for v in row] for row in matrix]
+        
+        per_flight = items.groupby('flight_id', sort=False).agg(
+            departure_date=('departure_date', 'first'),
+            history_source=('history_source', 'first'),
+            total_suggested=('suggested_units', 'sum'),
+            total_overload=('overload_units', 'sum'),
+            expected_waste=('expected_waste_units', 'sum')
+        )
+        product_names = items.drop_duplicates('product_id').set_index('product_id')['product_name']
+        
+        total_suggested = float(items['suggested_units'].sum())
+        total_overload = float(items['overload_units'].sum())
+        
+        flight_intervals = {}
+        schedule_intervals = {}
+        if quantiles is not None:
+            # Total por vuelo y árbol: los cuantiles se toman sobre sumas, no se suman cuantiles
+            forest = get_forest_quantiles("basic")
+            with time_inference("consumption_intervals", len(items)):
+                tree_totals = forest.group_totals(items[['standard_quantity', 'units_returned']], row_idx, len(flight_ids))
+            keys = [quantile_key(q) for q in requested]
+            service_key = quantile_key(service_level)
+            
+            by_flight = forest.summarize(tree_totals, levels)
+            for i, flight_id in enumerate(flight_ids):
+                flight_intervals[flight_id] = {
+                    "total_required_quantiles": {key: round(float(by_flight[key][i]), 2) for key in keys},
+                    "safety_stock": round(float(by_flight[service_key][i] - by_flight["mean"][i]), 2)
+                }
+            
+            schedule = forest.summarize(tree_totals.sum(axis=0), levels)
+            schedule_intervals = {
+                "grand_total_quantiles": {key: round(float(schedule[key]), 2) for key in keys},
+                "safety_stock": round(float(schedule[service_key] - schedule["mean"]), 2),
+                "service_level": service_level
+            }
+        
+        return {
+            "date_range": {"start_date": start_date, "end_date": end_date},
+            "flights": flight_ids,
+            "products": product_ids,
+            "product_names": {pid: product_names[pid] for pid in product_ids},
+            "suggested_units": to_rows(suggested_matrix),
+            "overload_units": to_rows(overload_matrix),
+            "flight_totals": {
+                flight_id: {
+                    "departure_date": row['departure_date'],
+                    "history_source": row['history_source'],
+                    "suggested_units": round(float(row['total_suggested']), 2),
+                    "overload_units": round(float(row['total_overload']), 2),
+                    "total_required": round(float(row['total_suggested'] + row['total_overload']), 2),
+                    "expected_waste_units": round(float(row['expected_waste']), 2),
+                    **flight_intervals.get(flight_id, {})
+                }
+                for flight_id, row in per_flight.iterrows()
+            },
+            "summary": {
+                "total_flights": len(flight_ids),
+                "total_products": len(product_ids),
+                "total_items": len(items),
+                "total_suggested_units": round(total_suggested, 2),
+                "total_overload_units": round(total_overload, 2),
+                "grand_total": round(total_suggested + total_overload, 2),
+                **schedule_intervals
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generando plan de catering: {str(e)}")
+
+@router.get("/optimize-loading")
+def optimize_loading(
+    start_date: Optional[str] = Query(None, description="Fecha inicial de salida (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Fecha final de salida (YYYY-MM-DD)"),
+    stockout_penalty: float = Query(0, ge=0, description="Costo adicional por unidad faltante (además del margen perdido)"),
+    reusable_recovery: float = Query(0.8, ge=0, le=1, description="Fracción del costo que se recupera de un sobrante reutilizable"),
+    default_margin: float = Query(100, ge=0, description="Margen (%) sobre el costo cuando no hay precio ni margen histórico")
+):
+    """
+    Carga que minimiza el costo esperado de cada vuelo x producto del calendario.
+    La demanda son las predicciones de los árboles del bosque (total requerido);
+    faltar cuesta el margen perdido más la penalización y sobrar cuesta la parte
+    del costo que no se recupera. La carga óptima es el cuantil de la razón
+    crítica Cu / (Cu + Co). Se compara con la cantidad estándar y con el
+    pronóstico puntual evaluados en los mismos escenarios.
+    """
+    global rf_model, model_trained
+    
+    try:
+        if not model_trained or rf_model is None:
+            raise HTTPException(status_code=503, detail="Modelo no entrenado. Por favor, espere o entrene el modelo primero.")
+        
+        for value in (start_date, end_date):
+            if value:
+                try:
+                    pd.Timestamp(value)
+                except ValueError:
+                    raise HTTPException(status_code=400, detail=f"Fecha inválida: {value}. Use 'YYYY-MM-DD'")
+        
+        parameters = {
+            "stockout_penalty": stockout_penalty,
+            "reusable_recovery": reusable_recovery,
+            "default_margin": default_margin
+        }
+        items = build_catering_plan_items(start_date, end_date)
+        
+        if items.empty:
+            return {
+                "date_range": {"start_date": start_date, "end_date": end_date},
+                "parameters": parameters,
+                "flights": [],
+                "products": [],
+                "optimal_units": [],
+                "flight_totals": {},
+                "summary": {"total_flights": 0, "total_items": 0}
+            }
+        
+        costs = build_item_costs(items, default_margin)
+        unit_cost = costs['unit_cost'].to_numpy()
+        underage = np.maximum(costs['price'].to_numpy() - unit_cost, 0) + stockout_penalty
+        overage = unit_cost * np.where(costs['reusable'].to_numpy(), 1 - reusable_recovery, 1)
+        
+        flight_ids = list(dict.fromkeys(items['flight_id']))
+        product_ids = sorted(items['product_id'].unique())
+        row_idx = pd.Index(flight_ids).get_indexer(items['flight_id'])
+        col_idx = pd.Index(product_ids).get_indexer(items['product_id'])
+        
+        forest = get_forest_quantiles("basic")
+        
+        def sample_demand(X):
+            with time_inference("consumption_intervals", len(X)):
+                return forest.per_tree(X).sum(axis=2)
+        
+        with time_stage("aggregation", "newsvendor"):
+            result = optimize_schedule(
+                sample_demand,
+                items[['standard_quantity', 'units_returned']],
+                overage, underage, row_idx, len(flight_ids),
+                baselines={"standard": items['standard_quantity'].to_numpy()}
+            )
+        
+        # Sobrante que no se recupera: todo en desechables, (1 - recuperación) en reutilizables
+        waste_share = np.where(costs['reusable'].to_numpy(), 1 - reusable_recovery, 1)
+        plan = pd.DataFrame({
+            'flight_id': items['flight_id'].to_numpy(),
+            'optimal_units': result['load'],
+            'expected_demand': result['mean_demand'],
+            'expected_cost': result['expected_cost'],
+            'expected_waste_units': result['leftover'] * waste_share,
+            'expected_shortage_units': result['shortage'],
+            'standard_units': items['standard_quantity'].to_numpy(),
+            'standard_expected_cost': result['standard_expected_cost'],
+            'point_expected_cost': result['point_expected_cost']
+        })
+        per_flight = plan.groupby('flight_id', sort=False).sum()
+        
+        optimal_matrix = np.full((len(flight_ids), len(product_ids)), np.nan)
+        optimal_matrix[row_idx, col_idx] = result['load']
+        
+        product_items = pd.DataFrame({
+            'product_id': items['product_id'].to_numpy(),
+            'product_name': items['product_name'].to_numpy(),
+            'unit_cost': unit_cost,
+            'price': costs['price'].to_numpy(),
+            'price_source': costs['price_source'].to_numpy(),
+            'reusable': costs['reusable'].to_numpy(),
+            'critical_ratio': result['critical_ratio']
+        }).drop_duplicates('product_id').set_index('product_id')
+        
+        def money(value):
+            return round(float(value), 2)
+        
+        total_cost = float(plan['expected_cost'].sum())
+        standard_cost = float(plan['standard_expected_cost'].sum())
+        point_cost = float(plan['point_expected_cost'].sum())
+        flight_risk = result['group_stockout_probability']
+        
+        return {
+            "date_range": {"start_date": start_date, "end_date": end_date},
+            "parameters": parameters,
+            "flights": flight_ids,
+            "products": product_ids,
+            "product_economics": {
+                pid: {
+                    "product_name": row['product_name'],
+                    "unit_cost": money(row['unit_cost']),
+                    "price": money(row['price']),
+                    "price_source": row['price_source'],
+                    "reusable": bool(row['reusable']),
+                    "critical_ratio": round(float(row['critical_ratio']), 4)
+                }
+                for pid, row in product_items.loc[product_ids].iterrows()
+            },
+            "optimal_units": [[None if np.isnan(v) else float(v) for v in row] for row in optimal_matrix],
+            "flight_totals": {
+                flight_id: {
+                    "optimal_units": float(row['optimal_units']),
+                    "expected_demand": round(float(row['expected_demand']), 2),
+                    "standard_units": float(row['standard_units']),
+                    "expected_cost": money(row['expected_cost']),
+                    "standard_expected_cost": money(row['standard_expected_cost']),
+                    "expected_waste_units": round(float(row['expected_waste_units']), 2),
+                    "expected_shortage_units": round(float(row['expected_shortage_units']), 2),
+                    "stockout_risk": round(float(flight_risk[i]), 4)
+                }
+                for i, (flight_id, row) in enumerate(per_flight.iterrows())
+            },
+            "summary": {
+                "total_flights": len(flight_ids),
+                "total_products": len(product_ids),
+                "total_items": len(items),
+                "scenarios": forest.n_trees,
+                "total_optimal_units": float(plan['optimal_units'].sum()),
+                "total_standard_units": float(plan['standard_units'].sum()),
+                "expected_cost": money(total_cost),
+                "standard_expected_cost": money(standard_cost),
+                "point_forecast_expected_cost": money(point_cost),
+                "savings_vs_standard": money(standard_cost - total_cost),
+                "savings_vs_point_forecast": money(point_cost - total_cost),
+                "expected_waste_units": round(float(plan['expected_waste_units'].sum()), 2),
+                "expected_shortage_units": round(float(plan['expected_shortage_units'].sum()), 2),
+                "mean_item_stockout_probability": round(float(result['stockout_probability'].mean()), 4),
+                "mean_flight_stockout_risk": round(float(flight_risk.mean()), 4),
+                "flights_at_risk": int((flight_risk > 0.5).sum())
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error optimizando la carga: {str(e)}")
+
+@router.get("/simulate-policies")
+def simulate_loading_policies(
+    policies: str = Query(DEFAULT_POLICIES, description="Políticas separadas por coma: standard, mean, buffer:P, quantile:Q"),
+    scenarios: int = Query(1000, ge=1, le=100000, description="Escenarios de demanda a simular"),
+    start_date: Optional[str] = Query(None, description="Fecha inicial de salida (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Fecha final de salida (YYYY-MM-DD)"),
+    demand_noise: float = Query(0.1, ge=0, le=2, description="Desviación del ruido lognormal sobre la tasa histórica"),
+    seed: int = Query(42, description="Semilla de la simulación"),
+    workers: Optional[int] = Query(None, ge=1, le=MAX_WORKERS, description="Procesos del pool (por defecto y como máximo: los núcleos disponibles)"),
+    stockout_penalty: float = Query(0, ge=0, description="Costo adicional por unidad faltante (además del margen perdido)"),
+    reusable_recovery: float = Query(0.8, ge=0, le=1, description="Fracción del costo que se recupera de un sobrante reutilizable"),
+    default_margin: float = Query(100, ge=0, description="Margen (%) sobre el costo cuando no hay precio ni margen histórico")
+):
+    """
+    Simulación Monte Carlo de desperdicio, costo y nivel de servicio (fill rate)
+    de cada política de carga en toda la red del rango de fechas. La demanda se
+    muestrea de las tasas de consumo históricas de cada producto.
+    """
+    try:
+        for value in (start_date, end_date):
+            if value:
+                try:
+                    pd.Timestamp(value)
+                except ValueError:
+                    raise HTTPException(status_code=400, detail=f"Fecha inválida: {value}. Use 'YYYY-MM-DD'")
+        
+        try:
+            parsed_policies = parse_policies(policies)
+            network = load_network(start_date, end_date, reusable_recovery=reusable_recovery,
+                                   stockout_penalty=stockout_penalty, default_margin=default_margin)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        with time_stage("aggregation", "monte_carlo"):
+            result = run_simulation(network, parsed_policies, n_scenarios=scenarios, seed=seed,
+                                    workers=workers, demand_noise=demand_noise)
+        print(f"Simulación: {scenarios} escenarios x {result['network']['items']} filas en "
+              f"{result['performance']['seconds']}s ({result['performance']['workers']} procesos)")
+        
+        return {
+            "date_range": {"start_date": start_date, "end_date": end_date},
+            "parameters": {
+                "demand_noise": demand_noise,
+                "seed": seed,
+                "stockout_penalty": stockout_penalty,
+                "reusable_recovery": reusable_recovery,
+                "default_margin": default_margin
+            },
+            **result
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la simulación: {str(e)}")
+
+@router.get("/features")
+def get_consumption_features(
+    product_id: str = Query(..., description="ID del producto (ej. BEV001)"),
+    route: Optional[str] = Query(None, description="Ruta en formato ORIGEN-DESTINO (ej. JFK-LAX)"),
+    aircraft: Optional[str] = Query(None, description="Modelo de avión"),
+    meal_service_type: Optional[str] = Query(None, description="Tipo de servicio de comida")
+):
+    """
+    Consulta las features históricas de consumo del nivel más específico disponible
+    """
+    try:
+        store = get_feature_store(load_past_flights_data)
+        features = store.lookup(product_id, route=route, aircraft=aircraft, meal_service_type=meal_service_type)
+        
+        if features is None:
+            raise HTTPException(status_code=404, detail=f"No hay historial de consumo para el producto {product_id}")
+        
+        return features
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error consultando features: {str(e)}")
+
+@router.get("/features/stats")
+def get_feature_store_stats():
+    """
+    Tamaño del feature store por nivel de agregación
+    """
+    try:
+        return get_feature_store(load_past_flights_data).stats()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@router.post("/features/flights")
+def ingest_completed_flights(
+    records: List[Dict[str, Any]] = Body(..., description="Registros de vuelos completados con el esquema de pastFlights_data.csv")
+):
+    """
+    Actualiza incrementalmente el feature store con vuelos completados
+    """
+    try:
+        result = ingest_live_records(load_past_flights_data, records)
+        store = get_feature_store(load_past_flights_data)
+        if result["ingested"]:
+            bump_version("feature_store")
+        
+        return {
+            "status": "success",
+            **result,
+            "store": store.stats()
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error actualizando features: {str(e)}")
@@ -2,9 +2,14 @@ from fastapi import APIRouter, HTTPException
 import pandas as pd
 import os
 from typing import Dict, Any
+from app.utils.utils import get_data_dir, get_data_path
+from app.utils.memo import versioned_memo
+from app.utils.metrics import time_stage
+from app.utils.changelog import change_log
 
 router = APIRouter(prefix="/data", tags=["Flight Data"])
 
+@versioned_memo("data:flights", datasets=['flight_data.csv'])
 def load_flight_data_from_csv() -> Dict[str, Any]:
     """
     Carga los datos de vuelos desde un archivo CSV
@@ -15,14 +20,9 @@ def load_flight_data_from_csv() -> Dict[str, Any]:
         print(f"=== DEBUG INFO ===")
         print(f"Directorio actual del script: {current_dir}")
         
-        # Construir la ruta paso a paso
-        app_dir = os.path.dirname(current_dir)  # Salir de routes a app
-        backend_dir = os.path.dirname(app_dir)  # Salir de app a backend
-        project_root = os.path.dirname(backend_dir)  # Salir de backend al root del proyecto
-        data_dir = os.path.join(project_root, 'data')  # Entrar a data
-        
-        csv_path = os.path.join(data_dir, 'flight_data.csv')
-        csv_path = os.path.abspath(csv_path)  # Normalizar la ruta
+        # Construir la ruta al CSV
+        data_dir = get_data_dir()
+        csv_path = get_data_path('flight_data.csv')
         
         print(f"Ruta construida del CSV: {csv_path}")
         print(f"¿Existe el directorio data?: {os.path.exists(data_dir)}")
@@ -37,7 +37,8 @@ def load_flight_data_from_csv() -> Dict[str, Any]:
             raise FileNotFoundError(f"Archivo no encontrado: {csv_path}")
         
         # Leer el CSV
-        df = pd.read_csv(csv_path)
+        with time_stage("csv_load", "flight_data.csv"):
+            df = pd.read_csv(csv_path)
         print(f"CSV leído correctamente. Filas: {len(df)}")
         print(f"Columnas: {df.columns.tolist()}")
         
@@ -60,6 +61,7 @@ def load_flight_data_from_csv() -> Dict[str, Any]:
             }
         
         print(f"Datos procesados. Vuelos: {list(flight_data.keys())}")
+        change_log.capture("flights", pd.DataFrame.from_dict(flight_data, orient='index'))
         return flight_data
         
     except FileNotFoundError as e:
@@ -75,6 +77,8 @@ def load_flight_data_from_csv() -> Dict[str, Any]:
         print(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
+change_log.register_source("flights", ['flight_data.csv'], load_flight_data_from_csv)
+
 # Ruta para obtener todos los vuelos
 @router.get("/")
 def get_all_flights():
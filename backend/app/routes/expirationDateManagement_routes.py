@@ -1,13 +1,37 @@
 # expirationDateManagement_routes.py
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Body
 import pandas as pd
 import os
-from typing import Dict, Any, List, Optional
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
 from datetime import datetime, timedelta
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
+from app.utils.utils import get_data_path, get_dataset_mtime
+from app.utils.http_cache import bump_version
+from app.utils.memo import versioned_memo
+from app.utils.metrics import time_stage, timed_stage, time_inference
+from app.utils.indexes import assign_product_ids, build_pk_index
+from app.services.bitmapIndex_service import BitmapIndex
+from app.services.compactStore_service import CompactTable
+from app.services.rollupCube_service import RollupCube
+from app.services.expiryCalendar_service import (
+    DEFAULT_ELAPSED_FRACTION,
+    EXPIRY_COLUMN,
+    RECEIVED_COLUMN,
+    ExpiryCalendar,
+    batch_dates,
+    remaining_life,
+    today_reference,
+)
+from app.services.fefoAllocation_service import (
+    DEFAULT_LONG_HAUL_HOURS,
+    LONG_HAUL_MIN_SCORE,
+    SHORT_HAUL_MIN_SCORE,
+    allocate_fefo,
+)
+from app.utils.warmup import model_warmup
+
+if TYPE_CHECKING:
+    from sklearn.preprocessing import LabelEncoder
 
 router = APIRouter(prefix="/expiration", tags=["Expiration Date Management"])
 
@@ -16,19 +40,28 @@ freshness_model = None
 label_encoders = {}
 model_trained = False
 
+# Tablas de inferencia construidas al entrenar (ver build_inference_tables)
+freshness_features: List[str] = []
+encoder_lookup: Dict[str, Dict[str, int]] = {}
+encoder_fallback: Dict[str, int] = {}
+numeric_defaults: Dict[str, float] = {}
+risk_score_means: Dict[str, float] = {}
+
+# Estado de frescura asociado a cada nivel de riesgo que predice el modelo
+RISK_TO_STATUS = {
+    "bajo": ("ÓPTIMO", "green"),
+    "medio": ("ATENCIÓN", "yellow"),
+    "alto": ("CRÍTICO", "orange"),
+    "muy_alto": ("EXPIRADO", "red"),
+}
+
+@versioned_memo("expiration:products", datasets=['products_data_augmented.csv'])
 def load_products_data() -> pd.DataFrame:
     """
     Carga los datos de productos desde el archivo CSV
     """
     try:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        app_dir = os.path.dirname(current_dir)  # Salir de routes a app
-        backend_dir = os.path.dirname(app_dir)  # Salir de app a backend
-        project_root = os.path.dirname(backend_dir)  # Salir de backend al root del proyecto
-        data_dir = os.path.join(project_root, 'data')  # Entrar a data
-        
-        csv_path = os.path.join(data_dir, 'products_data_augmented.csv')
-        csv_path = os.path.abspath(csv_path)
+        csv_path = get_data_path('products_data_augmented.csv')
         
         print(f"Buscando archivo de datos de productos en: {csv_path}")
         print(f"¿Existe el archivo?: {os.path.exists(csv_path)}")
@@ -37,10 +70,15 @@ def load_products_data() -> pd.DataFrame:
             raise FileNotFoundError(f"Archivo no encontrado: {csv_path}")
         
         # Leer el CSV
-        df = pd.read_csv(csv_path)
+        with time_stage("csv_load", "products_data_augmented.csv"):
+            df = pd.read_csv(csv_path)
         print(f"CSV de productos leído correctamente. Filas: {len(df)}")
         print(f"Columnas: {df.columns.tolist()}")
         
+        # Fechas de recepción y vencimiento por lote (datetime64), fijas para esta versión del CSV
+        snapshot = datetime.fromtimestamp(get_dataset_mtime('products_data_augmented.csv'))
+        df[RECEIVED_COLUMN], df[EXPIRY_COLUMN] = batch_dates(df, snapshot)
+        
         return df
         
     except Exception as e:
@@ -48,29 +86,162 @@ def load_products_data() -> pd.DataFrame:
         print(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
+@versioned_memo("expiration:pk_index", datasets=['products_data_augmented.csv'])
+def load_product_index():
+    """
+    Índice de llave primaria del CSV de productos, construido una vez por versión.
+    Devuelve (df, product_ids, índice id -> posición) con los mismos IDs
+    estables de /products; la posición de la fila no sirve como ID porque
+    cambia al reordenar el CSV.
+    """
+    df = load_products_data()
+    product_ids = assign_product_ids(df)
+    return df, product_ids, build_pk_index(product_ids)
+
+@versioned_memo("expiration:calendar", datasets=['products_data_augmented.csv'])
+def load_expiry_calendar() -> ExpiryCalendar:
+    """
+    Índice de vencimientos de los lotes (posiciones de fila ordenadas por fecha)
+    """
+    df = load_products_data()
+    return ExpiryCalendar(df[RECEIVED_COLUMN], df[EXPIRY_COLUMN], df['vida_util_dias'])
+
+# Columnas de baja cardinalidad con bitmap (las tres últimas salen de calculate_freshness_score)
+BITMAP_COLUMNS = ['Category', 'aerolinea', 'tipo', 'Stock_Status', 'Storage_Temperature', 'Quality_Status',
+                  'estado_frescura', 'recomendacion_vuelo', 'nivel_riesgo']
+
+@versioned_memo("expiration:products_table", datasets=['products_data_augmented.csv'])
+def load_products_table() -> CompactTable:
+    """
+    Productos del CSV en formato compacto; las columnas de frescura se agregan
+    encima sin copiar las del CSV (ver load_freshness_table)
+    """
+    return CompactTable(load_products_data())
+
+@versioned_memo("expiration:freshness_table", datasets=['products_data_augmented.csv'], date_dependent=True)
+@timed_stage("enrichment")
+def load_freshness_table():
+    """
+    Productos combinados con su información de frescura (vistas de solo lectura
+    sobre la tabla compacta), índice de bitmaps y freshness scores como arreglo
+    para los filtros por rango
+    """
+    table = load_products_table().with_columns(
+        freshness_metrics_frame(load_products_data()),
+        python_types={"fecha_estimada_expiracion": lambda value: value.strftime("%Y-%m-%d") if value is not None else None}
+    )
+    index = BitmapIndex({
+        column: table.column(column) if column in table.columns else [None] * len(table)
+        for column in BITMAP_COLUMNS
+    })
+    scores = table.column('freshness_score').astype(float)
+    return table.rows(), index, scores
+
+# Cubo de agregados: aerolínea x categoría x estado x ubicación de almacén x recomendación
+FRESHNESS_CUBE_DIMENSIONS = ['aerolinea', 'Category', 'estado_frescura', 'Storage_Location', 'recomendacion_vuelo']
+
+freshness_cube = RollupCube(
+    FRESHNESS_CUBE_DIMENSIONS,
+    measure='freshness_score',
+    status_dimension='estado_frescura',
+    at_risk_values=['CRÍTICO', 'EXPIRADO'],
+    expired_values=['EXPIRADO']
+)
+
+@versioned_memo("expiration:cube", datasets=['products_data_augmented.csv'], date_dependent=True)
+@timed_stage("aggregation")
+def load_freshness_cube() -> RollupCube:
+    """
+    Sincroniza el cubo de frescura con la versión actual del CSV aplicando
+    solo las diferencias por ID estable de producto
+    """
+    products, _, _ = load_freshness_table()
+    _, product_ids, _ = load_product_index()
+    result = freshness_cube.sync(dict(zip(product_ids, products)))
+    print(f"Cubo de frescura sincronizado: {result}")
+    return freshness_cube
+
 def calculate_freshness_score(row) -> Dict[str, Any]:
     """
     Calcula el freshness score basado en días restantes antes de la expiración
     """
     vida_util_dias = row['vida_util_dias']
     
-    # Simular días transcurridos basado en el batch number y freshness_score existente
-    # Si ya existe freshness_score, lo usamos como base
-    if 'freshness_score' in row and not pd.isna(row['freshness_score']):
-        existing_score = row['freshness_score']
-        # Calcular días transcurridos basado en el score existente
-        dias_transcurridos = vida_util_dias * (1 - existing_score / 100)
+    # Con fechas del lote (ver batch_dates) los días salen del vencimiento real
+    if EXPIRY_COLUMN in row and not pd.isna(row[EXPIRY_COLUMN]):
+        life = remaining_life(row[EXPIRY_COLUMN], row.get(RECEIVED_COLUMN, row[EXPIRY_COLUMN]), vida_util_dias)
+        dias_restantes = life['dias_restantes']
+        dias_transcurridos = life['dias_transcurridos']
+        fecha_expiracion = pd.Timestamp(row[EXPIRY_COLUMN])
     else:
-        # Si no existe, calcular basado en características del producto
-        dias_transcurridos = vida_util_dias * np.random.uniform(0.1, 0.8)
-    
-    # Calcular días restantes
-    dias_restantes = max(0, vida_util_dias - dias_transcurridos)
+        # Simular días transcurridos basado en el batch number y freshness_score existente
+        # Si ya existe freshness_score, lo usamos como base
+        if 'freshness_score' in row and not pd.isna(row['freshness_score']):
+            existing_score = row['freshness_score']
+            # Calcular días transcurridos basado en el score existente
+            dias_transcurridos = vida_util_dias * (1 - existing_score / 100)
+        else:
+            # Si no existe, calcular basado en características del producto
+            dias_transcurridos = vida_util_dias * np.random.uniform(0.1, 0.8)
+        
+        # Calcular días restantes
+        dias_restantes = max(0, vida_util_dias - dias_transcurridos)
+        fecha_expiracion = today_reference() + timedelta(days=dias_restantes)
     
     # Calcular freshness score (0-100)
     freshness_score = (dias_restantes / vida_util_dias) * 100 if vida_util_dias > 0 else 0
     freshness_score = min(100, max(0, freshness_score))
     
+    return {
+        "freshness_score": round(freshness_score, 1),
+        "dias_restantes": round(dias_restantes, 1),
+        "dias_transcurridos": round(dias_transcurridos, 1),
+        **freshness_status_from_score(freshness_score),
+        "fecha_estimada_expiracion": fecha_expiracion.strftime("%Y-%m-%d")
+    }
+
+# Cortes de freshness_status_from_score (estado en 40/60/80, recomendación en 50/75)
+FRESHNESS_SCORE_BOUNDS = [40, 50, 60, 75, 80]
+
+def freshness_metrics_frame(df: pd.DataFrame, now: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Las columnas de calculate_freshness_score para todas las filas a la vez
+    """
+    now = pd.Timestamp(now or today_reference())
+    vida_util_dias = pd.to_numeric(df['vida_util_dias'], errors='coerce')
+    expiry = df[EXPIRY_COLUMN]
+    received = df[RECEIVED_COLUMN].fillna(expiry) if RECEIVED_COLUMN in df.columns else expiry
+    has_expiry = expiry.notna()
+    
+    # Sin fechas del lote se simulan los días transcurridos, igual que en calculate_freshness_score
+    existing_score = df['freshness_score'] if 'freshness_score' in df.columns else pd.Series(np.nan, index=df.index)
+    simulated = vida_util_dias * pd.Series(np.random.uniform(0.1, 0.8, len(df)), index=df.index)
+    simulated_elapsed = (vida_util_dias * (1 - existing_score / 100)).fillna(simulated)
+    simulated_remaining = (vida_util_dias - simulated_elapsed).clip(lower=0)
+    
+    dias_restantes = ((expiry - now) / pd.Timedelta(days=1)).clip(lower=0).where(has_expiry, simulated_remaining)
+    dias_transcurridos = ((now - received) / pd.Timedelta(days=1)).clip(lower=0).where(has_expiry, simulated_elapsed)
+    fecha_expiracion = expiry.where(has_expiry, now + pd.to_timedelta(simulated_remaining, unit='D'))
+    
+    freshness_score = (dias_restantes / vida_util_dias * 100).where(vida_util_dias > 0, 0).clip(0, 100).fillna(0)
+    
+    # Cada banda toma el estado de su límite inferior, así los umbrales viven solo en freshness_status_from_score
+    bands = np.digitize(freshness_score.to_numpy(), FRESHNESS_SCORE_BOUNDS)
+    statuses = [freshness_status_from_score(bound) for bound in [0] + FRESHNESS_SCORE_BOUNDS]
+    frame = pd.DataFrame({
+        "freshness_score": freshness_score.round(1).to_numpy(),
+        "dias_restantes": dias_restantes.round(1).to_numpy(),
+        "dias_transcurridos": dias_transcurridos.round(1).to_numpy(),
+    })
+    for key in statuses[0]:
+        frame[key] = np.array([status[key] for status in statuses], dtype=object)[bands]
+    frame["fecha_estimada_expiracion"] = pd.to_datetime(fecha_expiracion.to_numpy()).normalize()
+    return frame
+
+def freshness_status_from_score(freshness_score: float) -> Dict[str, str]:
+    """
+    Estado, nivel de riesgo y recomendación de vuelo para un freshness score (0-100)
+    """
     # Determinar estado de frescura
     if freshness_score >= 80:
         estado_frescura = "ÓPTIMO"
@@ -101,60 +272,152 @@ def calculate_freshness_score(row) -> Dict[str, Any]:
         prioridad_uso = "crítica"
     
     return {
-        "freshness_score": round(freshness_score, 1),
-        "dias_restantes": round(dias_restantes, 1),
-        "dias_transcurridos": round(dias_transcurridos, 1),
         "estado_frescura": estado_frescura,
         "color_estado": color_estado,
         "nivel_riesgo": riesgo,
         "recomendacion_vuelo": recomendacion_vuelo,
-        "prioridad_uso": prioridad_uso,
-        "fecha_estimada_expiracion": (datetime.now() + timedelta(days=dias_restantes)).strftime("%Y-%m-%d")
+        "prioridad_uso": prioridad_uso
     }
 
+def measured_freshness(df: pd.DataFrame) -> pd.Series:
+    """
+    Freshness score (0-100) registrado en el CSV a su fecha de medición. No
+    depende del reloj: el mismo CSV entrena siempre con las mismas etiquetas
+    """
+    score = pd.to_numeric(df['freshness_score'], errors='coerce') if 'freshness_score' in df else pd.Series(np.nan, index=df.index)
+    return score.clip(0, 100).fillna((1 - DEFAULT_ELAPSED_FRACTION) * 100)
+
+def build_freshness_training_data(df: pd.DataFrame):
+    """
+    Prepara la matriz de features y el target (nivel de riesgo) del modelo de frescura.
+    Devuelve (X, y, encoders, features, categorical_features).
+    """
+    # sklearn se importa aquí para no cargarlo al importar la aplicación
+    from sklearn.preprocessing import LabelEncoder
+    
+    df_combined = df
+    
+    # Preparar datos para el modelo
+    features = ['unit_cost', 'vida_util_dias', 'precio_consumidor', 'standard_quantity', 
+               'units_returned', 'units_consumed', 'suggested_units', 'overload_units']
+    
+    # Codificar variables categóricas
+    categorical_features = ['tipo_servicio', 'aerolinea', 'tipo', 'Category', 'Supplier', 
+                           'Storage_Temperature', 'Quality_Status', 'Storage_Location', 'Stock_Status']
+    
+    X = df_combined[features].copy()
+    
+    # Codificar características categóricas
+    encoders = {}
+    for feature in categorical_features:
+        if feature in df_combined.columns:
+            le = LabelEncoder()
+            X[feature] = le.fit_transform(df_combined[feature].astype(str))
+            encoders[feature] = le
+    
+    # Target: nivel de riesgo del score medido (clasificación multiclase)
+    y = pd.Series(
+        [freshness_status_from_score(score)['nivel_riesgo'] for score in measured_freshness(df)],
+        index=df.index, name='nivel_riesgo'
+    )
+    
+    return X, y, encoders, features, categorical_features
+
+def build_inference_tables(df: pd.DataFrame, X: pd.DataFrame, y: pd.Series, encoders: Dict[str, "LabelEncoder"]):
+    """
+    Precalcula las tablas que usa la inferencia: categoría -> código (O(1)),
+    código de respaldo para categorías no vistas (la más frecuente),
+    medianas para features numéricas faltantes y score medio por nivel de riesgo
+    """
+    global freshness_features, encoder_lookup, encoder_fallback, numeric_defaults, risk_score_means
+    
+    freshness_features = list(X.columns)
+    encoder_lookup = {
+        feature: {category: code for code, category in enumerate(le.classes_)}
+        for feature, le in encoders.items()
+    }
+    encoder_fallback = {feature: int(X[feature].mode().iat[0]) for feature in encoders}
+    numeric_defaults = {
+        feature: float(X[feature].median())
+        for feature in freshness_features if feature not in encoders
+    }
+    risk_score_means = measured_freshness(df).groupby(y.to_numpy()).mean().to_dict()
+
+def score_freshness_batch(products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Predice el nivel de riesgo de frescura de varios productos con una sola
+    llamada al modelo. Resultado determinista para las mismas entradas.
+    """
+    frame = pd.DataFrame(products)
+    X = pd.DataFrame(index=frame.index)
+    unseen = pd.DataFrame(False, index=frame.index, columns=list(encoder_lookup))
+    
+    for feature in freshness_features:
+        if feature in encoder_lookup:
+            values = frame[feature].astype(str) if feature in frame else pd.Series(None, index=frame.index, dtype=object)
+            codes = values.map(encoder_lookup[feature])
+            unseen[feature] = codes.isna()
+            X[feature] = codes.fillna(encoder_fallback[feature]).astype(int)
+        else:
+            values = pd.to_numeric(frame[feature], errors='coerce') if feature in frame else pd.Series(np.nan, index=frame.index)
+            X[feature] = values.fillna(numeric_defaults[feature])
+    
+    with time_inference("freshness", len(X)):
+        probabilities = freshness_model.predict_proba(X[freshness_features])
+    classes = freshness_model.classes_
+    predicted = classes[probabilities.argmax(axis=1)]
+    
+    # Score esperado: promedio del score histórico de cada clase ponderado por su probabilidad
+    class_scores = np.array([risk_score_means.get(c, 0.0) for c in classes])
+    expected_scores = probabilities @ class_scores
+    vida_util = X['vida_util_dias'].to_numpy() if 'vida_util_dias' in X else np.zeros(len(X))
+    
+    results = []
+    for i in range(len(X)):
+        score = float(expected_scores[i])
+        estado, color = RISK_TO_STATUS.get(predicted[i], ("ATENCIÓN", "yellow"))
+        status = freshness_status_from_score(score)
+        results.append({
+            "freshness_score": round(score, 1),
+            "dias_restantes": round(score / 100 * float(vida_util[i]), 1),
+            "estado_frescura": estado,
+            "color_estado": color,
+            "nivel_riesgo": predicted[i],
+            "recomendacion_vuelo": status["recomendacion_vuelo"],
+            "prioridad_uso": status["prioridad_uso"],
+            "probabilidades": {c: round(float(p), 4) for c, p in zip(classes, probabilities[i])},
+            "categorias_desconocidas": [f for f in unseen.columns if unseen.at[i, f] and f in frame and pd.notna(frame.at[i, f])]
+        })
+    return results
+
 def train_freshness_model():
     """
     Entrena el modelo de predicción de frescura
     """
     global freshness_model, label_encoders, model_trained
     
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    
     try:
         print("Iniciando entrenamiento del modelo de frescura...")
         df = load_products_data()
         
-        # Calcular freshness scores para todos los productos
-        freshness_data = []
-        for _, row in df.iterrows():
-            freshness_info = calculate_freshness_score(row)
-            freshness_data.append(freshness_info)
-        
-        # Combinar datos originales con información de frescura
-        df_freshness = df.copy()
-        freshness_df = pd.DataFrame(freshness_data)
-        df_combined = pd.concat([df_freshness, freshness_df], axis=1)
-        
-        # Preparar datos para el modelo
-        features = ['unit_cost', 'vida_util_dias', 'precio_consumidor', 'standard_quantity', 
-                   'units_returned', 'units_consumed', 'suggested_units', 'overload_units']
-        
-        # Codificar variables categóricas
-        categorical_features = ['tipo_servicio', 'aerolinea', 'tipo', 'Category', 'Supplier', 
-                               'Storage_Temperature', 'Quality_Status', 'Storage_Location', 'Stock_Status']
-        
-        X = df_combined[features].copy()
-        
-        # Codificar características categóricas
-        for feature in categorical_features:
-            if feature in df_combined.columns:
-                le = LabelEncoder()
-                X[feature] = le.fit_transform(df_combined[feature].astype(str))
-                label_encoders[feature] = le
+        X, y, encoders, features, categorical_features = build_freshness_training_data(df)
+        label_encoders.update(encoders)
+        build_inference_tables(df, X, y, encoders)
         
-        # Target: nivel de riesgo (clasificación multiclase)
-        y = df_combined['nivel_riesgo']
-        
-        # Dividir datos
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+        # Dividir datos; estratificar exige al menos dos ejemplos por clase y una
+        # fila de prueba por clase
+        class_counts = y.value_counts()
+        if len(class_counts) < 2:
+            raise ValueError(f"Se necesitan al menos dos niveles de riesgo para entrenar; el dataset solo tiene {list(class_counts.index)}")
+        can_stratify = class_counts.min() >= 2 and int(np.ceil(len(y) * 0.2)) >= len(class_counts)
+        if not can_stratify:
+            print(f"División sin estratificar: clases con muy pocos ejemplos {class_counts.to_dict()}")
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42, stratify=y if can_stratify else None
+        )
         
         # Entrenar modelo
         freshness_model = RandomForestClassifier(n_estimators=100, random_state=42)
@@ -168,6 +431,8 @@ def train_freshness_model():
         print(f"Clases: {freshness_model.classes_}")
         
         model_trained = True
+        bump_version("model:freshness")
+        model_warmup.mark_ready("freshness")
         
         return {
             "status": "success",
@@ -176,8 +441,10 @@ def train_freshness_model():
                 "accuracy": round(accuracy, 4),
                 "training_samples": len(X_train),
                 "test_samples": len(X_test),
-                "feature_importance": dict(zip(features + categorical_features, 
-                                             freshness_model.feature_importances_))
+                "feature_importance": {
+                    feature: round(float(importance), 4)
+                    for feature, importance in zip(X.columns, freshness_model.feature_importances_)
+                }
             }
         }
         
@@ -189,13 +456,10 @@ def train_freshness_model():
 @router.on_event("startup")
 async def startup_event():
     """
-    Entrena el modelo automáticamente al iniciar la aplicación
+    Entrena el modelo de frescura al iniciar la aplicación en segundo plano (ver MODEL_WARMUP)
     """
-    try:
-        print("Iniciando entrenamiento del modelo de frescura al startup...")
-        train_freshness_model()
-    except Exception as e:
-        print(f"Error durante startup del modelo de frescura: {e}")
+    print("Iniciando entrenamiento del modelo de frescura al startup...")
+    model_warmup.start("freshness", train_freshness_model)
 
 @router.get("/")
 def test_expiration():
@@ -265,17 +529,18 @@ def get_product_freshness_details(product_id: str):
     Obtiene detalles de frescura de un producto específico
     """
     try:
-        df = load_products_data()
+        df, product_ids, index = load_product_index()
         
-        # Buscar producto por ID (asumiendo que product_id es único)
-        product_row = df[df.index.astype(str) == product_id]
-        if product_row.empty:
+        # Búsqueda O(1) en el índice de llave primaria
+        position = index.get(product_id)
+        if position is None:
             raise HTTPException(status_code=404, detail=f"Producto {product_id} no encontrado")
         
-        product_data = product_row.iloc[0].to_dict()
-        freshness_info = calculate_freshness_score(product_row.iloc[0])
+        product_row = df.iloc[position]
+        product_data = product_row.to_dict()
+        freshness_info = calculate_freshness_score(product_row)
         
-        combined_data = {**product_data, **freshness_info}
+        combined_data = {**product_data, **freshness_info, "product_id": product_ids[position]}
         
         return combined_data
     except HTTPException:
@@ -294,24 +559,16 @@ def get_freshness_alerts(
     Obtiene alertas de productos con frescura baja
     """
     try:
-        df = load_products_data()
+        products, index, scores = load_freshness_table()
         
-        alert_products = []
-        for _, row in df.iterrows():
-            freshness_info = calculate_freshness_score(row)
-            
-            # Filtrar por score de frescura
-            if min_score <= freshness_info['freshness_score'] <= max_score:
-                product_data = row.to_dict()
-                combined_data = {**product_data, **freshness_info}
-                
-                # Aplicar filtros adicionales
-                if estado and freshness_info['estado_frescura'] != estado:
-                    continue
-                if tipo_vuelo and freshness_info['recomendacion_vuelo'] != tipo_vuelo:
-                    continue
-                
-                alert_products.append(combined_data)
+        # Filtrar por score de frescura y filtros adicionales con operaciones de bits
+        bits = index.from_mask((scores >= min_score) & (scores <= max_score))
+        if estado:
+            bits &= index.any_of('estado_frescura', [estado])
+        if tipo_vuelo:
+            bits &= index.any_of('recomendacion_vuelo', [tipo_vuelo])
+        
+        alert_products = [products[i] for i in index.positions(bits)]
         
         # Ordenar por freshness score (menor a mayor)
         alert_products.sort(key=lambda x: x['freshness_score'])
@@ -337,47 +594,25 @@ def get_freshness_analysis_by_category():
     Análisis de frescura por categoría de producto
     """
     try:
-        df = load_products_data()
+        products, index, _ = load_freshness_table()
+        cube = load_freshness_cube()
+        
+        # Conteos por estado de cada categoría (rebanada categoría x estado)
+        estado_columns = {"ÓPTIMO": 'products_optimal', "ATENCIÓN": 'products_attention',
+                          "CRÍTICO": 'products_critical', "EXPIRADO": 'products_expired'}
+        estados_by_category = cube.rollup(['Category', 'estado_frescura'])
         
         categories = {}
-        for _, row in df.iterrows():
-            categoria = row.get('Category', 'Sin categoría')
-            if categoria not in categories:
-                categories[categoria] = {
-                    'total_products': 0,
-                    'avg_freshness_score': 0,
-                    'products_optimal': 0,
-                    'products_attention': 0,
-                    'products_critical': 0,
-                    'products_expired': 0,
-                    'products': []
-                }
-            
-            freshness_info = calculate_freshness_score(row)
-            product_data = row.to_dict()
-            combined_data = {**product_data, **freshness_info}
-            
-            categories[categoria]['total_products'] += 1
-            categories[categoria]['avg_freshness_score'] += freshness_info['freshness_score']
-            categories[categoria]['products'].append(combined_data)
-            
-            # Contar productos por estado
-            estado = freshness_info['estado_frescura']
-            if estado == "ÓPTIMO":
-                categories[categoria]['products_optimal'] += 1
-            elif estado == "ATENCIÓN":
-                categories[categoria]['products_attention'] += 1
-            elif estado == "CRÍTICO":
-                categories[categoria]['products_critical'] += 1
-            elif estado == "EXPIRADO":
-                categories[categoria]['products_expired'] += 1
-        
-        # Calcular promedios
-        for categoria in categories:
-            categories[categoria]['avg_freshness_score'] = round(
-                categories[categoria]['avg_freshness_score'] / categories[categoria]['total_products'], 
-                2
-            )
+        for (categoria,), cell in cube.rollup(['Category']).items():
+            categories[categoria] = {
+                'total_products': cell['count'],
+                'avg_freshness_score': round(cell['mean'], 2),
+                **{
+                    column: estados_by_category.get((categoria, estado), {}).get('count', 0)
+                    for estado, column in estado_columns.items()
+                },
+                'products': [products[i] for i in index.positions(index.any_of('Category', [categoria]))]
+            }
         
         return {
             "analysis_by_category": categories,
@@ -448,10 +683,19 @@ def predict_freshness(
     units_returned: int = Query(..., description="Unidades devueltas"),
     units_consumed: int = Query(..., description="Unidades consumidas"),
     tipo: str = Query(..., description="Tipo de producto"),
-    aerolinea: str = Query(..., description="Aerolínea")
+    aerolinea: str = Query(..., description="Aerolínea"),
+    suggested_units: Optional[float] = Query(None, description="Unidades sugeridas (por defecto: mediana del entrenamiento)"),
+    overload_units: Optional[float] = Query(None, description="Unidades de sobrecarga (por defecto: mediana del entrenamiento)"),
+    tipo_servicio: Optional[str] = Query(None, description="Tipo de servicio"),
+    Category: Optional[str] = Query(None, description="Categoría del producto"),
+    Supplier: Optional[str] = Query(None, description="Proveedor"),
+    Storage_Temperature: Optional[str] = Query(None, description="Temperatura de almacenamiento"),
+    Quality_Status: Optional[str] = Query(None, description="Estado de calidad"),
+    Storage_Location: Optional[str] = Query(None, description="Ubicación de almacenamiento"),
+    Stock_Status: Optional[str] = Query(None, description="Estado de stock")
 ):
     """
-    Predice el nivel de frescura para un nuevo producto
+    Predice el nivel de frescura para un nuevo producto con el modelo entrenado
     """
     global freshness_model, model_trained
     
@@ -470,16 +714,20 @@ def predict_freshness(
             'tipo': tipo,
             'aerolinea': aerolinea
         }
-        
-        # Calcular freshness score manualmente (como fallback)
-        simulated_row = {
-            'vida_util_dias': vida_util_dias,
-            'freshness_score': None
+        optional_data = {
+            'suggested_units': suggested_units,
+            'overload_units': overload_units,
+            'tipo_servicio': tipo_servicio,
+            'Category': Category,
+            'Supplier': Supplier,
+            'Storage_Temperature': Storage_Temperature,
+            'Quality_Status': Quality_Status,
+            'Storage_Location': Storage_Location,
+            'Stock_Status': Stock_Status
         }
-        freshness_info = calculate_freshness_score(simulated_row)
+        input_data.update({k: v for k, v in optional_data.items() if v is not None})
         
-        # Aquí podrías agregar la predicción del modelo si tienes más características
-        # prediction = freshness_model.predict([feature_vector])
+        freshness_info = score_freshness_batch([input_data])[0]
         
         return {
             "prediction": {
@@ -487,8 +735,10 @@ def predict_freshness(
                 "dias_restantes": freshness_info['dias_restantes'],
                 "estado_frescura": freshness_info['estado_frescura'],
                 "recomendacion_vuelo": freshness_info['recomendacion_vuelo'],
-                "nivel_riesgo": freshness_info['nivel_riesgo']
+                "nivel_riesgo": freshness_info['nivel_riesgo'],
+                "probabilidades": freshness_info['probabilidades']
             },
+            "categorias_desconocidas": freshness_info['categorias_desconocidas'],
             "input_parameters": input_data
         }
         
@@ -497,33 +747,67 @@ def predict_freshness(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en la predicción: {str(e)}")
 
+@router.post("/predict-freshness/batch")
+def predict_freshness_batch(
+    products: List[Dict[str, Any]] = Body(..., description="Lista de productos con las features del modelo de frescura")
+):
+    """
+    Predice el nivel de frescura de muchos productos en una sola llamada al modelo.
+    Las features faltantes se completan con la mediana (numéricas) o la categoría
+    más frecuente (categóricas) del entrenamiento.
+    """
+    global freshness_model, model_trained
+    
+    try:
+        if not model_trained or freshness_model is None:
+            raise HTTPException(status_code=503, detail="Modelo no entrenado. Por favor, espere o entrene el modelo primero.")
+        
+        if not products:
+            return {"total_products": 0, "predictions": [], "summary": {}}
+        
+        predictions = score_freshness_batch(products)
+        
+        riesgo_count = {}
+        for prediction in predictions:
+            riesgo_count[prediction['nivel_riesgo']] = riesgo_count.get(prediction['nivel_riesgo'], 0) + 1
+        
+        return {
+            "total_products": len(predictions),
+            "predictions": predictions,
+            "summary": {
+                "riesgo_distribution": riesgo_count,
+                "avg_freshness_score": round(float(np.mean([p['freshness_score'] for p in predictions])), 2)
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la predicción por lote: {str(e)}")
+
 @router.get("/dashboard/stats")
 def get_freshness_dashboard_stats():
     """
     Estadísticas para el dashboard de gestión de frescura
     """
     try:
-        df = load_products_data()
+        cube = load_freshness_cube()
+        totals = cube.totals()
         
-        total_products = len(df)
-        total_categories = len(set(df.get('Category', [])))
-        total_airlines = len(set(df.get('aerolinea', [])))
+        total_products = totals['count']
+        total_categories = len(cube.rollup(['Category']))
+        total_airlines = len(cube.rollup(['aerolinea']))
         
-        # Calcular estadísticas de frescura
-        freshness_scores = []
+        # Distribución de frescura y recomendaciones desde el cubo
         estados_count = {'ÓPTIMO': 0, 'ATENCIÓN': 0, 'CRÍTICO': 0, 'EXPIRADO': 0}
-        recomendaciones_count = {}
-        
-        for _, row in df.iterrows():
-            freshness_info = calculate_freshness_score(row)
-            freshness_scores.append(freshness_info['freshness_score'])
-            estado = freshness_info['estado_frescura']
-            recomendacion = freshness_info['recomendacion_vuelo']
-            
-            estados_count[estado] += 1
-            recomendaciones_count[recomendacion] = recomendaciones_count.get(recomendacion, 0) + 1
+        for (estado,), cell in cube.rollup(['estado_frescura']).items():
+            estados_count[estado] = cell['count']
+        recomendaciones_count = {
+            recomendacion: cell['count']
+            for (recomendacion,), cell in cube.rollup(['recomendacion_vuelo']).items()
+        }
         
-        avg_freshness = round(np.mean(freshness_scores), 2) if freshness_scores else 0
+        avg_freshness = round(totals['mean'], 2) if total_products else 0
         
         # Productos que requieren atención inmediata
         immediate_attention = estados_count['CRÍTICO'] + estados_count['EXPIRADO']
@@ -546,4 +830,244 @@ def get_freshness_dashboard_stats():
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@timed_stage("enrichment")
+def build_fefo_inputs(start_date: Optional[str], end_date: Optional[str], as_of: Optional[str]):
+    """
+    Lotes del inventario y demanda por vuelo x (aerolínea, categoría) para la
+    asignación FEFO. Las unidades de un lote son su standard_quantity y su
+    vencimiento la fecha_expiracion del lote; la demanda es la cantidad estándar
+    del plan de catering. La fecha del inventario es, por defecto, el día de la
+    primera salida del rango; las salidas anteriores ya no se abastecen. Salidas
+    y vencimientos se cuentan en días desde esa misma fecha, y solo entran los
+    lotes recibidos hasta entonces.
+    """
+    from app.routes.consumptionPredictor_routes import build_catering_plan_items, load_flight_schedule_data
+    
+    products, _, _ = load_freshness_table()
+    batches = pd.DataFrame({
+        'batch': [p.get('Batch_Number') for p in products],
+        'location': [p.get('Storage_Location') for p in products],
+        'airline': [p.get('aerolinea') for p in products],
+        'category': [p.get('tipo') for p in products],
+        'units': [p.get('standard_quantity') for p in products],
+        'shelf_life_days': [p.get('vida_util_dias') for p in products],
+        'received_at': pd.to_datetime([p.get(RECEIVED_COLUMN) for p in products], errors='coerce'),
+        'expires_at': pd.to_datetime([p.get(EXPIRY_COLUMN) for p in products], errors='coerce')
+    })
+    batches['units'] = pd.to_numeric(batches['units'], errors='coerce').fillna(0)
+    batches['shelf_life_days'] = pd.to_numeric(batches['shelf_life_days'], errors='coerce').fillna(0)
+    batches['key'] = batches['airline'].astype(str) + '|' + batches['category'].astype(str)
+    
+    items = build_catering_plan_items(start_date, end_date, with_rates=False)
+    demand = (
+        items.groupby(['flight_id', 'airline', 'product_category'], sort=False, as_index=False)
+        .agg(units=('standard_quantity', 'sum'))
+        .rename(columns={'product_category': 'category'})
+    )
+    demand['units'] = np.ceil(demand['units'])
+    demand['key'] = demand['airline'].astype(str) + '|' + demand['category'].astype(str)
+    
+    schedule = load_flight_schedule_data().drop_duplicates('flight_id').set_index('flight_id')
+    departure_time = schedule['departure_time'] if 'departure_time' in schedule else pd.Series('00:00', index=schedule.index)
+    departures = pd.to_datetime(
+        schedule['departure_date'].astype(str) + ' ' + departure_time.fillna('00:00').astype(str), errors='coerce'
+    )
+    demand['departure'] = demand['flight_id'].map(departures)
+    demand['duration_hours'] = demand['flight_id'].map(pd.to_numeric(schedule['duration'], errors='coerce')).fillna(0)
+    demand = demand[demand['departure'].notna()]
+    
+    if as_of:
+        reference = pd.Timestamp(as_of)
+    elif not demand.empty:
+        reference = demand['departure'].min().normalize()
+    else:
+        reference = pd.Timestamp(datetime.now().date())
+    demand['departs_in_days'] = (demand['departure'] - reference) / pd.Timedelta(days=1)
+    demand = demand[demand['departs_in_days'] >= 0].reset_index(drop=True)
+    # Inventario a la fecha de referencia: solo lotes ya recibidos. Un vencimiento
+    # negativo (ya vencido a esa fecha) nunca se asigna
+    batches = batches[~(batches['received_at'] > reference)].reset_index(drop=True)
+    batches['expires_in_days'] = ((batches['expires_at'] - reference) / pd.Timedelta(days=1)).fillna(-np.inf)
+    
+    return batches, demand, reference
+
+@router.get("/allocation/fefo")
+def allocate_batches_fefo(
+    start_date: Optional[str] = Query(None, description="Fecha inicial de salida (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Fecha final de salida (YYYY-MM-DD)"),
+    as_of: Optional[str] = Query(None, description="Fecha del inventario (YYYY-MM-DD); por defecto el día de la primera salida"),
+    long_haul_hours: float = Query(DEFAULT_LONG_HAUL_HOURS, gt=0, description="Duración (horas) a partir de la cual un vuelo es largo")
+):
+    """
+    Asigna los lotes del inventario a las salidas del rango con FEFO: cada
+    vuelo recibe primero los lotes que vencen antes, respetando las reglas de
+    frescura a la hora de salida (vuelos largos: "Largos y Cortos"; vuelos
+    cortos: también "Cortos"; los lotes "Urgente" no se suben a ningún vuelo).
+    """
+    try:
+        for value in (start_date, end_date, as_of):
+            if value:
+                try:
+                    pd.Timestamp(value)
+                except ValueError:
+                    raise HTTPException(status_code=400, detail=f"Fecha inválida: {value}. Use 'YYYY-MM-DD'")
+        
+        batches, demand, reference = build_fefo_inputs(start_date, end_date, as_of)
+        
+        with time_stage("aggregation", "fefo_allocation"):
+            result = allocate_fefo(batches, demand, long_haul_hours=long_haul_hours)
+        picks = result['picks']
+        allocated = result['allocated']
+        remaining = result['remaining']
+        
+        # Asignaciones agrupadas por vuelo y categoría (picks ordenados por fila de demanda)
+        picks = picks.sort_values('demand_row', kind='stable')
+        pick_records = list(zip(
+            batches['batch'].to_numpy()[picks['batch_row']],
+            batches['location'].to_numpy()[picks['batch_row']],
+            picks['units'].to_numpy(),
+            picks['days_left_at_departure'].round(1).to_numpy(),
+            picks['score_at_departure'].round(1).to_numpy()
+        ))
+        pick_bounds = np.searchsorted(picks['demand_row'].to_numpy(), np.arange(len(demand) + 1))
+        
+        flights: Dict[str, Dict[str, Any]] = {}
+        for row, line in enumerate(demand.itertuples(index=False)):
+            flight = flights.setdefault(line.flight_id, {
+                "departure": line.departure.strftime("%Y-%m-%d %H:%M"),
+                "duration_hours": float(line.duration_hours),
+                "haul": "largo" if line.duration_hours > long_haul_hours else "corto",
+                "lines": []
+            })
+            flight["lines"].append({
+                "airline": line.airline,
+                "category": line.category,
+                "requested_units": float(line.units),
+                "allocated_units": float(allocated[row]),
+                "shortfall_units": float(line.units - allocated[row]),
+                "picks": [
+                    {
+                        "batch": batch,
+                        "storage_location": location,
+                        "units": float(units),
+                        "days_left_at_departure": float(days_left),
+                        "score_at_departure": float(score)
+                    }
+                    for batch, location, units, days_left, score in pick_records[pick_bounds[row]:pick_bounds[row + 1]]
+                ]
+            })
+        
+        # Lotes sin asignar según su estado a la fecha del inventario
+        score_now = np.clip(batches['expires_in_days'] / batches['shelf_life_days'].clip(lower=1e-9) * 100, 0, 100)
+        leftover = remaining > 0
+        urgent = leftover & (score_now < SHORT_HAUL_MIN_SCORE).to_numpy()
+        picked_by_location = picks.groupby(batches['location'].to_numpy()[picks['batch_row']])['units'].sum() if not picks.empty else pd.Series(dtype=float)
+        
+        requested_units = float(demand['units'].sum())
+        allocated_units = float(allocated.sum())
+        
+        return {
+            "as_of": reference.strftime("%Y-%m-%d"),
+            "date_range": {"start_date": start_date, "end_date": end_date},
+            "rules": {
+                "long_haul_hours": long_haul_hours,
+                "long_haul_min_score": LONG_HAUL_MIN_SCORE,
+                "short_haul_min_score": SHORT_HAUL_MIN_SCORE
+            },
+            "flights": flights,
+            "picks_by_storage_location": {location: float(units) for location, units in picked_by_location.items()},
+            "summary": {
+                "total_flights": len(flights),
+                "demand_lines": len(demand),
+                "total_batches": len(batches),
+                "batches_used": int(picks['batch_row'].nunique()) if not picks.empty else 0,
+                "requested_units": requested_units,
+                "allocated_units": allocated_units,
+                "shortfall_units": requested_units - allocated_units,
+                "fill_rate": round(allocated_units / requested_units * 100, 2) if requested_units else 0,
+                "fully_served_lines": int((allocated >= demand['units'].to_numpy()).sum()),
+                "inventory_units": float(batches['units'].sum()),
+                "leftover_units": float(remaining[leftover].sum()),
+                "leftover_urgent_units": float(remaining[urgent].sum()),
+                "leftover_urgent_batches": int(urgent.sum())
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la asignación FEFO: {str(e)}")
+
+@router.get("/expiring")
+def get_expiring_batches(
+    days: float = Query(7, ge=0, description="Lotes que vencen en los próximos N días"),
+    include_expired: bool = Query(False, description="Incluir los lotes ya vencidos"),
+    limit: Optional[int] = Query(None, ge=1, description="Máximo de lotes a devolver")
+):
+    """
+    Lotes que vencen en los próximos N días, ordenados por fecha de vencimiento.
+    Es una búsqueda binaria sobre el índice de vencimientos, no un recorrido de la tabla.
+    """
+    try:
+        calendar = load_expiry_calendar()
+        df, product_ids, _ = load_product_index()
+        
+        positions = calendar.expiring_within(days, include_expired=include_expired)
+        selected = positions[:limit] if limit else positions
+        remaining = calendar.remaining_days()[selected]
+        percentage = calendar.life_percentage()[selected]
+        
+        columns = [column for column in ['Batch_Number', 'aerolinea', 'tipo', 'Category', 'Storage_Location', 'vida_util_dias']
+                   if column in df.columns]
+        rows = df.iloc[selected][columns].to_dict(orient='records')
+        
+        return {
+            "as_of": today_reference().strftime("%Y-%m-%d"),
+            "days": days,
+            "include_expired": include_expired,
+            "total_matches": len(positions),
+            "returned": len(selected),
+            "batches": [
+                {
+                    "product_id": product_ids[position],
+                    **row,
+                    "fecha_recepcion": str(calendar.received[position]),
+                    "fecha_expiracion": str(calendar.expiry[position]),
+                    "dias_restantes": round(float(remaining[i]), 1),
+                    "porcentaje_vida_util": round(float(percentage[i]), 1)
+                }
+                for i, (position, row) in enumerate(zip(selected, rows))
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@router.get("/calendar")
+def get_expiry_calendar(
+    days: int = Query(30, ge=1, le=3650, description="Horizonte en días"),
+    bucket_days: int = Query(1, ge=1, le=365, description="Días por cubeta")
+):
+    """
+    Calendario de vencimientos: cuántos lotes vencen en cada cubeta de días a partir de hoy
+    """
+    try:
+        calendar = load_expiry_calendar()
+        buckets = calendar.buckets(days, bucket_days)
+        
+        return {
+            "as_of": today_reference().strftime("%Y-%m-%d"),
+            "days": days,
+            "bucket_days": bucket_days,
+            "total_batches": len(calendar),
+            "already_expired": len(calendar.expired()),
+            "expiring_in_horizon": sum(bucket["vencen"] for bucket in buckets),
+            "buckets": buckets
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
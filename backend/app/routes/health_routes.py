@@ -0,0 +1,32 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.utils.startup_profile import startup_profile
+from app.utils.warmup import model_warmup, get_warmup_mode
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+# Liveness: el proceso está arriba y atiende peticiones
+@router.get("/live")
+def liveness():
+    return {"status": "serving"}
+
+# Readiness: los modelos terminaron de entrenarse
+@router.get("/ready")
+def readiness():
+    """
+    200 cuando todos los modelos están listos, 503 mientras se calientan.
+    Los endpoints que no usan modelos responden desde antes.
+    """
+    models = model_warmup.status()
+    ready = model_warmup.all_ready()
+    body = {
+        "status": "ready" if ready else "warming",
+        "warmup_mode": get_warmup_mode(),
+        "models": models
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+# Perfil de arranque: etapas, marcas de tiempo y módulos pesados cargados
+@router.get("/startup")
+def startup_report():
+    return {**startup_profile.report(), "models": model_warmup.status()}
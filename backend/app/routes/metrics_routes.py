@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.utils.metrics import registry
+
+router = APIRouter(tags=["Metrics"])
+
+# Formato de exposición de texto de Prometheus
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Conteos y latencias por ruta, tiempo por etapa interna, aciertos de
+    cachés y tamaños de lote de inferencia
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
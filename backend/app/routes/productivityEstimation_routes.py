@@ -1,10 +1,52 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 import pandas as pd
 import os
 from typing import Dict, Any, List, Optional
+from app.utils.utils import get_data_dir, get_data_path
+from app.utils.singleflight import single_flight
+from app.utils.memo import versioned_memo
+from app.utils.metrics import registry, time_stage, timed_stage
+from app.utils.changelog import change_log
+from app.services.compactStore_service import CompactTable
+from app.services.cameraHealth_service import (
+    CAMERA_COLUMNS, DEFAULT_TOLERANCE, DEFAULT_WINDOW, prepare_sessions, group_metrics, camera_health, to_records
+)
+from app.services.detectionIngest_service import DetectionStore, arrow_supported, decode_batch, is_arrow
 
 router = APIRouter(prefix="/productivity", tags=["Productivity Estimation"])
 
+# Columnas de cada sesión y el tipo con el que se exponen
+SESSION_TYPES = {
+    "nombre_operario": str,
+    "puesto": str,
+    "turno": str,
+    "area_trabajo": str,
+    "fecha_inicio": str,
+    "fecha_fin": str,
+    "duracion_sesion_seg": float,
+    "duracion_sesion_min": float,
+    "conteo_total_items": int,
+    "tasa_items_por_minuto": float,
+    "eficiencia_operario": float,
+    "fps_promedio": float,
+    "frames_procesados": int,
+    "fuente_video": str,
+    "camara_id": str,
+    "ubicacion_camara": str,
+    "estado_sesion": str,
+    "errores_deteccion": int,
+    "precision_promedio": float,
+    "brazo_dominante": str,
+    "uso_brazo_izquierdo": float,
+    "uso_brazo_derecho": float,
+    "movimientos_eficientes": float,
+    "country": str,
+    "ciudad": str
+}
+SESSION_COLUMNS = list(SESSION_TYPES)
+
+@versioned_memo("productivity:sessions", datasets=['productivity_data.csv'])
 def load_productivity_data_from_csv() -> Dict[str, Any]:
     """
     Carga los datos de productividad desde el archivo CSV
@@ -15,14 +57,9 @@ def load_productivity_data_from_csv() -> Dict[str, Any]:
         print(f"=== PRODUCTIVITY DEBUG INFO ===")
         print(f"Directorio actual del script: {current_dir}")
         
-        # Construir la ruta paso a paso (igual que en data_routes)
-        app_dir = os.path.dirname(current_dir)  # Salir de routes a app
-        backend_dir = os.path.dirname(app_dir)  # Salir de app a backend
-        project_root = os.path.dirname(backend_dir)  # Salir de backend al root del proyecto
-        data_dir = os.path.join(project_root, 'data')  # Entrar a data
-        
-        csv_path = os.path.join(data_dir, 'productivity_data.csv')
-        csv_path = os.path.abspath(csv_path)  # Normalizar la ruta
+        # Construir la ruta al CSV
+        data_dir = get_data_dir()
+        csv_path = get_data_path('productivity_data.csv')
         
         print(f"Ruta construida del CSV: {csv_path}")
         print(f"¿Existe el directorio data?: {os.path.exists(data_dir)}")
@@ -37,44 +74,18 @@ def load_productivity_data_from_csv() -> Dict[str, Any]:
             raise FileNotFoundError(f"Archivo no encontrado: {csv_path}")
         
         # Leer el CSV
-        df = pd.read_csv(csv_path)
+        with time_stage("csv_load", "productivity_data.csv"):
+            df = pd.read_csv(csv_path)
         print(f"CSV leído correctamente. Filas: {len(df)}")
         print(f"Columnas: {df.columns.tolist()}")
         
-        # Convertir a diccionario con la estructura esperada
-        productivity_data = {}
-        
-        for _, row in df.iterrows():
-            sesion_id = row['sesion_id']
-            productivity_data[sesion_id] = {
-                "nombre_operario": row['nombre_operario'],
-                "puesto": row['puesto'],
-                "turno": row['turno'],
-                "area_trabajo": row['area_trabajo'],
-                "fecha_inicio": row['fecha_inicio'],
-                "fecha_fin": row['fecha_fin'],
-                "duracion_sesion_seg": float(row['duracion_sesion_seg']),
-                "duracion_sesion_min": float(row['duracion_sesion_min']),
-                "conteo_total_items": int(row['conteo_total_items']),
-                "tasa_items_por_minuto": float(row['tasa_items_por_minuto']),
-                "eficiencia_operario": float(row['eficiencia_operario']),
-                "fps_promedio": float(row['fps_promedio']),
-                "frames_procesados": int(row['frames_procesados']),
-                "fuente_video": row['fuente_video'],
-                "camara_id": row['camara_id'],
-                "ubicacion_camara": row['ubicacion_camara'],
-                "estado_sesion": row['estado_sesion'],
-                "errores_deteccion": int(row['errores_deteccion']),
-                "precision_promedio": float(row['precision_promedio']),
-                "brazo_dominante": row['brazo_dominante'],
-                "uso_brazo_izquierdo": float(row['uso_brazo_izquierdo']),
-                "uso_brazo_derecho": float(row['uso_brazo_derecho']),
-                "movimientos_eficientes": float(row['movimientos_eficientes']),
-                "country": row['country'],
-                "ciudad": row['ciudad']
-            }
+        # Convertir a diccionario con la estructura esperada: cada sesión es una
+        # vista de solo lectura sobre una tabla compacta (categorías y numéricos reducidos)
+        sessions = CompactTable(df[SESSION_COLUMNS], python_types=SESSION_TYPES)
+        productivity_data = dict(zip(df['sesion_id'], sessions.rows()))
         
         print(f"Datos procesados. Sesiones: {list(productivity_data.keys())}")
+        change_log.capture("sessions", df[SESSION_COLUMNS].set_axis(df['sesion_id']))
         return productivity_data
         
     except FileNotFoundError as e:
@@ -90,6 +101,8 @@ def load_productivity_data_from_csv() -> Dict[str, Any]:
         print(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
+change_log.register_source("sessions", ['productivity_data.csv'], load_productivity_data_from_csv)
+
 # Ruta para obtener todas las sesiones de productividad
 @router.get("/")
 def get_all_sessions():
@@ -191,6 +204,135 @@ def get_sessions_by_city(ciudad: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+@single_flight("productivity:estadisticas_generales", datasets=['productivity_data.csv'])
+@timed_stage("aggregation")
+def build_general_statistics() -> Dict[str, Any]:
+    """
+    Calcula las estadísticas generales de todas las sesiones;
+    las peticiones concurrentes comparten un solo cálculo
+    """
+    productivity_data = load_productivity_data_from_csv()
+    
+    if not productivity_data:
+        return {"message": "No hay datos disponibles"}
+    
+    # Calcular estadísticas
+    total_sessions = len(productivity_data)
+    total_items = sum(session['conteo_total_items'] for session in productivity_data.values())
+    avg_efficiency = sum(session['eficiencia_operario'] for session in productivity_data.values()) / total_sessions
+    avg_items_per_minute = sum(session['tasa_items_por_minuto'] for session in productivity_data.values()) / total_sessions
+    
+    # Encontrar operarios más eficientes
+    operators = {}
+    for session in productivity_data.values():
+        operator = session['nombre_operario']
+        if operator not in operators:
+            operators[operator] = {
+                'total_sessions': 0,
+                'total_items': 0,
+                'avg_efficiency': 0,
+                'areas_trabajo': set(),
+                'countries': set(),
+                'ciudades': set()
+            }
+        
+        operators[operator]['total_sessions'] += 1
+        operators[operator]['total_items'] += session['conteo_total_items']
+        operators[operator]['avg_efficiency'] += session['eficiencia_operario']
+        operators[operator]['areas_trabajo'].add(session['area_trabajo'])
+        operators[operator]['countries'].add(session['country'])
+        operators[operator]['ciudades'].add(session['ciudad'])
+    
+    # Calcular promedios por operario
+    for operator in operators:
+        operators[operator]['avg_efficiency'] /= operators[operator]['total_sessions']
+        operators[operator]['areas_trabajo'] = list(operators[operator]['areas_trabajo'])
+        operators[operator]['countries'] = list(operators[operator]['countries'])
+        operators[operator]['ciudades'] = list(operators[operator]['ciudades'])
+    
+    # Ordenar operarios por eficiencia
+    top_operators = sorted(
+        [(op, data) for op, data in operators.items()],
+        key=lambda x: x[1]['avg_efficiency'],
+        reverse=True
+    )[:5]  # Top 5 operarios
+    
+    # Estadísticas por país
+    countries_stats = {}
+    for session in productivity_data.values():
+        country = session['country']
+        if country not in countries_stats:
+            countries_stats[country] = {
+                'total_sessions': 0,
+                'total_items': 0,
+                'avg_efficiency': 0,
+                'ciudades': set()
+            }
+        
+        countries_stats[country]['total_sessions'] += 1
+        countries_stats[country]['total_items'] += session['conteo_total_items']
+        countries_stats[country]['avg_efficiency'] += session['eficiencia_operario']
+        countries_stats[country]['ciudades'].add(session['ciudad'])
+    
+    # Calcular promedios por país
+    for country in countries_stats:
+        countries_stats[country]['avg_efficiency'] = round(
+            countries_stats[country]['avg_efficiency'] / countries_stats[country]['total_sessions'], 
+            2
+        )
+        countries_stats[country]['ciudades'] = list(countries_stats[country]['ciudades'])
+    
+    # Estadísticas por ciudad
+    cities_stats = {}
+    for session in productivity_data.values():
+        ciudad = session['ciudad']
+        if ciudad not in cities_stats:
+            cities_stats[ciudad] = {
+                'total_sessions': 0,
+                'total_items': 0,
+                'avg_efficiency': 0,
+                'country': session['country']
+            }
+        
+        cities_stats[ciudad]['total_sessions'] += 1
+        cities_stats[ciudad]['total_items'] += session['conteo_total_items']
+        cities_stats[ciudad]['avg_efficiency'] += session['eficiencia_operario']
+    
+    # Calcular promedios por ciudad
+    for ciudad in cities_stats:
+        cities_stats[ciudad]['avg_efficiency'] = round(
+            cities_stats[ciudad]['avg_efficiency'] / cities_stats[ciudad]['total_sessions'], 
+            2
+        )
+    
+    return {
+        "estadisticas_generales": {
+            "total_sesiones": total_sessions,
+            "total_items_recolectados": total_items,
+            "eficiencia_promedio": round(avg_efficiency, 2),
+            "tasa_items_promedio_por_minuto": round(avg_items_per_minute, 2),
+            "precision_promedio_deteccion": round(sum(session['precision_promedio'] for session in productivity_data.values()) / total_sessions, 2)
+        },
+        "top_operarios": [
+            {
+                "nombre": operator,
+                "eficiencia_promedio": round(data['avg_efficiency'], 2),
+                "total_sesiones": data['total_sessions'],
+                "total_items": data['total_items'],
+                "areas_trabajo": data['areas_trabajo'],
+                "paises": data['countries'],
+                "ciudades": data['ciudades']
+            }
+            for operator, data in top_operators
+        ],
+        "distribucion_turnos": {
+            "matutino": len([s for s in productivity_data.values() if s['turno'] == 'Matutino']),
+            "vespertino": len([s for s in productivity_data.values() if s['turno'] == 'Vespertino'])
+        },
+        "estadisticas_por_pais": countries_stats,
+        "estadisticas_por_ciudad": cities_stats
+    }
+
 # Ruta para obtener estadísticas generales
 @router.get("/estadisticas/generales")
 def get_general_statistics():
@@ -198,128 +340,7 @@ def get_general_statistics():
     Obtiene estadísticas generales de todas las sesiones
     """
     try:
-        productivity_data = load_productivity_data_from_csv()
-        
-        if not productivity_data:
-            return {"message": "No hay datos disponibles"}
-        
-        # Calcular estadísticas
-        total_sessions = len(productivity_data)
-        total_items = sum(session['conteo_total_items'] for session in productivity_data.values())
-        avg_efficiency = sum(session['eficiencia_operario'] for session in productivity_data.values()) / total_sessions
-        avg_items_per_minute = sum(session['tasa_items_por_minuto'] for session in productivity_data.values()) / total_sessions
-        
-        # Encontrar operarios más eficientes
-        operators = {}
-        for session in productivity_data.values():
-            operator = session['nombre_operario']
-            if operator not in operators:
-                operators[operator] = {
-                    'total_sessions': 0,
-                    'total_items': 0,
-                    'avg_efficiency': 0,
-                    'areas_trabajo': set(),
-                    'countries': set(),
-                    'ciudades': set()
-                }
-            
-            operators[operator]['total_sessions'] += 1
-            operators[operator]['total_items'] += session['conteo_total_items']
-            operators[operator]['avg_efficiency'] += session['eficiencia_operario']
-            operators[operator]['areas_trabajo'].add(session['area_trabajo'])
-            operators[operator]['countries'].add(session['country'])
-            operators[operator]['ciudades'].add(session['ciudad'])
-        
-        # Calcular promedios por operario
-        for operator in operators:
-            operators[operator]['avg_efficiency'] /= operators[operator]['total_sessions']
-            operators[operator]['areas_trabajo'] = list(operators[operator]['areas_trabajo'])
-            operators[operator]['countries'] = list(operators[operator]['countries'])
-            operators[operator]['ciudades'] = list(operators[operator]['ciudades'])
-        
-        # Ordenar operarios por eficiencia
-        top_operators = sorted(
-            [(op, data) for op, data in operators.items()],
-            key=lambda x: x[1]['avg_efficiency'],
-            reverse=True
-        )[:5]  # Top 5 operarios
-        
-        # Estadísticas por país
-        countries_stats = {}
-        for session in productivity_data.values():
-            country = session['country']
-            if country not in countries_stats:
-                countries_stats[country] = {
-                    'total_sessions': 0,
-                    'total_items': 0,
-                    'avg_efficiency': 0,
-                    'ciudades': set()
-                }
-            
-            countries_stats[country]['total_sessions'] += 1
-            countries_stats[country]['total_items'] += session['conteo_total_items']
-            countries_stats[country]['avg_efficiency'] += session['eficiencia_operario']
-            countries_stats[country]['ciudades'].add(session['ciudad'])
-        
-        # Calcular promedios por país
-        for country in countries_stats:
-            countries_stats[country]['avg_efficiency'] = round(
-                countries_stats[country]['avg_efficiency'] / countries_stats[country]['total_sessions'], 
-                2
-            )
-            countries_stats[country]['ciudades'] = list(countries_stats[country]['ciudades'])
-        
-        # Estadísticas por ciudad
-        cities_stats = {}
-        for session in productivity_data.values():
-            ciudad = session['ciudad']
-            if ciudad not in cities_stats:
-                cities_stats[ciudad] = {
-                    'total_sessions': 0,
-                    'total_items': 0,
-                    'avg_efficiency': 0,
-                    'country': session['country']
-                }
-            
-            cities_stats[ciudad]['total_sessions'] += 1
-            cities_stats[ciudad]['total_items'] += session['conteo_total_items']
-            cities_stats[ciudad]['avg_efficiency'] += session['eficiencia_operario']
-        
-        # Calcular promedios por ciudad
-        for ciudad in cities_stats:
-            cities_stats[ciudad]['avg_efficiency'] = round(
-                cities_stats[ciudad]['avg_efficiency'] / cities_stats[ciudad]['total_sessions'], 
-                2
-            )
-        
-        return {
-            "estadisticas_generales": {
-                "total_sesiones": total_sessions,
-                "total_items_recolectados": total_items,
-                "eficiencia_promedio": round(avg_efficiency, 2),
-                "tasa_items_promedio_por_minuto": round(avg_items_per_minute, 2),
-                "precision_promedio_deteccion": round(sum(session['precision_promedio'] for session in productivity_data.values()) / total_sessions, 2)
-            },
-            "top_operarios": [
-                {
-                    "nombre": operator,
-                    "eficiencia_promedio": round(data['avg_efficiency'], 2),
-                    "total_sesiones": data['total_sessions'],
-                    "total_items": data['total_items'],
-                    "areas_trabajo": data['areas_trabajo'],
-                    "paises": data['countries'],
-                    "ciudades": data['ciudades']
-                }
-                for operator, data in top_operators
-            ],
-            "distribucion_turnos": {
-                "matutino": len([s for s in productivity_data.values() if s['turno'] == 'Matutino']),
-                "vespertino": len([s for s in productivity_data.values() if s['turno'] == 'Vespertino'])
-            },
-            "estadisticas_por_pais": countries_stats,
-            "estadisticas_por_ciudad": cities_stats
-        }
-        
+        return build_general_statistics()
     except HTTPException:
         raise
     except Exception as e:
@@ -921,4 +942,199 @@ def compare_cities(
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@versioned_memo("productivity:camera_sessions", datasets=['productivity_data.csv'])
+def load_camera_sessions() -> pd.DataFrame:
+    """
+    Historial de sesiones con las métricas del pipeline de visión, ordenado por
+    cámara y fecha, una vez por versión del CSV
+    """
+    try:
+        with time_stage("csv_load", "productivity_data.csv"):
+            df = pd.read_csv(get_data_path('productivity_data.csv'), usecols=CAMERA_COLUMNS)
+        return prepare_sessions(df)
+    except Exception as e:
+        error_msg = f"Error leyendo métricas de cámaras: {str(e)}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@versioned_memo("productivity:camera_zones", datasets=['productivity_data.csv'])
+def load_zone_metrics() -> pd.DataFrame:
+    """
+    Métricas por zona (ubicación de la cámara), que no dependen de los parámetros de la consulta
+    """
+    return group_metrics(load_camera_sessions(), 'ubicacion_camara')
+
+@timed_stage("aggregation")
+def build_camera_health(tolerancia: float, ventana: int, fps_esperado: Optional[float]):
+    """
+    Tablas de salud por cámara y por zona (ubicación de la cámara). Se calcula
+    en cada consulta: los parámetros llegan del cliente y no conviene memorizarlos
+    """
+    sessions = load_camera_sessions()
+    cameras = camera_health(sessions, tolerancia, ventana, fps_esperado)
+    zones = load_zone_metrics().copy()
+    zones['camaras_con_alerta'] = cameras.groupby('ubicacion_camara')['alerta_fps'].sum().reindex(zones.index).fillna(0).astype(int)
+    cameras = cameras.sort_values(['alerta_fps', 'fps_vs_esperado'], ascending=[False, True])
+    return sessions, cameras, zones
+
+# Ruta para la salud de las cámaras del pipeline de visión
+@router.get("/camaras/salud")
+def get_camera_health(
+    tolerancia: float = Query(DEFAULT_TOLERANCE, ge=0, lt=1, description="Caída de fps tolerada frente a la tasa esperada (0.1 = 10%)"),
+    ventana: int = Query(DEFAULT_WINDOW, ge=1, le=1000, description="Sesiones recientes con las que se mide el fps actual de cada cámara"),
+    fps_esperado: Optional[float] = Query(None, gt=0, description="Tasa esperada para todas las cámaras; por defecto la mediana histórica de cada una"),
+    zona: Optional[str] = Query(None, description="Filtrar por ubicación de la cámara"),
+    solo_alertas: bool = Query(False, description="Solo cámaras con fps por debajo de lo esperado")
+):
+    """
+    Throughput, errores por cada 1000 frames y tendencia de precisión por
+    cámara y por zona, calculados sobre todo el historial de sesiones, con
+    alerta para las cámaras cuyo fps reciente cae por debajo de lo esperado
+    """
+    try:
+        sessions, cameras, zones = build_camera_health(tolerancia, ventana, fps_esperado)
+        total_alerts = int(cameras['alerta_fps'].sum())
+        
+        if zona:
+            cameras = cameras[cameras['ubicacion_camara'].str.lower() == zona.lower()]
+            zones = zones[zones.index.str.lower() == zona.lower()]
+            if zones.empty:
+                raise HTTPException(status_code=404, detail=f"No sessions found for zone: {zona}")
+        if solo_alertas:
+            cameras = cameras[cameras['alerta_fps']]
+        
+        frames = sessions['frames_procesados'].sum()
+        seconds = sessions['duracion_sesion_seg'].sum()
+        
+        return {
+            "parametros": {
+                "tolerancia": tolerancia,
+                "ventana": ventana,
+                "fps_esperado": fps_esperado,
+                "zona": zona,
+                "solo_alertas": solo_alertas
+            },
+            "resumen": {
+                "total_sesiones": len(sessions),
+                "total_camaras": int(sessions['camara_id'].nunique()),
+                "total_zonas": int(sessions['ubicacion_camara'].nunique()),
+                "camaras_con_alerta": total_alerts,
+                "throughput_fps": round(float(frames / seconds), 3) if seconds > 0 else None,
+                "errores_por_1k_frames": round(float(sessions['errores_deteccion'].sum() / frames * 1000), 3) if frames > 0 else None,
+                "precision_promedio": round(float((sessions['precision_promedio'] * sessions['frames_procesados']).sum() / frames), 3) if frames > 0 else None
+            },
+            "camaras": to_records(cameras, 'camara_id'),
+            "zonas": to_records(zones, 'ubicacion_camara')
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+# Eventos de detección por frame del tracker (ver detectionIngest_service)
+detection_store: Optional[DetectionStore] = None
+detection_events_total = registry.counter(
+    "app_detection_events_total", "Eventos de detección recibidos por cámara", ["camara_id"]
+)
+
+def get_detection_store() -> DetectionStore:
+    """
+    Store de detecciones; las partes columnares se escriben en DETECTIONS_DIR o en data/detections
+    """
+    global detection_store
+    if detection_store is None:
+        detection_store = DetectionStore(os.environ.get("DETECTIONS_DIR") or get_data_path('detections'))
+    return detection_store
+
+@router.on_event("shutdown")
+def flush_detections_on_shutdown():
+    if detection_store is not None:
+        detection_store.flush()
+
+def ingest_detection_body(body: bytes, content_type: Optional[str], sesion_id: str, camara_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Decodifica e ingiere un lote y arma la respuesta. Bloquea (restaurar la
+    sesión desde disco, esperar escrituras pendientes), así que desde la ruta
+    async se ejecuta en el threadpool
+    """
+    store = get_detection_store()
+    try:
+        batch = decode_batch(body, content_type)
+        result = store.ingest(sesion_id, batch, camara_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    detection_events_total.inc(len(batch), camara_id=camara_id or "")
+    
+    return {
+        "sesion_id": sesion_id,
+        **result,
+        "resumen": store.summary(sesion_id)
+    }
+
+# Ruta para ingerir lotes binarios de eventos de detección
+@router.post("/detecciones/ingesta")
+async def ingest_detections(
+    request: Request,
+    sesion_id: str = Query(..., description="Sesión a la que pertenecen los eventos"),
+    camara_id: Optional[str] = Query(None, description="Cámara que generó los eventos")
+):
+    """
+    Recibe un lote de eventos (frame, timestamp, items, arm) como registros
+    NumPy empaquetados, un arreglo .npy o Arrow IPC, y devuelve el resumen
+    incremental de la sesión
+    """
+    try:
+        content_type = request.headers.get("content-type")
+        if is_arrow(content_type) and not arrow_supported():
+            raise HTTPException(status_code=415, detail="Arrow IPC no disponible: instale pyarrow o envíe registros NumPy")
+        
+        body = await request.body()
+        return await run_in_threadpool(ingest_detection_body, body, content_type, sesion_id, camara_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+# Ruta para el resumen incremental de una sesión ingerida
+@router.get("/detecciones/{sesion_id}/resumen")
+def get_detection_summary(sesion_id: str):
+    """
+    Resumen de la sesión derivado de sus eventos de detección, con las mismas
+    columnas de productivity_data.csv
+    """
+    try:
+        summary = get_detection_store().summary(sesion_id)
+        if summary is None:
+            raise HTTPException(status_code=404, detail=f"No detection events for session {sesion_id}")
+        return summary
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+# Ruta para el estado de los buffers de detecciones
+@router.get("/detecciones/estado")
+def get_detection_status():
+    """
+    Sesiones activas, eventos recibidos, escritos y en buffer
+    """
+    return get_detection_store().stats()
+
+# Ruta para vaciar los buffers de detecciones a disco
+@router.post("/detecciones/flush")
+def flush_detections(
+    sesion_id: Optional[str] = Query(None, description="Sesión a vaciar; por defecto todas")
+):
+    """
+    Escribe lo que queda en los buffers y espera a que termine la escritura
+    """
+    try:
+        return get_detection_store().flush(sesion_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No detection events for session {sesion_id}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
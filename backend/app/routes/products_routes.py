@@ -2,24 +2,40 @@ from fastapi import APIRouter, HTTPException, Query
 from datetime import datetime, timedelta
 import pandas as pd
 import os
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Mapping, Optional, Tuple
+import numpy as np
+from app.utils.utils import get_data_dir, get_data_path, get_dataset_mtime
+from app.utils.singleflight import single_flight
+from app.utils.memo import versioned_memo
+from app.utils.metrics import time_stage, timed_stage
+from app.utils.changelog import change_log
+from app.utils.indexes import assign_product_ids
+from app.services.bitmapIndex_service import BitmapIndex
+from app.services.rollupCube_service import RollupCube
+from app.services.compactStore_service import CompactTable
+from app.services.expiryCalendar_service import DAY, EXPIRY_COLUMN, RECEIVED_COLUMN, batch_dates, remaining_life, today_reference
 
 router = APIRouter(prefix="/products", tags=["Products Management"])
 
-def load_products_data_from_csv() -> List[Dict[str, Any]]:
+def _format_datetime(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value is not None else None
+
+def _format_date(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime('%Y-%m-%d') if value is not None else None
+
+# Las fechas se guardan como datetime64 y se entregan como texto
+PRODUCT_TYPES = {RECEIVED_COLUMN: _format_datetime, EXPIRY_COLUMN: _format_datetime}
+
+@versioned_memo("products:raw", datasets=['products_data_augmented.csv'])
+def load_products_data_from_csv() -> CompactTable:
     """
-    Carga los datos de productos desde el archivo CSV aumentado
+    Carga los datos de productos desde el archivo CSV aumentado como tabla
+    compacta; table.rows() da cada producto como vista de solo lectura
     """
     try:
         # Construir la ruta al archivo CSV
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        app_dir = os.path.dirname(current_dir)  # Salir de routes a app
-        backend_dir = os.path.dirname(app_dir)  # Salir de app a backend
-        project_root = os.path.dirname(backend_dir)  # Salir de backend al root del proyecto
-        data_dir = os.path.join(project_root, 'data')  # Entrar a data
-        
-        csv_path = os.path.join(data_dir, 'products_data_augmented.csv')
-        csv_path = os.path.abspath(csv_path)  # Normalizar la ruta
+        data_dir = get_data_dir()
+        csv_path = get_data_path('products_data_augmented.csv')
         
         print(f"=== PRODUCTS AUGMENTED DEBUG INFO ===")
         print(f"Ruta construida del CSV: {csv_path}")
@@ -30,34 +46,35 @@ def load_products_data_from_csv() -> List[Dict[str, Any]]:
             raise FileNotFoundError(f"Archivo no encontrado: {csv_path}")
         
         # Leer el CSV
-        df = pd.read_csv(csv_path)
+        with time_stage("csv_load", "products_data_augmented.csv"):
+            df = pd.read_csv(csv_path)
         print(f"CSV aumentado leído correctamente. Filas: {len(df)}")
         print(f"Columnas: {df.columns.tolist()}")
         print("=================================")
         
-        # Convertir a lista de diccionarios y agregar IDs y nombres generados
-        products_data = []
-        for index, row in df.iterrows():
-            product_dict = row.to_dict()
-            
-            # Generar ID único basado en el índice y datos del producto
-            product_id = f"prod-{index:03d}-{product_dict['aerolinea'].replace(' ', '').lower()}"
-            
-            # Generar nombre descriptivo basado en categoría y tipo
-            category = product_dict.get('Category', 'Producto')
-            product_type = product_dict.get('tipo', 'General')
-            airline = product_dict.get('aerolinea', 'Aerolínea')
-            product_name = f"{category} {product_type} - {airline}"
-            
-            # Agregar campos generados
-            product_dict['product_id'] = product_id
-            product_dict['product_name'] = product_name
-            product_dict['nombre_producto'] = product_name
-            product_dict['id'] = product_id
-            
-            products_data.append(product_dict)
+        # IDs estables a partir del lote y la aerolínea (no dependen de la posición de la fila)
+        product_ids = assign_product_ids(df)
+        # Registro de cambios sobre las columnas del CSV (las fechas estimadas se
+        # recalculan con cada versión del archivo y no cuentan como cambios del lote)
+        change_log.capture("products", df.set_axis(product_ids))
         
-        return products_data
+        # Generar nombre descriptivo basado en categoría y tipo
+        category = df['Category'] if 'Category' in df.columns else 'Producto'
+        product_type = df['tipo'] if 'tipo' in df.columns else 'General'
+        product_names = category + " " + product_type + " - " + df['aerolinea']
+        
+        # Agregar campos generados
+        df['product_id'] = product_ids
+        df['product_name'] = product_names
+        df['nombre_producto'] = product_names
+        df['id'] = product_ids
+        
+        # Fechas de recepción y vencimiento del lote, fijas para esta versión del CSV
+        snapshot = datetime.fromtimestamp(get_dataset_mtime('products_data_augmented.csv'))
+        df[RECEIVED_COLUMN], df[EXPIRY_COLUMN] = batch_dates(df, snapshot)
+        
+        # Guardar en formato compacto (categorías y numéricos reducidos)
+        return CompactTable(df, python_types=PRODUCT_TYPES)
         
     except FileNotFoundError as e:
         error_msg = f"Archivo CSV de productos aumentado no encontrado: {str(e)}"
@@ -68,40 +85,256 @@ def load_products_data_from_csv() -> List[Dict[str, Any]]:
         print(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
-def calculate_expiration_metrics(product: Dict[str, Any]) -> Dict[str, Any]:
+change_log.register_source("products", ['products_data_augmented.csv'], load_products_data_from_csv)
+
+def calculate_expiration_metrics(product: Mapping[str, Any]) -> Dict[str, Any]:
     """
-    Calcula métricas relacionadas con la expiración basadas en freshness_score
+    Calcula métricas relacionadas con la expiración a partir de la fecha de
+    vencimiento del lote; sin fecha, se estiman desde freshness_score
     """
-    freshness_score = product.get('freshness_score', 0)
     vida_util_dias = product.get('vida_util_dias', 1)
+    fecha_expiracion = product.get(EXPIRY_COLUMN)
     
-    # Calcular días restantes basado en freshness_score
-    dias_restantes = (freshness_score / 100) * vida_util_dias
-    
-    # Determinar estado de expiración
-    if freshness_score >= 80:
-        estado = "OPTIMO"
-        color = "green"
-    elif freshness_score >= 60:
-        estado = "ATENCION"
-        color = "yellow"
-    elif freshness_score >= 40:
-        estado = "CRITICO"
-        color = "orange"
+    if fecha_expiracion:
+        life = remaining_life(fecha_expiracion, product.get(RECEIVED_COLUMN) or fecha_expiracion, vida_util_dias)
+        dias_restantes = life['dias_restantes']
+        porcentaje_vida_util = round(life['porcentaje_vida_util'], 1)
+        fecha_estimada_expiracion = pd.Timestamp(fecha_expiracion)
     else:
-        estado = "EXPIRADO"
-        color = "red"
+        porcentaje_vida_util = product.get('freshness_score', 0)
+        # Calcular días restantes basado en freshness_score
+        dias_restantes = (porcentaje_vida_util / 100) * vida_util_dias
+        fecha_estimada_expiracion = datetime.now() + timedelta(days=dias_restantes)
     
-    # Calcular fecha estimada de expiración (asumiendo fecha actual como referencia)
-    fecha_actual = datetime.now()
-    fecha_estimada_expiracion = fecha_actual + timedelta(days=dias_restantes)
+    estado, color = expiration_status(porcentaje_vida_util)
     
     return {
         "dias_restantes": round(dias_restantes, 1),
         "estado_expiracion": estado,
         "color_estado": color,
         "fecha_estimada_expiracion": fecha_estimada_expiracion.strftime("%Y-%m-%d"),
-        "porcentaje_vida_util": freshness_score
+        "porcentaje_vida_util": porcentaje_vida_util
+    }
+
+def expiration_status(porcentaje_vida_util: float) -> Tuple[str, str]:
+    """
+    Estado de expiración y color para un porcentaje de vida útil restante
+    """
+    if porcentaje_vida_util >= 80:
+        return "OPTIMO", "green"
+    elif porcentaje_vida_util >= 60:
+        return "ATENCION", "yellow"
+    elif porcentaje_vida_util >= 40:
+        return "CRITICO", "orange"
+    return "EXPIRADO", "red"
+
+# Límite inferior de cada estado de expiration_status, de menor a mayor
+EXPIRATION_STATUS_BOUNDS = [40, 60, 80]
+
+def expiration_metrics_frame(table: CompactTable, now: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Las métricas de calculate_expiration_metrics para todas las filas a la vez,
+    calculadas sobre las columnas de la tabla
+    """
+    now = np.datetime64(pd.Timestamp(now or today_reference()).to_datetime64(), 's')
+    shelf_life = table.column('vida_util_dias').astype(float)
+    expiry = table.column(EXPIRY_COLUMN)
+    has_expiry = ~np.isnat(expiry)
+    
+    remaining = np.maximum((expiry - now) / DAY, 0)
+    life = np.clip(np.divide(remaining * 100, shelf_life, out=np.zeros(len(table)), where=shelf_life > 0), 0, 100)
+    
+    # Sin fecha de vencimiento se estima desde freshness_score
+    score = table.column('freshness_score').astype(float) if 'freshness_score' in table.columns else np.zeros(len(table))
+    estimated_days = score / 100 * shelf_life
+    estimated_expiry = now + pd.to_timedelta(np.nan_to_num(estimated_days), unit='D').to_numpy().astype('timedelta64[s]')
+    
+    porcentaje = np.where(has_expiry, np.round(life, 1), score)
+    bands = np.where(np.isnan(porcentaje), 0, np.digitize(porcentaje, EXPIRATION_STATUS_BOUNDS))
+    statuses = [expiration_status(bound) for bound in [0] + EXPIRATION_STATUS_BOUNDS]
+    return pd.DataFrame({
+        "dias_restantes": np.round(np.where(has_expiry, remaining, estimated_days), 1),
+        "estado_expiracion": np.array([estado for estado, _ in statuses], dtype=object)[bands],
+        "color_estado": np.array([color for _, color in statuses], dtype=object)[bands],
+        "fecha_estimada_expiracion": pd.to_datetime(np.where(has_expiry, expiry, estimated_expiry)).normalize(),
+        "porcentaje_vida_util": porcentaje,
+    })
+
+@timed_stage("enrichment")
+def enrich_products(table: CompactTable) -> CompactTable:
+    """
+    Agrega las métricas de expiración como columnas, sin copiar las del CSV
+    """
+    return table.with_columns(expiration_metrics_frame(table), python_types={'fecha_estimada_expiracion': _format_date})
+
+@versioned_memo("products:enriched_table", datasets=['products_data_augmented.csv'], date_dependent=True)
+def load_enriched_table() -> CompactTable:
+    """
+    Tabla de productos con sus métricas de expiración
+    """
+    return enrich_products(load_products_data_from_csv())
+
+@versioned_memo("products:enriched", datasets=['products_data_augmented.csv'], date_dependent=True)
+def load_enriched_products() -> List[Mapping[str, Any]]:
+    """
+    Productos del CSV con sus métricas de expiración, como vistas de solo lectura
+    """
+    return load_enriched_table().rows()
+
+@versioned_memo("products:pk_index", datasets=['products_data_augmented.csv'])
+def load_product_index() -> Dict[str, int]:
+    """
+    Índice de llave primaria product_id -> posición en la tabla, construido una vez por versión del CSV
+    """
+    table = load_products_data_from_csv()
+    return {product_id: position for position, product_id in enumerate(table.column('product_id'))}
+
+# Columnas de baja cardinalidad con bitmap para filtrar productos
+BITMAP_COLUMNS = ['Category', 'aerolinea', 'tipo', 'Stock_Status', 'Storage_Temperature',
+                  'Quality_Status', 'estado_expiracion', 'tipo_servicio', 'Storage_Location', 'Supplier']
+
+@versioned_memo("products:bitmap_index", datasets=['products_data_augmented.csv'], date_dependent=True)
+def load_product_bitmap_index():
+    """
+    Productos enriquecidos, su índice de bitmaps y los días restantes como arreglo
+    para combinar filtros por columna con el umbral de días
+    """
+    table = load_enriched_table()
+    index = BitmapIndex({
+        column: table.column(column) if column in table.columns else [None] * len(table)
+        for column in BITMAP_COLUMNS
+    })
+    dias_restantes = table.column('dias_restantes').astype(float)
+    return load_enriched_products(), index, dias_restantes
+
+# Cubo de agregados: aerolínea x categoría x estado x ubicación de almacén
+PRODUCT_CUBE_DIMENSIONS = ['aerolinea', 'Category', 'estado_expiracion', 'Storage_Location']
+
+product_cube = RollupCube(
+    PRODUCT_CUBE_DIMENSIONS,
+    measure='porcentaje_vida_util',
+    status_dimension='estado_expiracion',
+    at_risk_values=['CRITICO', 'EXPIRADO'],
+    expired_values=['EXPIRADO']
+)
+
+@versioned_memo("products:cube", datasets=['products_data_augmented.csv'], date_dependent=True)
+@timed_stage("aggregation")
+def load_product_cube() -> RollupCube:
+    """
+    Sincroniza el cubo con la versión actual del CSV aplicando solo las
+    diferencias por product_id (altas, bajas y cambios)
+    """
+    result = product_cube.sync({product['product_id']: product for product in load_enriched_products()})
+    print(f"Cubo de productos sincronizado: {result}")
+    return product_cube
+
+@single_flight("products:dashboard_stats", datasets=['products_data_augmented.csv'], date_dependent=True)
+def compute_dashboard_stats() -> Dict[str, Any]:
+    """
+    Estadísticas del dashboard; las peticiones concurrentes comparten un solo cálculo
+    """
+    return build_dashboard_stats()
+
+def build_all_products_section(enriched_products: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Respuesta de /products/all a partir de productos ya enriquecidos
+    """
+    return {
+        "total_products": len(enriched_products),
+        "products": enriched_products
+    }
+
+@timed_stage("aggregation")
+def build_category_analysis() -> Dict[str, Any]:
+    """
+    Respuesta de /products/analysis/category: agregados del cubo y productos
+    de cada categoría desde el índice de bitmaps
+    """
+    enriched_products, index, _ = load_product_bitmap_index()
+    cube = load_product_cube()
+    
+    categories = {}
+    for (categoria,), cell in cube.rollup(['Category']).items():
+        categories[categoria] = {
+            'total_products': cell['count'],
+            'avg_freshness_score': round(cell['mean'], 2),
+            'products_at_risk': cell['at_risk'],
+            'products_expired': cell['expired'],
+            'products': [enriched_products[i] for i in index.positions(index.any_of('Category', [categoria]))]
+        }
+    
+    totals = cube.totals()
+    return {
+        "analysis_by_category": categories,
+        "summary": {
+            "total_categories": len(categories),
+            "total_products": totals['count'],
+            "total_at_risk": totals['at_risk'],
+            "total_expired": totals['expired']
+        }
+    }
+
+@timed_stage("aggregation")
+def build_airline_analysis() -> Dict[str, Any]:
+    """
+    Respuesta de /products/analysis/airline a partir del cubo
+    """
+    cube = load_product_cube()
+    
+    # Categorías de cada aerolínea (rebanada aerolínea x categoría)
+    airline_categories = {}
+    for airline, categoria in cube.rollup(['aerolinea', 'Category']):
+        airline_categories.setdefault(airline, []).append(categoria)
+    
+    airlines = {}
+    for (airline,), cell in cube.rollup(['aerolinea']).items():
+        airlines[airline] = {
+            'total_products': cell['count'],
+            'avg_freshness_score': round(cell['mean'], 2),
+            'products_at_risk': cell['at_risk'],
+            'products_expired': cell['expired'],
+            'categories': airline_categories[airline]
+        }
+    
+    return {
+        "analysis_by_airline": airlines,
+        "summary": {
+            "total_airlines": len(airlines),
+            "highest_freshness_airline": max(airlines.items(), key=lambda x: x[1]['avg_freshness_score'])[0],
+            "lowest_freshness_airline": min(airlines.items(), key=lambda x: x[1]['avg_freshness_score'])[0]
+        }
+    }
+
+@timed_stage("aggregation")
+def build_dashboard_stats() -> Dict[str, Any]:
+    """
+    Respuesta de /products/dashboard/stats a partir del cubo
+    """
+    cube = load_product_cube()
+    totals = cube.totals()
+    
+    # Calcular productos por estado
+    status_counts = {'OPTIMO': 0, 'ATENCION': 0, 'CRITICO': 0, 'EXPIRADO': 0}
+    for (estado,), cell in cube.rollup(['estado_expiracion']).items():
+        status_counts[estado] = cell['count']
+    
+    # Productos que requieren atención inmediata (CRITICO + EXPIRADO)
+    immediate_attention = status_counts['CRITICO'] + status_counts['EXPIRADO']
+    
+    return {
+        "overview": {
+            "total_products": totals['count'],
+            "total_categories": len(cube.rollup(['Category'])),
+            "total_airlines": len(cube.rollup(['aerolinea'])),
+            "avg_freshness_score": round(totals['mean'], 2) if totals['count'] > 0 else 0
+        },
+        "status_distribution": status_counts,
+        "alerts": {
+            "immediate_attention": immediate_attention,
+            "attention_required": status_counts['ATENCION'],
+            "stable": status_counts['OPTIMO']
+        }
     }
 
 @router.get("/")
@@ -114,19 +347,41 @@ def get_all_products_with_expiration():
     Obtiene todos los productos con información de expiración
     """
     try:
-        products_data = load_products_data_from_csv()
-        
         # Enriquecer datos con métricas de expiración
-        enriched_products = []
-        for product in products_data:
-            expiration_metrics = calculate_expiration_metrics(product)
-            enriched_product = {**product, **expiration_metrics}
-            enriched_products.append(enriched_product)
+        return build_all_products_section(load_enriched_products())
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@router.get("/query")
+def query_products(
+    filters: Optional[str] = Query(None, alias="filter", description="Filtro: ',' = AND, '|' = OR de valores, ';' = OR de grupos, '!=' excluye. Ej: Category=Canned|Produce,Stock_Status!=Low"),
+    max_dias_restantes: Optional[float] = Query(None, description="Solo productos con a lo más estos días restantes"),
+    limit: Optional[int] = Query(None, ge=1, description="Máximo de productos a devolver")
+):
+    """
+    Consulta genérica de productos sobre el índice de bitmaps
+    """
+    try:
+        enriched_products, index, dias_restantes = load_product_bitmap_index()
+        
+        bits = index.query(filters)
+        if max_dias_restantes is not None:
+            bits &= index.from_mask(dias_restantes <= max_dias_restantes)
+        
+        positions = index.positions(bits)
+        matched = [enriched_products[i] for i in (positions[:limit] if limit else positions)]
         
         return {
-            "total_products": len(enriched_products),
-            "products": enriched_products
+            "filter": filters,
+            "indexed_columns": {column: index.values(column) for column in index.columns},
+            "total_matches": len(positions),
+            "returned": len(matched),
+            "products": matched
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -138,12 +393,11 @@ def get_product_expiration_details(product_id: str):
     Obtiene detalles de expiración de un producto específico
     """
     try:
-        products_data = load_products_data_from_csv()
-        
-        product = next((p for p in products_data if p['product_id'] == product_id), None)
-        if not product:
+        position = load_product_index().get(product_id)
+        if position is None:
             raise HTTPException(status_code=404, detail=f"Producto {product_id} no encontrado")
         
+        product = load_products_data_from_csv().row(position)
         expiration_metrics = calculate_expiration_metrics(product)
         enriched_product = {**product, **expiration_metrics}
         
@@ -163,23 +417,16 @@ def get_expiration_alerts(
     Obtiene alertas de productos próximos a expirar
     """
     try:
-        products_data = load_products_data_from_csv()
+        enriched_products, index, dias_restantes = load_product_bitmap_index()
+        
+        # Filtrar por umbral de días y filtros adicionales con operaciones de bits
+        bits = index.from_mask(dias_restantes <= threshold_days)
+        if estado:
+            bits &= index.any_of('estado_expiracion', [estado])
+        if categoria:
+            bits &= index.any_of('Category', [categoria])
         
-        alert_products = []
-        for product in products_data:
-            expiration_metrics = calculate_expiration_metrics(product)
-            
-            # Filtrar por umbral de días
-            if expiration_metrics['dias_restantes'] <= threshold_days:
-                enriched_product = {**product, **expiration_metrics}
-                
-                # Aplicar filtros adicionales
-                if estado and expiration_metrics['estado_expiracion'] != estado:
-                    continue
-                if categoria and product.get('Category') != categoria:
-                    continue
-                
-                alert_products.append(enriched_product)
+        alert_products = [enriched_products[i] for i in index.positions(bits)]
         
         # Ordenar por días restantes (menor a mayor)
         alert_products.sort(key=lambda x: x['dias_restantes'])
@@ -200,50 +447,7 @@ def get_expiration_analysis_by_category():
     Análisis de expiración por categoría de producto
     """
     try:
-        products_data = load_products_data_from_csv()
-        
-        # Agrupar por categoría
-        categories = {}
-        for product in products_data:
-            categoria = product.get('Category', 'Sin categoría')
-            if categoria not in categories:
-                categories[categoria] = {
-                    'total_products': 0,
-                    'avg_freshness_score': 0,
-                    'products_at_risk': 0,
-                    'products_expired': 0,
-                    'products': []
-                }
-            
-            expiration_metrics = calculate_expiration_metrics(product)
-            enriched_product = {**product, **expiration_metrics}
-            
-            categories[categoria]['total_products'] += 1
-            categories[categoria]['avg_freshness_score'] += expiration_metrics['porcentaje_vida_util']
-            categories[categoria]['products'].append(enriched_product)
-            
-            # Contar productos en riesgo
-            if expiration_metrics['estado_expiracion'] in ['CRITICO', 'EXPIRADO']:
-                categories[categoria]['products_at_risk'] += 1
-            if expiration_metrics['estado_expiracion'] == 'EXPIRADO':
-                categories[categoria]['products_expired'] += 1
-        
-        # Calcular promedios
-        for categoria in categories:
-            categories[categoria]['avg_freshness_score'] = round(
-                categories[categoria]['avg_freshness_score'] / categories[categoria]['total_products'], 
-                2
-            )
-        
-        return {
-            "analysis_by_category": categories,
-            "summary": {
-                "total_categories": len(categories),
-                "total_products": len(products_data),
-                "total_at_risk": sum(cat['products_at_risk'] for cat in categories.values()),
-                "total_expired": sum(cat['products_expired'] for cat in categories.values())
-            }
-        }
+        return build_category_analysis()
     except HTTPException:
         raise
     except Exception as e:
@@ -255,49 +459,51 @@ def get_expiration_analysis_by_airline():
     Análisis de expiración por aerolínea
     """
     try:
-        products_data = load_products_data_from_csv()
-        
-        # Agrupar por aerolínea
-        airlines = {}
-        for product in products_data:
-            airline = product.get('aerolinea', 'Sin aerolínea')
-            if airline not in airlines:
-                airlines[airline] = {
-                    'total_products': 0,
-                    'avg_freshness_score': 0,
-                    'products_at_risk': 0,
-                    'products_expired': 0,
-                    'categories': set()
-                }
-            
-            expiration_metrics = calculate_expiration_metrics(product)
-            
-            airlines[airline]['total_products'] += 1
-            airlines[airline]['avg_freshness_score'] += expiration_metrics['porcentaje_vida_util']
-            airlines[airline]['categories'].add(product.get('Category', 'Sin categoría'))
-            
-            # Contar productos en riesgo
-            if expiration_metrics['estado_expiracion'] in ['CRITICO', 'EXPIRADO']:
-                airlines[airline]['products_at_risk'] += 1
-            if expiration_metrics['estado_expiracion'] == 'EXPIRADO':
-                airlines[airline]['products_expired'] += 1
+        return build_airline_analysis()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@router.get("/analysis/rollup")
+def get_rollup_slice(
+    group_by: str = Query("", description=f"Dimensiones separadas por coma: {', '.join(PRODUCT_CUBE_DIMENSIONS)}"),
+    where: Optional[str] = Query(None, description="Dimensiones fijadas, p. ej. aerolinea=Delta Airlines,Storage_Location=MX-CEN-01")
+):
+    """
+    Rebanada arbitraria del cubo de productos (conteo, suma y promedio de frescura, en riesgo y expirados)
+    """
+    try:
+        dimensions = [d.strip() for d in group_by.split(",") if d.strip()]
+        filters = {}
+        for condition in (where or "").split(","):
+            if not condition.strip():
+                continue
+            dimension, separator, value = condition.partition("=")
+            if not separator:
+                raise ValueError(f"Condición inválida: '{condition.strip()}'. Formato esperado: dimension=valor")
+            filters[dimension.strip()] = value.strip()
         
-        # Calcular promedios y convertir sets a listas
-        for airline in airlines:
-            airlines[airline]['avg_freshness_score'] = round(
-                airlines[airline]['avg_freshness_score'] / airlines[airline]['total_products'], 
-                2
-            )
-            airlines[airline]['categories'] = list(airlines[airline]['categories'])
+        cube = load_product_cube()
+        cells = cube.rollup(dimensions, filters)
         
         return {
-            "analysis_by_airline": airlines,
-            "summary": {
-                "total_airlines": len(airlines),
-                "highest_freshness_airline": max(airlines.items(), key=lambda x: x[1]['avg_freshness_score'])[0],
-                "lowest_freshness_airline": min(airlines.items(), key=lambda x: x[1]['avg_freshness_score'])[0]
-            }
+            "group_by": dimensions,
+            "where": filters,
+            "total_cells": len(cells),
+            "cells": [
+                {
+                    **dict(zip(dimensions, key)),
+                    "total_products": cell['count'],
+                    "avg_freshness_score": round(cell['mean'], 2),
+                    "products_at_risk": cell['at_risk'],
+                    "products_expired": cell['expired']
+                }
+                for key, cell in cells.items()
+            ]
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -309,14 +515,8 @@ def get_rotation_priority():
     Obtiene prioridad de rotación de productos basada en frescura
     """
     try:
-        products_data = load_products_data_from_csv()
-        
-        # Enriquecer todos los productos con métricas de expiración
-        enriched_products = []
-        for product in products_data:
-            expiration_metrics = calculate_expiration_metrics(product)
-            enriched_product = {**product, **expiration_metrics}
-            enriched_products.append(enriched_product)
+        # Productos con sus métricas de expiración (memorizados por versión y hora)
+        enriched_products = load_enriched_products()
         
         # Ordenar por prioridad (menor freshness_score primero)
         priority_products = sorted(
@@ -361,41 +561,7 @@ def get_expiration_dashboard_stats():
     Estadísticas para el dashboard de gestión de expiración
     """
     try:
-        products_data = load_products_data_from_csv()
-        
-        total_products = len(products_data)
-        total_categories = len(set(p.get('Category') for p in products_data))
-        total_airlines = len(set(p.get('aerolinea') for p in products_data))
-        
-        # Calcular productos por estado
-        status_counts = {'OPTIMO': 0, 'ATENCION': 0, 'CRITICO': 0, 'EXPIRADO': 0}
-        avg_freshness = 0
-        
-        for product in products_data:
-            expiration_metrics = calculate_expiration_metrics(product)
-            status = expiration_metrics['estado_expiracion']
-            status_counts[status] += 1
-            avg_freshness += expiration_metrics['porcentaje_vida_util']
-        
-        avg_freshness = round(avg_freshness / total_products, 2) if total_products > 0 else 0
-        
-        # Productos que requieren atención inmediata (CRITICO + EXPIRADO)
-        immediate_attention = status_counts['CRITICO'] + status_counts['EXPIRADO']
-        
-        return {
-            "overview": {
-                "total_products": total_products,
-                "total_categories": total_categories,
-                "total_airlines": total_airlines,
-                "avg_freshness_score": avg_freshness
-            },
-            "status_distribution": status_counts,
-            "alerts": {
-                "immediate_attention": immediate_attention,
-                "attention_required": status_counts['ATENCION'],
-                "stable": status_counts['OPTIMO']
-            }
-        }
+        return compute_dashboard_stats()
     except HTTPException:
         raise
     except Exception as e:
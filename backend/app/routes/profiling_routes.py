@@ -0,0 +1,54 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.utils.profiling import profile_store, profiling_enabled, get_sample_rate, get_interval_seconds
+
+router = APIRouter(prefix="/profiles", tags=["Profiling"])
+
+PROFILE_FORMATS = ("summary", "collapsed", "speedscope")
+
+# Perfiles capturados (más recientes primero)
+@router.get("/")
+def list_profiles():
+    """
+    Configuración del perfilado y resumen de los perfiles guardados
+    """
+    return {
+        "enabled": profiling_enabled(),
+        "sample_rate": get_sample_rate(),
+        "interval_ms": round(get_interval_seconds() * 1000, 2),
+        "profiles": profile_store.list()
+    }
+
+# Descarga de un perfil
+@router.get("/{profile_id}")
+def get_profile(
+    profile_id: str,
+    format: str = Query("summary", description="summary, collapsed (flamegraph) o speedscope"),
+    limit: int = Query(25, ge=1, le=500, description="Funciones en el resumen")
+):
+    """
+    summary: funciones con más muestras; collapsed: pilas colapsadas para
+    flamegraph.pl o speedscope; speedscope: archivo JSON de speedscope
+    """
+    try:
+        if format not in PROFILE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Formato inválido: '{format}'. Opciones: {list(PROFILE_FORMATS)}")
+        
+        profile = profile_store.get(profile_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail=f"Perfil {profile_id} no encontrado")
+        
+        if format == "collapsed":
+            return PlainTextResponse(profile.collapsed(), headers={
+                "Content-Disposition": f'attachment; filename="profile-{profile_id}.collapsed.txt"'
+            })
+        if format == "speedscope":
+            return JSONResponse(profile.speedscope(), headers={
+                "Content-Disposition": f'attachment; filename="profile-{profile_id}.speedscope.json"'
+            })
+        return {**profile.summary(), "top_functions": profile.top_functions(limit)}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
@@ -0,0 +1,72 @@
+from fastapi import APIRouter, HTTPException
+from typing import Dict, Any
+from app.routes import products_routes, data_routes, consumptionPredictor_routes, productivityEstimation_routes
+
+router = APIRouter(prefix="/bundles", tags=["Screen Bundles"])
+
+def build_products_bundle() -> Dict[str, Any]:
+    """
+    Deriva todas las secciones de la pantalla de productos de los productos
+    enriquecidos y el cubo de agregados, ambos memorizados por versión del CSV
+    """
+    enriched_products = products_routes.load_enriched_products()
+
+    return {
+        "products": products_routes.build_all_products_section(enriched_products),
+        "dashboard_stats": products_routes.build_dashboard_stats(),
+        "analysis_by_category": products_routes.build_category_analysis(),
+        "analysis_by_airline": products_routes.build_airline_analysis()
+    }
+
+# Ruta para la pantalla de productos
+@router.get("/products")
+def get_products_screen_bundle():
+    """
+    Equivale a /products/all, /products/dashboard/stats, /products/analysis/category
+    y /products/analysis/airline en una sola respuesta
+    """
+    try:
+        return build_products_bundle()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+# Ruta para la pantalla de detalle de vuelo
+@router.get("/flight/{flight_id}")
+def get_flight_screen_bundle(flight_id: str):
+    """
+    Equivale a /data/{flight_id}, /products/all, /prediction/flight-recommendation/{flight_id}
+    y /productivity/recomendacion/vuelo/{flight_id} en una sola respuesta.
+    Las secciones opcionales que fallan se devuelven como null con su error.
+    """
+    try:
+        flight_data = data_routes.load_flight_data_from_csv()
+
+        if flight_id not in flight_data:
+            raise HTTPException(status_code=404, detail=f"Flight {flight_id} not found")
+
+        bundle = {
+            "flight": flight_data[flight_id],
+            "products": products_routes.build_all_products_section(products_routes.load_enriched_products()),
+            "consumption_prediction": None,
+            "recommended_operators": None,
+            "errors": {}
+        }
+
+        optional_sections = {
+            "consumption_prediction": lambda: consumptionPredictor_routes.get_flight_recommendation(flight_id),
+            "recommended_operators": lambda: productivityEstimation_routes.get_recommended_operator_for_flight(flight_id)
+        }
+        for section, build_section in optional_sections.items():
+            try:
+                bundle[section] = build_section()
+            except HTTPException as e:
+                bundle["errors"][section] = {"status_code": e.status_code, "detail": e.detail}
+
+        return bundle
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
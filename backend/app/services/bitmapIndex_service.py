@@ -0,0 +1,126 @@
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Una condición es (columna, valores, negada). Un grupo es un AND de condiciones
+# y un filtro completo es un OR de grupos (forma normal disyuntiva).
+Condition = Tuple[str, List[str], bool]
+
+
+def parse_filter_expression(expression: str) -> List[List[Condition]]:
+    """
+    Convierte un filtro de texto en grupos de condiciones.
+      ';' separa grupos (OR), ',' separa condiciones (AND), '|' separa valores (OR)
+      'columna=valor' incluye y 'columna!=valor' excluye.
+    Ejemplo: 'Category=Canned|Produce,Stock_Status!=Low;Quality_Status=Damaged'
+    """
+    groups: List[List[Condition]] = []
+    for raw_group in expression.split(";"):
+        if not raw_group.strip():
+            continue
+        group: List[Condition] = []
+        for raw_condition in raw_group.split(","):
+            if not raw_condition.strip():
+                continue
+            negated = "!=" in raw_condition
+            column, separator, raw_values = raw_condition.partition("!=" if negated else "=")
+            values = [value.strip() for value in raw_values.split("|") if value.strip()]
+            if not separator or not column.strip() or not values:
+                raise ValueError(f"Condición inválida: '{raw_condition.strip()}'. Formato esperado: columna=valor1|valor2")
+            group.append((column.strip(), values, negated))
+        groups.append(group)
+    return groups
+
+
+class BitmapIndex:
+    """
+    Índice de bitmaps para columnas de baja cardinalidad.
+
+    Por cada (columna, valor) se guarda un bitset empaquetado (np.packbits, 1 bit
+    por fila), así que los filtros AND/OR/NOT se resuelven con operaciones
+    bit a bit sobre arreglos de uint8 en lugar de recorrer las filas.
+    """
+
+    def __init__(self, columns: Dict[str, Sequence[Any]]):
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("Todas las columnas del índice deben tener el mismo número de filas")
+
+        self.size = lengths.pop() if lengths else 0
+        self._bitmaps: Dict[str, Dict[str, np.ndarray]] = {}
+        for column, values in columns.items():
+            labels = np.asarray([str(value) for value in values], dtype=object)
+            categories, codes = np.unique(labels, return_inverse=True)
+            self._bitmaps[column] = {
+                category: np.packbits(codes == code)
+                for code, category in enumerate(categories)
+            }
+
+        self._all = np.packbits(np.ones(self.size, dtype=bool))
+        self._none = np.zeros_like(self._all)
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._bitmaps)
+
+    def values(self, column: str) -> List[str]:
+        return list(self._bitmaps[column])
+
+    def all(self) -> np.ndarray:
+        return self._all.copy()
+
+    def from_mask(self, mask: np.ndarray) -> np.ndarray:
+        """
+        Empaqueta una máscara booleana (p. ej. un rango numérico) para combinarla con los bitmaps
+        """
+        return np.packbits(np.asarray(mask, dtype=bool))
+
+    def any_of(self, column: str, values: Sequence[Any]) -> np.ndarray:
+        """
+        OR de los bitmaps de los valores dados; valores desconocidos no aportan filas
+        """
+        if column not in self._bitmaps:
+            raise ValueError(f"Columna no indexada: '{column}'. Disponibles: {self.columns}")
+        result = self._none.copy()
+        for value in values:
+            bitmap = self._bitmaps[column].get(str(value))
+            if bitmap is not None:
+                np.bitwise_or(result, bitmap, out=result)
+        return result
+
+    def evaluate(self, groups: List[List[Condition]]) -> np.ndarray:
+        """
+        Evalúa un filtro en forma normal disyuntiva; sin grupos devuelve todas las filas
+        """
+        if not groups:
+            return self.all()
+
+        result = self._none.copy()
+        for group in groups:
+            group_bits = self.all()
+            for column, values, negated in group:
+                condition = self.any_of(column, values)
+                if negated:
+                    np.bitwise_and(group_bits, np.bitwise_not(condition), out=group_bits)
+                else:
+                    np.bitwise_and(group_bits, condition, out=group_bits)
+            np.bitwise_or(result, group_bits, out=result)
+        return result
+
+    def query(self, expression: Optional[str]) -> np.ndarray:
+        return self.evaluate(parse_filter_expression(expression or ""))
+
+    def positions(self, bits: np.ndarray) -> np.ndarray:
+        """
+        Posiciones (en orden) de las filas encendidas en el bitset
+        """
+        return np.flatnonzero(np.unpackbits(bits, count=self.size))
+
+    def count(self, bits: np.ndarray) -> int:
+        return int(np.unpackbits(bits, count=self.size).sum())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": self.size,
+            "columns": {column: len(bitmaps) for column, bitmaps in self._bitmaps.items()},
+            "bytes": int(sum(bitmap.nbytes for bitmaps in self._bitmaps.values() for bitmap in bitmaps.values())),
+        }
@@ -0,0 +1,127 @@
+from typing import Dict, Any, List, Optional
+import numpy as np
+import pandas as pd
+
+# Columnas de productividad_data.csv que describen el pipeline de visión
+CAMERA_COLUMNS = ['sesion_id', 'camara_id', 'ubicacion_camara', 'fuente_video', 'fecha_inicio',
+                  'duracion_sesion_seg', 'fps_promedio', 'frames_procesados',
+                  'errores_deteccion', 'precision_promedio']
+
+# Caída tolerada de fps frente a la tasa esperada antes de marcar la cámara
+DEFAULT_TOLERANCE = 0.10
+# Sesiones más recientes de cada cámara con las que se mide su fps actual
+DEFAULT_WINDOW = 5
+# Con menos sesiones la tasa esperada es la del tipo de fuente de video, no la propia
+MIN_BASELINE_SESSIONS = 3
+
+
+def prepare_sessions(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sesiones ordenadas por cámara y fecha con las columnas derivadas:
+    días desde la primera sesión (para las tendencias), throughput de frames
+    procesados por segundo de sesión y errores por cada 1000 frames
+    """
+    sessions = df.copy()
+    sessions['fecha_inicio'] = pd.to_datetime(sessions['fecha_inicio'], errors='coerce')
+    for column in ['duracion_sesion_seg', 'fps_promedio', 'frames_procesados', 'errores_deteccion', 'precision_promedio']:
+        sessions[column] = pd.to_numeric(sessions[column], errors='coerce')
+    sessions = sessions.sort_values(['camara_id', 'fecha_inicio'], kind='stable').reset_index(drop=True)
+
+    start = sessions['fecha_inicio'].min()
+    sessions['dias'] = (sessions['fecha_inicio'] - start) / pd.Timedelta(days=1)
+    seconds = sessions['duracion_sesion_seg'].where(sessions['duracion_sesion_seg'] > 0)
+    frames = sessions['frames_procesados'].where(sessions['frames_procesados'] > 0)
+    sessions['throughput_fps'] = sessions['frames_procesados'] / seconds
+    sessions['errores_por_1k_frames'] = sessions['errores_deteccion'] / frames * 1000
+    return sessions
+
+
+def linear_trend(sessions: pd.DataFrame, key: str, column: str) -> pd.Series:
+    """
+    Pendiente por día de `column` contra la fecha de la sesión para cada grupo,
+    por mínimos cuadrados con sumas agrupadas (sin ciclos por grupo).
+    NaN si el grupo tiene menos de dos fechas distintas.
+    """
+    valid = sessions[['dias', column]].notna().all(axis=1)
+    x = sessions.loc[valid, 'dias']
+    y = sessions.loc[valid, column]
+    sums = pd.DataFrame({'n': 1.0, 'x': x, 'y': y, 'xy': x * y, 'xx': x * x}).groupby(sessions.loc[valid, key]).sum()
+    denominator = sums['n'] * sums['xx'] - sums['x'] ** 2
+    slope = (sums['n'] * sums['xy'] - sums['x'] * sums['y']) / denominator.where(denominator > 1e-9)
+    return slope.reindex(sessions[key].unique())
+
+
+def group_metrics(sessions: pd.DataFrame, key: str) -> pd.DataFrame:
+    """
+    Métricas del pipeline por grupo (cámara o zona): throughput de frames
+    procesados sobre el tiempo total de sesión, fps de captura promedio,
+    errores por cada 1000 frames, precisión ponderada por frames y su
+    tendencia en puntos por semana
+    """
+    weighted = sessions.assign(precision_frames=sessions['precision_promedio'] * sessions['frames_procesados'])
+    grouped = weighted.groupby(key, sort=False)
+    metrics = grouped.agg(
+        sesiones=('sesion_id', 'size'),
+        camaras=('camara_id', 'nunique'),
+        frames=('frames_procesados', 'sum'),
+        segundos=('duracion_sesion_seg', 'sum'),
+        errores=('errores_deteccion', 'sum'),
+        precision_frames=('precision_frames', 'sum'),
+        fps_captura_promedio=('fps_promedio', 'mean'),
+        primera_sesion=('fecha_inicio', 'min'),
+        ultima_sesion=('fecha_inicio', 'max'),
+    )
+    frames = metrics['frames'].where(metrics['frames'] > 0)
+    metrics['throughput_fps'] = metrics['frames'] / metrics['segundos'].where(metrics['segundos'] > 0)
+    metrics['frames_por_hora'] = metrics['throughput_fps'] * 3600
+    metrics['errores_por_1k_frames'] = metrics['errores'] / frames * 1000
+    metrics['precision_promedio'] = metrics['precision_frames'] / frames
+    metrics['tendencia_precision_semana'] = linear_trend(sessions, key, 'precision_promedio') * 7
+    return metrics.drop(columns=['precision_frames'])
+
+
+def camera_health(sessions: pd.DataFrame, tolerance: float = DEFAULT_TOLERANCE, window: int = DEFAULT_WINDOW,
+                  expected_fps: Optional[float] = None) -> pd.DataFrame:
+    """
+    Salud por cámara. La tasa esperada es `expected_fps` si se indica; si no,
+    la mediana de fps de la propia cámara o, con menos de MIN_BASELINE_SESSIONS
+    sesiones, la mediana de su tipo de fuente de video. El fps actual es el
+    promedio de sus `window` sesiones más recientes y la cámara se marca si
+    queda por debajo de la tasa esperada menos la tolerancia.
+    """
+    metrics = group_metrics(sessions, 'camara_id')
+    cameras = sessions.groupby('camara_id', sort=False)
+    latest = cameras.tail(1).set_index('camara_id')
+
+    metrics['ubicacion_camara'] = latest['ubicacion_camara']
+    metrics['fuente_video'] = latest['fuente_video']
+    metrics['fps_reciente'] = sessions.groupby('camara_id', sort=False).tail(window).groupby('camara_id', sort=False)['fps_promedio'].mean()
+    metrics['tendencia_fps_semana'] = linear_trend(sessions, 'camara_id', 'fps_promedio') * 7
+
+    if expected_fps is not None:
+        metrics['fps_esperado'] = float(expected_fps)
+        metrics['origen_fps_esperado'] = 'parametro'
+    else:
+        own = cameras['fps_promedio'].median()
+        by_source = sessions.groupby('fuente_video')['fps_promedio'].median()
+        enough = metrics['sesiones'] >= MIN_BASELINE_SESSIONS
+        metrics['fps_esperado'] = own.where(enough, metrics['fuente_video'].map(by_source))
+        metrics['origen_fps_esperado'] = np.where(enough, 'historico_camara', 'fuente_video')
+
+    metrics['fps_vs_esperado'] = metrics['fps_reciente'] / metrics['fps_esperado'].where(metrics['fps_esperado'] > 0)
+    metrics['alerta_fps'] = (metrics['fps_vs_esperado'] < 1 - tolerance).fillna(False)
+    return metrics
+
+
+def to_records(frame: pd.DataFrame, key: str, decimals: int = 3) -> List[Dict[str, Any]]:
+    """
+    Filas como diccionarios serializables: NaN a None, fechas en ISO y flotantes redondeados
+    """
+    frame = frame.reset_index().rename(columns={'index': key})
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            frame[column] = frame[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+        elif pd.api.types.is_float_dtype(frame[column]):
+            frame[column] = frame[column].round(decimals)
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict(orient='records')
@@ -0,0 +1,353 @@
+"""
+Representación compacta en memoria de tablas de registros (productos, sesiones).
+
+Las columnas de texto de baja cardinalidad se guardan como códigos enteros más
+una lista de categorías, los enteros se reducen al tipo más pequeño que los
+contiene y los flotantes pasan a float32 solo si el redondeo de vuelta es exacto.
+Las fechas se guardan como datetime64[s]. Cada registro se expone como
+RecordView, una vista de solo lectura (dos slots) sobre los arreglos en lugar
+de un diccionario de ~30 llaves por fila. Las columnas derivadas (p. ej. días
+para expirar) se agregan con with_columns, que comparte los arreglos existentes.
+
+Reporte de memoria (desde backend/):
+    python -m app.services.compactStore_service --rows 1000000
+"""
+import argparse
+import gc
+import json
+import os
+import tempfile
+import tracemalloc
+from collections.abc import Mapping
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Una columna de texto se vuelve categórica si tiene a lo más esta proporción de valores únicos
+CATEGORY_MAX_RATIO = 0.5
+MAX_FLOAT_DECIMALS = 6
+
+
+def _float_decimals(values: np.ndarray) -> Optional[int]:
+    """
+    Menor número de decimales que representa exactamente todos los valores, o None
+    """
+    for decimals in range(MAX_FLOAT_DECIMALS + 1):
+        scaled = values * 10 ** decimals
+        if np.all(np.abs(scaled - np.round(scaled)) < 1e-6):
+            return decimals
+    return None
+
+
+def compact_frame(df: pd.DataFrame, category_max_ratio: float = CATEGORY_MAX_RATIO) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Devuelve (df compacto, decimales por columna float32). Los valores originales
+    se recuperan exactamente redondeando las columnas float32 a sus decimales.
+    """
+    compact = pd.DataFrame(index=df.index)
+    float_decimals: Dict[str, int] = {}
+
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series):
+            compact[column] = series
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            compact[column] = series.astype('datetime64[s]')
+        elif pd.api.types.is_integer_dtype(series):
+            downcast = 'unsigned' if len(series) and series.min() >= 0 else 'integer'
+            compact[column] = pd.to_numeric(series, downcast=downcast)
+        elif pd.api.types.is_float_dtype(series):
+            values = series.to_numpy(dtype=np.float64)
+            decimals = _float_decimals(values) if not np.isnan(values).any() else None
+            as_float32 = values.astype(np.float32)
+            if decimals is not None and np.array_equal(np.round(as_float32.astype(np.float64), decimals), values):
+                compact[column] = as_float32
+                float_decimals[column] = decimals
+            else:
+                compact[column] = series
+        elif len(series) and series.nunique(dropna=True) / len(series) <= category_max_ratio:
+            compact[column] = series.astype('category')
+        else:
+            compact[column] = series
+
+    return compact, float_decimals
+
+
+class CompactTable:
+    """
+    Tabla columnar de solo lectura con acceso por fila a través de RecordView
+    """
+
+    def __init__(self, df: pd.DataFrame, python_types: Optional[Dict[str, Callable]] = None,
+                 category_max_ratio: float = CATEGORY_MAX_RATIO):
+        self.columns: List[str] = []
+        self._position: Dict[str, int] = {}
+        self._arrays: List[np.ndarray] = []
+        self._categories: List[Optional[List[Any]]] = []
+        self._decimals: List[Optional[int]] = []
+        self._readers: List[Callable[[int], Any]] = []
+        self._length = len(df)
+        self._add_columns(df, python_types, category_max_ratio)
+
+    def _add_columns(self, df: pd.DataFrame, python_types: Optional[Dict[str, Callable]], category_max_ratio: float):
+        """
+        Compacta las columnas de df; una columna con el nombre de una existente la reemplaza
+        """
+        compact, float_decimals = compact_frame(df, category_max_ratio)
+        python_types = python_types or {}
+
+        for column in compact.columns:
+            series = compact[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                array = series.cat.codes.to_numpy()
+                categories = [str(c) for c in series.cat.categories]
+            else:
+                array = series.to_numpy()
+                categories = None
+            decimals = float_decimals.get(column)
+            reader = self._make_reader(array, categories, decimals, python_types.get(column))
+
+            position = self._position.get(column)
+            if position is None:
+                self._position[column] = len(self.columns)
+                self.columns.append(column)
+                self._arrays.append(array)
+                self._categories.append(categories)
+                self._decimals.append(decimals)
+                self._readers.append(reader)
+            else:
+                self._arrays[position] = array
+                self._categories[position] = categories
+                self._decimals[position] = decimals
+                self._readers[position] = reader
+
+    def with_columns(self, df: pd.DataFrame, python_types: Optional[Dict[str, Callable]] = None,
+                     category_max_ratio: float = CATEGORY_MAX_RATIO) -> "CompactTable":
+        """
+        Tabla nueva con las columnas de esta más las de df (mismas filas, en el
+        mismo orden). Los arreglos existentes se comparten sin copiar: solo se
+        compactan las columnas nuevas.
+        """
+        if len(df) != self._length:
+            raise ValueError(f"Se esperaban {self._length} filas, llegaron {len(df)}")
+        table = CompactTable.__new__(CompactTable)
+        table.columns = list(self.columns)
+        table._position = dict(self._position)
+        table._arrays = list(self._arrays)
+        table._categories = list(self._categories)
+        table._decimals = list(self._decimals)
+        table._readers = list(self._readers)
+        table._length = self._length
+        table._add_columns(df.set_axis(range(self._length)), python_types, category_max_ratio)
+        return table
+
+    @staticmethod
+    def _make_reader(array: np.ndarray, categories: Optional[List[Any]], decimals: Optional[int],
+                     python_type: Optional[Callable]) -> Callable[[int], Any]:
+        if categories is not None:
+            def read(i):
+                code = array[i]
+                return categories[code] if code >= 0 else None
+        elif decimals is not None:
+            def read(i):
+                return round(float(array[i]), decimals)
+        elif array.dtype == object:
+            def read(i):
+                return array[i]
+        elif array.dtype.kind == 'M':
+            # NaT -> None; el resto como datetime de Python
+            def read(i):
+                value = array[i]
+                return None if np.isnat(value) else value.item()
+        else:
+            def read(i):
+                return array[i].item()
+
+        if python_type is None:
+            return read
+        return lambda i: python_type(read(i))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def value(self, position: int, column: str) -> Any:
+        return self._readers[self._position[column]](position)
+
+    def column(self, column: str) -> np.ndarray:
+        """
+        Valores de una columna completa como arreglo (categorías decodificadas,
+        None en las faltantes; flotantes con sus decimales originales)
+        """
+        position = self._position[column]
+        array = self._arrays[position]
+        categories = self._categories[position]
+        if categories is not None:
+            lookup = np.array(categories + [None], dtype=object)
+            return lookup[np.where(array >= 0, array, len(categories))]
+        decimals = self._decimals[position]
+        if decimals is not None:
+            return np.round(array.astype(np.float64), decimals)
+        return array
+
+    def row(self, position: int) -> "RecordView":
+        if not 0 <= position < self._length:
+            raise IndexError(position)
+        return RecordView(self, position)
+
+    def rows(self) -> List["RecordView"]:
+        return [RecordView(self, position) for position in range(self._length)]
+
+    def memory_bytes(self) -> int:
+        total = 0
+        for array, categories in zip(self._arrays, self._categories):
+            total += array.nbytes
+            if array.dtype == object:
+                total += sum(len(str(value)) + 49 for value in array)
+            if categories is not None:
+                total += sum(len(str(value)) + 49 for value in categories)
+        return total
+
+
+class RecordView(Mapping):
+    """
+    Vista de solo lectura de una fila; se comporta como un diccionario
+    (get, keys, items, {**vista}) sin copiar los valores
+    """
+    __slots__ = ("_table", "_position")
+
+    def __init__(self, table: CompactTable, position: int):
+        self._table = table
+        self._position = position
+
+    def __getitem__(self, column: str) -> Any:
+        try:
+            return self._table.value(self._position, column)
+        except KeyError:
+            raise KeyError(column) from None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table.columns)
+
+    def __len__(self) -> int:
+        return len(self._table.columns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {column: self[column] for column in self._table.columns}
+
+    def __repr__(self) -> str:
+        return f"RecordView({self.to_dict()!r})"
+
+
+def generate_synthetic_products(base: pd.DataFrame, rows: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Muestrea filas del CSV real con reemplazo y asigna lotes únicos
+    """
+    rng = np.random.default_rng(seed)
+    synthetic = base.iloc[rng.integers(0, len(base), size=rows)].reset_index(drop=True)
+    if 'Batch_Number' in synthetic.columns:
+        synthetic['Batch_Number'] = pd.Series([f"B{i:08d}" for i in range(rows)], dtype=base['Batch_Number'].dtype)
+    return synthetic
+
+
+def _dict_rows_bytes(df: pd.DataFrame, sample_rows: int = 20000) -> int:
+    """
+    Estima la memoria de un dict por fila midiendo una muestra con tracemalloc
+    y extrapolando al total de filas
+    """
+    sample = df.iloc[:min(sample_rows, len(df))]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    rows = [row.to_dict() for _, row in sample.iterrows()]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    measured = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del rows
+    return int(measured * len(df) / max(len(sample), 1))
+
+
+def _resident_bytes(loaders: Dict[str, Callable[[], Any]]) -> Dict[str, int]:
+    """
+    Memoria que queda retenida después de llamar a cada loader memorizado: lo
+    que la ruta conserva entre peticiones (tablas, vistas, índices y cachés),
+    no lo temporal del cálculo. Cada loader se mide contra lo ya cargado antes.
+    """
+    retained: Dict[str, int] = {}
+    tracemalloc.start()
+    try:
+        for name, loader in loaders.items():
+            gc.collect()
+            before = tracemalloc.get_traced_memory()[0]
+            loader()
+            gc.collect()
+            retained[name] = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return retained
+
+
+def memory_report(rows: int = 1_000_000) -> Dict[str, Any]:
+    """
+    Memoria de productos sintéticos: la tabla compacta frente a pandas y a un
+    dict por fila, y lo que realmente queda residente al servir /products y
+    /expiration (cargando las rutas sobre un CSV sintético de `rows` filas)
+    """
+    from app.utils.utils import get_data_path
+
+    base = pd.read_csv(get_data_path('products_data_augmented.csv'))
+    df = generate_synthetic_products(base, rows)
+    compact, float_decimals = compact_frame(df)
+    table = CompactTable(df)
+
+    pandas_bytes = int(df.memory_usage(deep=True).sum())
+    compact_bytes = int(compact.memory_usage(deep=True).sum())
+    dict_bytes = _dict_rows_bytes(df)
+
+    with tempfile.TemporaryDirectory(prefix="compact-report-") as directory:
+        df.to_csv(os.path.join(directory, 'products_data_augmented.csv'), index=False)
+        previous_dir = os.environ.get("DATA_DIR")
+        os.environ["DATA_DIR"] = directory
+        try:
+            from app.routes import products_routes, expirationDateManagement_routes
+            resident = _resident_bytes({
+                "products:raw": products_routes.load_products_data_from_csv,
+                "products:pk_index": products_routes.load_product_index,
+                "products:enriched_table": products_routes.load_enriched_table,
+                "products:enriched": products_routes.load_enriched_products,
+                "products:bitmap_index": products_routes.load_product_bitmap_index,
+                "expiration:products": expirationDateManagement_routes.load_products_data,
+                "expiration:freshness_table": expirationDateManagement_routes.load_freshness_table,
+            })
+        finally:
+            if previous_dir is None:
+                os.environ.pop("DATA_DIR", None)
+            else:
+                os.environ["DATA_DIR"] = previous_dir
+
+    def mb(value: int) -> float:
+        return round(value / 1024 ** 2, 2)
+
+    resident_total = sum(resident.values())
+    return {
+        "rows": rows,
+        "dict_per_row_mb_estimated": mb(dict_bytes),
+        "pandas_default_mb": mb(pandas_bytes),
+        "pandas_compact_mb": mb(compact_bytes),
+        "compact_table_mb": mb(table.memory_bytes()),
+        "reduction_vs_dicts": round(dict_bytes / max(table.memory_bytes(), 1), 1),
+        "reduction_vs_pandas_default": round(pandas_bytes / max(compact_bytes, 1), 1),
+        "serving_resident_mb": {name: mb(value) for name, value in resident.items()},
+        "serving_resident_total_mb": mb(resident_total),
+        "dtypes": {column: str(dtype) for column, dtype in compact.dtypes.items()},
+        "float32_columns": float_decimals,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reporte de memoria de la representación compacta de productos")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    print(json.dumps(memory_report(args.rows), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from sklearn.ensemble import RandomForestRegressor
+
+TARGET_COLUMNS = ['suggested_units', 'overload_units']
+
+# Núcleos para entrenar cuando no se indican (-1 = todos); se puede fijar con TRAINING_N_JOBS
+DEFAULT_N_JOBS = int(os.environ.get("TRAINING_N_JOBS", "-1"))
+
+# Conjuntos de features disponibles para entrenar el modelo de consumo
+FEATURE_SETS: Dict[str, Dict[str, List[str]]] = {
+    "basic": {
+        "numeric": ['standard_quantity', 'units_returned'],
+        "categorical": [],
+    },
+    "rich": {
+        "numeric": ['standard_quantity', 'units_returned', 'duration', 'tickets_sold', 'Passenger_Count'],
+        "categorical": ['aerolinea', 'tipo', 'meal_service_type'],
+    },
+}
+
+
+def build_training_frame(products_df: pd.DataFrame, past_flights_df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Une los productos con el perfil de vuelo de su aerolínea (duración, boletos
+    vendidos y tipo de servicio más frecuente) tomado de pastFlights_data.csv.
+    products_data_augmented.csv no tiene vuelo ni ruta por fila, así que la
+    aerolínea es la llave más específica que comparten ambos datasets
+    """
+    if past_flights_df is None or past_flights_df.empty:
+        return products_df
+
+    flights = past_flights_df.drop_duplicates(['flight_id', 'departure_date'])
+    airline_profile = flights.groupby('airline').agg(
+        duration=('duration', 'mean'),
+        tickets_sold=('tickets_sold', 'mean'),
+        meal_service_type=('meal_service_type', lambda s: s.mode().iat[0])
+    )
+    columns = [col for col in airline_profile.columns if col not in products_df.columns]
+    return products_df.join(airline_profile[columns], on='aerolinea')
+
+
+def _frame_fingerprint(df: pd.DataFrame) -> str:
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+
+def _current_rss_mb() -> Optional[float]:
+    """
+    Memoria residente actual del proceso (MB); None fuera de Linux
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+
+
+class ConsumptionTrainingPipeline:
+    """
+    Pipeline de entrenamiento del modelo de consumo.
+
+    Los códigos de las variables categóricas se conservan entre reentrenamientos
+    (las categorías nuevas se agregan al final) y la matriz de features ya
+    codificada se reutiliza mientras el dataset no cambie.
+    """
+
+    def __init__(self):
+        self.encoders: Dict[str, Dict[str, int]] = {}
+        self._matrix_cache: Dict[Tuple[str, str], Tuple[pd.DataFrame, pd.DataFrame]] = {}
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _encode(self, column: str, values: pd.Series, fit: bool) -> np.ndarray:
+        mapping = self.encoders.setdefault(column, {})
+        values = values.astype(str)
+        if fit:
+            for category in values.unique():
+                if category not in mapping:
+                    mapping[category] = len(mapping)
+        # Categorías no vistas en el entrenamiento se codifican como -1
+        return values.map(mapping).fillna(-1).astype(np.int32).to_numpy()
+
+    def transform(self, df: pd.DataFrame, feature_set: str = "basic", fit: bool = False) -> pd.DataFrame:
+        """
+        Construye la matriz de features con los encoders en caché
+        """
+        spec = FEATURE_SETS[feature_set]
+        missing = [col for col in spec["numeric"] + spec["categorical"] if col not in df.columns]
+        if missing:
+            raise ValueError(f"Columnas faltantes para el conjunto '{feature_set}': {missing}")
+
+        X = df[spec["numeric"]].astype(float)
+        for column in spec["categorical"]:
+            X[column] = self._encode(column, df[column], fit=fit)
+        return X
+
+    def feature_matrix(self, df: pd.DataFrame, feature_set: str) -> Tuple[pd.DataFrame, pd.DataFrame, bool]:
+        """
+        Devuelve (X, y, cache_hit) reutilizando la matriz si el dataset no cambió
+        """
+        key = (_frame_fingerprint(df), feature_set)
+        with self._lock:
+            cached = self._matrix_cache.get(key)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached[0], cached[1], True
+
+            self.cache_misses += 1
+            X = self.transform(df, feature_set, fit=True)
+            y = df[TARGET_COLUMNS]
+            # Solo se conserva la matriz del último dataset por conjunto de features
+            self._matrix_cache = {k: v for k, v in self._matrix_cache.items() if k[1] != feature_set}
+            self._matrix_cache[key] = (X, y)
+            return X, y, False
+
+    def fit(self, df: pd.DataFrame, feature_set: str = "basic", n_jobs: Optional[int] = None,
+            n_estimators: int = 200, random_state: int = 42,
+            measure_size: bool = False) -> Tuple["RandomForestRegressor", Dict[str, Any]]:
+        """
+        Entrena un RandomForestRegressor y devuelve (modelo, reporte de costo y métricas).
+        Sin n_jobs se usa DEFAULT_N_JOBS. El tamaño serializado del modelo solo
+        se mide con measure_size: serializar el bosque cuesta casi lo que entrenarlo.
+        """
+        # sklearn se importa aquí para no cargarlo al importar la aplicación
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.model_selection import train_test_split
+        
+        missing_targets = [col for col in TARGET_COLUMNS if col not in df.columns]
+        if missing_targets:
+            raise ValueError(f"Columnas faltantes en el dataset: {missing_targets}")
+
+        n_jobs = DEFAULT_N_JOBS if n_jobs is None else n_jobs
+        started = time.perf_counter()
+        X, y, cache_hit = self.feature_matrix(df, feature_set)
+        encoded = time.perf_counter()
+
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=random_state)
+        model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state, n_jobs=n_jobs)
+        rss_before = _current_rss_mb()
+        model.fit(X_train, y_train)
+        rss_after = _current_rss_mb()
+        fitted = time.perf_counter()
+
+        y_pred = model.predict(X_test)
+        mse = float(np.mean((y_test.to_numpy() - y_pred) ** 2))
+        r2 = float(model.score(X_test, y_test))
+        finished = time.perf_counter()
+
+        report = {
+            "feature_set": feature_set,
+            "features": list(X.columns),
+            "metrics": {
+                "mean_squared_error": round(mse, 4),
+                "r2_score": round(r2, 4),
+                "training_samples": len(X_train),
+                "test_samples": len(X_test)
+            },
+            "cost": {
+                "encoding_seconds": round(encoded - started, 4),
+                "fit_seconds": round(fitted - encoded, 4),
+                "evaluation_seconds": round(finished - fitted, 4),
+                "total_seconds": round(finished - started, 4),
+                "feature_matrix_bytes": int(X.memory_usage(index=False).sum()),
+                "model_size_bytes": len(pickle.dumps(model)) if measure_size else None,
+                # Crecimiento de la memoria residente del proceso durante el fit (no el pico histórico)
+                "fit_rss_delta_mb": round(rss_after - rss_before, 2) if rss_before is not None and rss_after is not None else None,
+                "n_jobs": n_jobs,
+                "feature_cache_hit": cache_hit
+            },
+            "encoders": {column: len(self.encoders.get(column, {})) for column in FEATURE_SETS[feature_set]["categorical"]}
+        }
+        return model, report
+
+
+consumption_pipeline = ConsumptionTrainingPipeline()
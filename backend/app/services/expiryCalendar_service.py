@@ -0,0 +1,158 @@
+"""
+Fechas de recepción y vencimiento por lote, y un índice temporal para consultarlas.
+
+Si el CSV trae las fechas (fecha_recepcion / fecha_expiracion) se usan tal
+cual. Si no, se estiman una sola vez por versión del archivo a partir del
+freshness_score y la fecha en que se midió, que viene en el propio dataset
+(fecha_medicion) y, si falta, es la de la versión del archivo: desde entonces
+los lotes envejecen con el reloj en lugar de recalcularse contra
+datetime.now() en cada petición.
+
+ExpiryCalendar guarda los vencimientos como datetime64 ordenados, así que
+"qué vence en los próximos N días" es una búsqueda binaria (searchsorted) y
+el calendario por días sale de los límites de cada cubeta.
+"""
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from app.utils.utils import current_time_step
+
+RECEIVED_COLUMN = 'fecha_recepcion'
+EXPIRY_COLUMN = 'fecha_expiracion'
+# Fecha en que se midió el freshness_score de cada fila
+MEASURED_COLUMN = 'fecha_medicion'
+# Fracción de vida útil transcurrida cuando no hay freshness_score
+DEFAULT_ELAPSED_FRACTION = 0.45
+
+DAY = np.timedelta64(1, 'D')
+
+
+def today_reference() -> datetime:
+    """
+    Referencia por defecto de las consultas: la hora actual en pasos de
+    CLOCK_STEP_MINUTES, la misma con la que se invalidan las cachés que
+    dependen del reloj. Un lote que venció hoy ya cuenta como vencido.
+    """
+    return current_time_step()
+
+
+def _to_datetime64(value) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(value).to_datetime64(), 's')
+
+
+def batch_dates(df: pd.DataFrame, snapshot: datetime) -> Tuple[pd.Series, pd.Series]:
+    """
+    (fecha_recepcion, fecha_expiracion) como columnas datetime64 para cada fila.
+    Las fechas que falten en el CSV se estiman con la vida útil y el
+    freshness_score medido en fecha_medicion o, si la fila no la trae, en `snapshot`.
+    """
+    shelf_life = pd.to_numeric(df['vida_util_dias'], errors='coerce').fillna(0).clip(lower=0)
+    if 'freshness_score' in df.columns:
+        score = pd.to_numeric(df['freshness_score'], errors='coerce')
+        elapsed_fraction = (1 - score.clip(0, 100) / 100).fillna(DEFAULT_ELAPSED_FRACTION)
+    else:
+        elapsed_fraction = pd.Series(DEFAULT_ELAPSED_FRACTION, index=df.index)
+
+    measured = pd.Series(pd.Timestamp(snapshot), index=df.index)
+    if MEASURED_COLUMN in df.columns:
+        measured = pd.to_datetime(df[MEASURED_COLUMN], errors='coerce').fillna(measured)
+
+    estimated_received = measured - pd.to_timedelta(shelf_life * elapsed_fraction, unit='D')
+    received = estimated_received
+    if RECEIVED_COLUMN in df.columns:
+        received = pd.to_datetime(df[RECEIVED_COLUMN], errors='coerce').fillna(estimated_received)
+
+    expiry = received + pd.to_timedelta(shelf_life, unit='D')
+    if EXPIRY_COLUMN in df.columns:
+        expiry = pd.to_datetime(df[EXPIRY_COLUMN], errors='coerce').fillna(expiry)
+
+    return received.dt.floor('s'), expiry.dt.floor('s')
+
+
+def remaining_life(expiry, received, shelf_life_days: float, now: Optional[datetime] = None) -> Dict[str, float]:
+    """
+    Días restantes, transcurridos y porcentaje de vida útil de un lote a la fecha `now`
+    """
+    now = now or today_reference()
+    remaining = (pd.Timestamp(expiry) - pd.Timestamp(now)) / pd.Timedelta(days=1)
+    elapsed = (pd.Timestamp(now) - pd.Timestamp(received)) / pd.Timedelta(days=1)
+    remaining = max(0.0, remaining)
+    percentage = remaining / shelf_life_days * 100 if shelf_life_days > 0 else 0
+    return {
+        "dias_restantes": remaining,
+        "dias_transcurridos": max(0.0, elapsed),
+        "porcentaje_vida_util": min(100.0, max(0.0, percentage)),
+    }
+
+
+class ExpiryCalendar:
+    """
+    Índice de vencimientos: posiciones de fila ordenadas por fecha de vencimiento
+    """
+
+    def __init__(self, received: pd.Series, expiry: pd.Series, shelf_life_days: pd.Series):
+        self.received = received.to_numpy(dtype='datetime64[s]')
+        self.expiry = expiry.to_numpy(dtype='datetime64[s]')
+        self.shelf_life_days = pd.to_numeric(shelf_life_days, errors='coerce').fillna(0).to_numpy(dtype=float)
+
+        # NaT se ordena al final: se excluye del índice
+        valid = ~np.isnat(self.expiry)
+        positions = np.flatnonzero(valid)
+        self.order = positions[np.argsort(self.expiry[valid], kind='stable')]
+        self.sorted_expiry = self.expiry[self.order]
+
+    def __len__(self) -> int:
+        return len(self.expiry)
+
+    def remaining_days(self, now: Optional[datetime] = None) -> np.ndarray:
+        """
+        Días hasta el vencimiento de cada fila (negativo si ya venció)
+        """
+        return (self.expiry - _to_datetime64(now or today_reference())) / DAY
+
+    def life_percentage(self, now: Optional[datetime] = None) -> np.ndarray:
+        remaining = np.maximum(self.remaining_days(now), 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentage = np.where(self.shelf_life_days > 0, remaining / self.shelf_life_days * 100, 0)
+        return np.clip(np.nan_to_num(percentage), 0, 100)
+
+    def expiring_between(self, start: datetime, end: datetime) -> np.ndarray:
+        """
+        Posiciones de fila que vencen en [start, end), ordenadas por vencimiento
+        """
+        lo = np.searchsorted(self.sorted_expiry, _to_datetime64(start), side='left')
+        hi = np.searchsorted(self.sorted_expiry, _to_datetime64(end), side='left')
+        return self.order[lo:hi]
+
+    def expiring_within(self, days: float, now: Optional[datetime] = None,
+                        include_expired: bool = False) -> np.ndarray:
+        """
+        Posiciones que vencen en los próximos `days` días (y las ya vencidas si se pide)
+        """
+        now = _to_datetime64(now or today_reference())
+        end = now + np.timedelta64(int(round(days * 86400)), 's')
+        lo = 0 if include_expired else np.searchsorted(self.sorted_expiry, now, side='left')
+        hi = np.searchsorted(self.sorted_expiry, end, side='right')
+        return self.order[lo:hi]
+
+    def expired(self, now: Optional[datetime] = None) -> np.ndarray:
+        now = _to_datetime64(now or today_reference())
+        return self.order[:np.searchsorted(self.sorted_expiry, now, side='left')]
+
+    def buckets(self, days: int, bucket_days: int = 1, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Vencimientos por cubeta de `bucket_days` días desde hoy: cada conteo es la
+        diferencia entre dos búsquedas binarias sobre los límites de las cubetas
+        """
+        today = np.datetime64(pd.Timestamp(now or today_reference()).normalize().to_datetime64(), 's')
+        edges = today + np.arange(0, days + bucket_days, bucket_days) * np.timedelta64(86400, 's')
+        counts = np.diff(np.searchsorted(self.sorted_expiry, edges, side='left'))
+        return [
+            {
+                "desde": str(start.astype('datetime64[D]')),
+                "hasta": str((end - np.timedelta64(1, 's')).astype('datetime64[D]')),
+                "vencen": int(count),
+            }
+            for start, end, count in zip(edges[:-1], edges[1:], counts)
+        ]
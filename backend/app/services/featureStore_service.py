@@ -0,0 +1,315 @@
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+import numpy as np
+import pandas as pd
+from app.utils.utils import get_dataset_version
+
+# Niveles de agregación, del más específico al más general.
+# lookup() recorre esta lista y devuelve el primer nivel con datos.
+FEATURE_LEVELS: List[Tuple[str, Tuple[str, ...]]] = [
+    ("route_aircraft_meal_product", ("route", "aircraft", "meal_service_type", "product_id")),
+    ("route_product", ("route", "product_id")),
+    ("aircraft_product", ("aircraft", "product_id")),
+    ("meal_product", ("meal_service_type", "product_id")),
+    ("product", ("product_id",)),
+]
+
+REQUIRED_COLUMNS = [
+    'flight_id', 'aircraft', 'origin', 'destination', 'departure_date', 'meal_service_type',
+    'product_id', 'quantity_served', 'quantity_consumed', 'quantity_returned',
+    'consumption_rate', 'food_waste_percentage'
+]
+
+
+def route_key(origin: str, destination: str) -> str:
+    """
+    Convierte 'JFK - New York' / 'LAX - Los Angeles' en 'JFK-LAX'
+    """
+    return f"{str(origin).split(' - ')[0].strip()}-{str(destination).split(' - ')[0].strip()}"
+
+
+VALUE_COLUMNS = ['quantity_served', 'quantity_consumed', 'quantity_returned', 'consumption_rate', 'food_waste_percentage']
+# Columnas de la ventana móvil de cada clave
+RECENT_COLUMNS = ['quantity_consumed', 'consumption_rate', 'food_waste_percentage']
+
+# Dataset del que se construye el store global; se reconstruye cuando cambia su versión
+SOURCE_DATASET = 'pastFlights_data.csv'
+
+
+class _FeatureAccumulator:
+    """
+    Agregados de una clave: sumas acumuladas y ventana móvil de los últimos vuelos
+    """
+    __slots__ = ("flights", "sum_served", "sum_consumed", "sum_returned", "sum_rate",
+                 "sum_waste", "recent_consumed", "recent_rate", "recent_waste", "features")
+
+    def __init__(self, window: int):
+        self.flights = 0
+        self.sum_served = 0.0
+        self.sum_consumed = 0.0
+        self.sum_returned = 0.0
+        self.sum_rate = 0.0
+        self.sum_waste = 0.0
+        self.recent_consumed = deque(maxlen=window)
+        self.recent_rate = deque(maxlen=window)
+        self.recent_waste = deque(maxlen=window)
+        self.features: Dict[str, Any] = {}
+
+    def merge(self, flights: int, totals: Tuple[float, ...], recent: Tuple[List[float], ...]):
+        """
+        Suma un grupo de vuelos ya agregado: conteo, sumas de VALUE_COLUMNS y
+        los últimos valores de RECENT_COLUMNS en orden de llegada
+        """
+        self.flights += flights
+        self.sum_served += totals[0]
+        self.sum_consumed += totals[1]
+        self.sum_returned += totals[2]
+        self.sum_rate += totals[3]
+        self.sum_waste += totals[4]
+        self.recent_consumed.extend(recent[0])
+        self.recent_rate.extend(recent[1])
+        self.recent_waste.extend(recent[2])
+
+    def refresh(self):
+        consumed = np.fromiter(self.recent_consumed, dtype=float)
+        p50, p90 = np.percentile(consumed, [50, 90])
+        self.features = {
+            "flights": self.flights,
+            "quantity_served_mean": round(self.sum_served / self.flights, 2),
+            "quantity_consumed_mean": round(self.sum_consumed / self.flights, 2),
+            "quantity_consumed_rolling_mean": round(float(consumed.mean()), 2),
+            "quantity_consumed_p50": round(float(p50), 2),
+            "quantity_consumed_p90": round(float(p90), 2),
+            "consumption_rate_mean": round(self.sum_rate / self.flights, 2),
+            "consumption_rate_rolling_mean": round(float(np.mean(self.recent_rate)), 2),
+            "waste_rate_mean": round(self.sum_waste / self.flights, 2),
+            "waste_rate_rolling_mean": round(float(np.mean(self.recent_waste)), 2),
+            "return_rate": round(self.sum_returned / self.sum_served * 100, 2) if self.sum_served > 0 else 0.0,
+        }
+
+
+def _group_keys(index: pd.Index) -> List[Tuple]:
+    """
+    Llaves de un groupby como tuplas, también cuando se agrupa por una sola columna
+    """
+    if index.nlevels > 1:
+        return list(index)
+    return [(key,) for key in index]
+
+
+class ConsumptionFeatureStore:
+    """
+    Feature store de consumo histórico construido a partir de pastFlights_data.csv.
+
+    Cada lote se valida y convierte completo antes de tocar el store; después se
+    agrega por nivel con un groupby y las features se recalculan una sola vez
+    por clave tocada, así que ingest() es incremental y lookup() es una
+    búsqueda en diccionario.
+    """
+
+    def __init__(self, window: int = 20):
+        self.window = window
+        self._tables: Dict[str, Dict[Tuple, _FeatureAccumulator]] = {name: {} for name, _ in FEATURE_LEVELS}
+        self._seen: set = set()
+        # Features por nivel como DataFrame (ver feature_frame); se invalidan en cada _merge
+        self._frames: Dict[Tuple[str, Tuple[str, ...]], pd.DataFrame] = {}
+        self._lock = threading.Lock()
+
+    def ingest(self, records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Agrega vuelos completados al store. Los registros ya vistos
+        (mismo flight_id, departure_date y product_id) se ignoran.
+        """
+        return self.ingest_dataframe(self._records_frame(records))
+
+    def ingest_dataframe(self, df: pd.DataFrame) -> Dict[str, int]:
+        """
+        Agrega un DataFrame con el esquema de pastFlights_data.csv. Si algún
+        registro es inválido se rechaza el lote completo sin modificar el store.
+        """
+        batch = self._prepare(df)
+        accepted = self.ingest_prepared(batch)
+        return {"ingested": len(accepted), "skipped_duplicates": len(batch) - len(accepted)}
+
+    def ingest_prepared(self, batch: pd.DataFrame) -> pd.DataFrame:
+        """
+        Agrega un lote ya validado con _prepare y devuelve solo las filas
+        aceptadas (las que no estaban en el store ni se repiten en el lote)
+        """
+        record_keys = list(zip(batch['flight_id'], batch['departure_date'], batch['product_id']))
+
+        with self._lock:
+            fresh = []
+            batch_seen = set()
+            for record_key in record_keys:
+                is_new = record_key not in self._seen and record_key not in batch_seen
+                batch_seen.add(record_key)
+                fresh.append(is_new)
+            batch = batch[fresh]
+            self._seen.update(key for key, is_new in zip(record_keys, fresh) if is_new)
+            self._merge(batch)
+        return batch
+
+    @staticmethod
+    def _records_frame(records: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+        """
+        DataFrame con el esquema de pastFlights_data.csv a partir de registros sueltos
+        """
+        records = list(records)
+        for record in records:
+            missing = [col for col in REQUIRED_COLUMNS if col not in record]
+            if missing:
+                raise ValueError(f"Columnas faltantes en el registro: {missing}")
+        return pd.DataFrame.from_records(records, columns=REQUIRED_COLUMNS)
+
+    @staticmethod
+    def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Valida y convierte el lote completo: dimensiones de agregación y valores numéricos
+        """
+        missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"Columnas faltantes en el registro: {missing}")
+
+        batch = pd.DataFrame({
+            "flight_id": df['flight_id'].to_numpy(dtype=object),
+            "departure_date": df['departure_date'].astype(str).to_numpy(dtype=object),
+            "route": [route_key(origin, destination) for origin, destination in zip(df['origin'], df['destination'])],
+            "aircraft": df['aircraft'].to_numpy(dtype=object),
+            "meal_service_type": df['meal_service_type'].to_numpy(dtype=object),
+            "product_id": df['product_id'].to_numpy(dtype=object),
+        })
+        for column in VALUE_COLUMNS:
+            values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+            if np.isnan(values).any():
+                raise ValueError(f"Valores faltantes o no numéricos en la columna {column}")
+            batch[column] = values
+        return batch
+
+    def _merge(self, batch: pd.DataFrame):
+        """
+        Agrega el lote a cada nivel con un groupby y recalcula las features de las claves tocadas
+        """
+        if batch.empty:
+            return
+        self._frames = {}
+        for level_name, level_dims in FEATURE_LEVELS:
+            dims = list(level_dims)
+            grouped = batch.groupby(dims, sort=False, dropna=False)
+            counts = grouped.size()
+            totals = grouped[VALUE_COLUMNS].sum().reindex(counts.index)
+            recent = grouped.tail(self.window).groupby(dims, sort=False, dropna=False)[RECENT_COLUMNS].agg(list).reindex(counts.index)
+
+            table = self._tables[level_name]
+            for key, flights, total, window in zip(_group_keys(counts.index), counts.tolist(),
+                                                   totals.itertuples(index=False, name=None),
+                                                   recent.itertuples(index=False, name=None)):
+                accumulator = table.get(key)
+                if accumulator is None:
+                    accumulator = table[key] = _FeatureAccumulator(self.window)
+                accumulator.merge(flights, total, window)
+                accumulator.refresh()
+
+    def lookup(self, product_id: str, route: Optional[str] = None, aircraft: Optional[str] = None,
+               meal_service_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve las features del nivel más específico disponible para la combinación dada
+        """
+        dims = {"route": route, "aircraft": aircraft, "meal_service_type": meal_service_type, "product_id": product_id}
+        for level_name, level_dims in FEATURE_LEVELS:
+            if any(dims[d] is None for d in level_dims):
+                continue
+            accumulator = self._tables[level_name].get(tuple(dims[d] for d in level_dims))
+            if accumulator is not None:
+                return {"level": level_name, "key": dict((d, dims[d]) for d in level_dims), **accumulator.features}
+        return None
+
+    def feature_frame(self, level_name: str, features: List[str]) -> pd.DataFrame:
+        """
+        Features de todas las claves de un nivel como DataFrame: una columna
+        por dimensión del nivel y una por feature pedida
+        """
+        cache_key = (level_name, tuple(features))
+        with self._lock:
+            frame = self._frames.get(cache_key)
+            if frame is None:
+                items = list(self._tables[level_name].items())
+                frame = pd.DataFrame([key for key, _ in items], columns=list(dict(FEATURE_LEVELS)[level_name]))
+                for feature in features:
+                    frame[feature] = np.array([accumulator.features[feature] for _, accumulator in items], dtype=float)
+                self._frames[cache_key] = frame
+        return frame
+
+    def lookup_frame(self, keys: pd.DataFrame, features: List[str]) -> pd.DataFrame:
+        """
+        lookup() para muchas filas a la vez: keys tiene las columnas route,
+        aircraft, meal_service_type y product_id; cada fila toma las features
+        del nivel más específico con datos (NaN si ningún nivel tiene la clave)
+        """
+        values = np.full((len(keys), len(features)), np.nan)
+        found = np.zeros(len(keys), dtype=bool)
+        for level_name, level_dims in FEATURE_LEVELS:
+            dims = list(level_dims)
+            # Igual que lookup(): un nivel no aplica si falta alguna de sus dimensiones
+            candidates = keys[dims].assign(_row=np.arange(len(keys)))[~found & keys[dims].notna().all(axis=1).to_numpy()]
+            if candidates.empty:
+                continue
+            matched = candidates.merge(self.feature_frame(level_name, features), on=dims, how='inner')
+            rows = matched['_row'].to_numpy()
+            values[rows] = matched[features].to_numpy(dtype=float)
+            found[rows] = True
+        return pd.DataFrame(values, index=keys.index, columns=features)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Tamaño del store por nivel de agregación
+        """
+        return {
+            "window": self.window,
+            "records": len(self._seen),
+            "keys_per_level": {name: len(table) for name, table in self._tables.items()},
+        }
+
+
+_feature_store: Optional[ConsumptionFeatureStore] = None
+_feature_store_version: Optional[str] = None
+# Registros aceptados desde la API (ya validados con _prepare): se vuelven a
+# aplicar si el store se reconstruye con una nueva versión del CSV
+_live_batches: List[pd.DataFrame] = []
+_feature_store_lock = threading.Lock()
+
+
+def get_feature_store(loader) -> ConsumptionFeatureStore:
+    """
+    Devuelve el feature store global, construyéndolo con loader() la primera vez
+    y cada vez que cambia la versión de pastFlights_data.csv
+    """
+    global _feature_store, _feature_store_version
+    version = get_dataset_version(SOURCE_DATASET)
+    if _feature_store is None or _feature_store_version != version:
+        with _feature_store_lock:
+            if _feature_store is None or _feature_store_version != version:
+                store = ConsumptionFeatureStore()
+                result = store.ingest_dataframe(loader())
+                # Lo que ya llegó al CSV se descarta; el resto queda compactado en un solo lote
+                pending = [store.ingest_prepared(batch) for batch in _live_batches]
+                pending = [batch for batch in pending if not batch.empty]
+                _live_batches[:] = [pd.concat(pending, ignore_index=True)] if pending else []
+                print(f"Feature store de consumo construido: {result['ingested']} registros")
+                _feature_store, _feature_store_version = store, version
+    return _feature_store
+
+
+def ingest_live_records(loader, records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Agrega vuelos completados al store global y conserva los aceptados para las reconstrucciones
+    """
+    batch = ConsumptionFeatureStore._prepare(ConsumptionFeatureStore._records_frame(records))
+    get_feature_store(loader)
+    # Bajo el mismo candado que la reconstrucción: el lote queda en el store vigente y en los siguientes
+    with _feature_store_lock:
+        accepted = _feature_store.ingest_prepared(batch)
+        if not accepted.empty:
+            _live_batches.append(accepted)
+    return {"ingested": len(accepted), "skipped_duplicates": len(batch) - len(accepted)}
@@ -0,0 +1,102 @@
+import heapq
+from typing import Dict, Any, List
+import numpy as np
+import pandas as pd
+
+# Mismos cortes que freshness_status_from_score: "Largos y Cortos" desde 75, "Cortos" desde 50
+LONG_HAUL_MIN_SCORE = 75.0
+SHORT_HAUL_MIN_SCORE = 50.0
+DEFAULT_LONG_HAUL_HOURS = 4.0
+
+
+def allocate_fefo(batches: pd.DataFrame, demand: pd.DataFrame,
+                  long_haul_hours: float = DEFAULT_LONG_HAUL_HOURS) -> Dict[str, Any]:
+    """
+    Asigna unidades de lotes a vuelos con FEFO (primero el que vence primero).
+
+    batches: key, units, shelf_life_days, expires_in_days (días desde la fecha del inventario)
+    demand: key, units, departs_in_days, duration_hours (una fila por vuelo x clave)
+
+    Los vuelos se recorren por hora de salida. Un lote puede ir en un vuelo
+    largo si a la salida conserva al menos 75 % de su vida útil y en uno corto
+    si conserva 50 %, y nunca si vence antes de aterrizar. Por cada clave hay
+    dos montículos ordenados por vencimiento (uno por tipo de vuelo): como el
+    tiempo solo avanza, un lote que deja de cumplir la regla de un tipo de
+    vuelo se descarta de ese montículo para siempre (borrado perezoso), igual
+    que los lotes agotados. Costo O((lotes + demanda + asignaciones) log lotes).
+
+    Devuelve las asignaciones (fila de demanda, lote, unidades, vida a la
+    salida), las unidades asignadas por fila de demanda y lo que queda por lote.
+    """
+    keys = batches['key'].to_numpy()
+    expires = batches['expires_in_days'].to_numpy(dtype=float)
+    shelf_life = np.maximum(batches['shelf_life_days'].to_numpy(dtype=float), 1e-9)
+    remaining = batches['units'].to_numpy(dtype=float).copy()
+
+    # Límite para subir a cada tipo de vuelo: la salida debe ser a más tardar en esta fecha
+    long_deadline = expires - shelf_life * LONG_HAUL_MIN_SCORE / 100
+    short_deadline = expires - shelf_life * SHORT_HAUL_MIN_SCORE / 100
+
+    # Una lista ordenada ya es un montículo válido: ordenar una vez por (clave, vencimiento)
+    order = np.lexsort((expires, keys))
+    heaps: Dict[Any, Dict[bool, List]] = {}
+    if len(order):
+        sorted_keys = keys[order]
+        bounds = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1], True])
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            members = [(expires[b], int(b)) for b in order[start:end]]
+            heaps[sorted_keys[start]] = {True: members, False: list(members)}
+
+    demand_keys = demand['key'].to_numpy()
+    departs = demand['departs_in_days'].to_numpy(dtype=float)
+    durations = demand['duration_hours'].to_numpy(dtype=float) / 24
+    requested = demand['units'].to_numpy(dtype=float)
+    is_long = demand['duration_hours'].to_numpy(dtype=float) > long_haul_hours
+    allocated = np.zeros(len(demand))
+
+    pick_rows: List[int] = []
+    pick_batches: List[int] = []
+    pick_units: List[float] = []
+
+    for row in np.lexsort((np.arange(len(demand)), departs)):
+        key_heaps = heaps.get(demand_keys[row])
+        if key_heaps is None or requested[row] <= 0:
+            continue
+        heap = key_heaps[bool(is_long[row])]
+        deadline = long_deadline if is_long[row] else short_deadline
+        depart = departs[row]
+        need = requested[row]
+        # Lotes que cumplen la regla pero vencerían en vuelo: se apartan solo para esta fila
+        set_aside = []
+
+        while need > 0 and heap:
+            expiry, batch = heap[0]
+            if remaining[batch] <= 0 or deadline[batch] < depart:
+                heapq.heappop(heap)
+                continue
+            if expiry - depart < durations[row]:
+                set_aside.append(heapq.heappop(heap))
+                continue
+            units = min(need, remaining[batch])
+            remaining[batch] -= units
+            need -= units
+            pick_rows.append(row)
+            pick_batches.append(batch)
+            pick_units.append(units)
+            if remaining[batch] <= 0:
+                heapq.heappop(heap)
+
+        for item in set_aside:
+            heapq.heappush(heap, item)
+        allocated[row] = requested[row] - need
+
+    picks = pd.DataFrame({
+        'demand_row': np.array(pick_rows, dtype=np.int64),
+        'batch_row': np.array(pick_batches, dtype=np.int64),
+        'units': np.array(pick_units, dtype=float),
+    })
+    days_left = expires[picks['batch_row']] - departs[picks['demand_row']]
+    picks['days_left_at_departure'] = days_left
+    picks['score_at_departure'] = np.clip(days_left / shelf_life[picks['batch_row']] * 100, 0, 100)
+
+    return {"picks": picks, "allocated": allocated, "remaining": remaining}
@@ -0,0 +1,89 @@
+from typing import Dict, Any, List, Sequence
+import numpy as np
+import pandas as pd
+
+DEFAULT_QUANTILES = [50.0, 90.0, 95.0]
+# Filas por bloque al agregar por grupo: acota la memoria de (filas, árboles, salidas)
+CHUNK_ROWS = 20000
+
+
+def parse_quantiles(text: str) -> List[float]:
+    """
+    Convierte '50,90,95' en [50.0, 90.0, 95.0]; cada cuantil debe estar entre 0 y 100
+    """
+    quantiles = []
+    for raw in text.split(","):
+        if not raw.strip():
+            continue
+        value = float(raw)
+        if not 0 < value < 100:
+            raise ValueError(f"Cuantil fuera de rango: {raw.strip()}. Use valores entre 0 y 100")
+        quantiles.append(value)
+    if not quantiles:
+        raise ValueError("Debe indicar al menos un cuantil")
+    return sorted(set(quantiles))
+
+
+def quantile_key(q: float) -> str:
+    return f"p{q:g}".replace(".", "_")
+
+
+class ForestQuantiles:
+    """
+    Predicciones de cada árbol de un RandomForestRegressor en una sola pasada.
+
+    model.apply(X) devuelve la hoja de cada árbol para cada fila (vectorizado y
+    paralelo en sklearn); con los valores de todos los nodos concatenados en una
+    sola tabla, la predicción de cada árbol es un gather por índice. El promedio
+    sobre árboles es exactamente model.predict(X) y los cuantiles describen la
+    dispersión entre árboles (incertidumbre del modelo, no el ruido de cada vuelo).
+    """
+
+    def __init__(self, model, output_names: Sequence[str]):
+        self.model = model
+        self.output_names = list(output_names)
+
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        node_counts = np.array([tree.node_count for tree in trees])
+        # Desplazamiento de cada árbol en la tabla concatenada de nodos
+        self.offsets = np.concatenate([[0], np.cumsum(node_counts)[:-1]])
+        # tree_.value tiene forma (nodos, salidas, 1) en regresión
+        self.node_values = np.concatenate([tree.value[:, :, 0] for tree in trees], axis=0)
+        self.n_trees = len(trees)
+
+    def per_tree(self, X: pd.DataFrame) -> np.ndarray:
+        """
+        Arreglo (filas, árboles, salidas) con la predicción de cada árbol
+        """
+        leaves = self.model.apply(X)
+        return self.node_values[leaves + self.offsets]
+
+    def group_totals(self, X: pd.DataFrame, groups: np.ndarray, n_groups: int,
+                     chunk_rows: int = CHUNK_ROWS) -> np.ndarray:
+        """
+        Arreglo (grupos, árboles): suma por grupo (p. ej. vuelo) de la predicción
+        total (todas las salidas) de cada árbol, procesando las filas por bloques
+        """
+        totals = np.zeros((n_groups, self.n_trees))
+        for start in range(0, len(X), chunk_rows):
+            chunk = self.per_tree(X.iloc[start:start + chunk_rows]).sum(axis=2)
+            np.add.at(totals, groups[start:start + chunk_rows], chunk)
+        return totals
+
+    @staticmethod
+    def summarize(values: np.ndarray, quantiles: Sequence[float]) -> Dict[str, np.ndarray]:
+        """
+        Media y cuantiles sobre el eje de árboles (el último) de un arreglo (..., árboles)
+        """
+        summary = {"mean": values.mean(axis=-1)}
+        for q, result in zip(quantiles, np.percentile(values, quantiles, axis=-1)):
+            summary[quantile_key(q)] = result
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "trees": self.n_trees,
+            "nodes": int(len(self.node_values)),
+            "table_bytes": int(self.node_values.nbytes),
+            "outputs": self.output_names,
+        }
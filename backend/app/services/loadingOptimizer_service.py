@@ -0,0 +1,104 @@
+from typing import Callable, Dict, Optional
+import numpy as np
+import pandas as pd
+
+# Filas por bloque: acota la memoria de la matriz (filas, escenarios)
+CHUNK_ROWS = 20000
+
+
+def critical_ratio(underage: np.ndarray, overage: np.ndarray) -> np.ndarray:
+    """
+    Cu / (Cu + Co): fracción de la demanda que conviene cubrir. Si subir una
+    unidad no cuesta nada (Co = 0) se cubre todo; si faltar no cuesta nada, nada
+    """
+    total = underage + overage
+    return np.divide(underage, total, out=np.where(overage > 0, 0.0, 1.0), where=total > 0)
+
+
+def newsvendor_loads(samples: np.ndarray, ratio: np.ndarray) -> np.ndarray:
+    """
+    Carga óptima por fila: el cuantil de la razón crítica de sus escenarios de
+    demanda (filas, escenarios), redondeado hacia arriba a unidades enteras
+    """
+    n_scenarios = samples.shape[1]
+    ordered = np.sort(samples, axis=1)
+    index = np.clip(np.ceil(ratio * n_scenarios).astype(int) - 1, 0, n_scenarios - 1)
+    return np.ceil(np.take_along_axis(ordered, index[:, None], axis=1)[:, 0])
+
+
+def evaluate_loads(samples: np.ndarray, loads: np.ndarray, overage: np.ndarray,
+                   underage: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Sobrante y faltante esperados, probabilidad de quiebre y costo esperado de
+    subir `loads` frente a cada escenario de demanda
+    """
+    gap = loads[:, None] - samples
+    leftover = np.maximum(gap, 0).mean(axis=1)
+    shortage = np.maximum(-gap, 0).mean(axis=1)
+    short = gap < 0
+    return {
+        "leftover": leftover,
+        "shortage": shortage,
+        "stockout_probability": short.mean(axis=1),
+        "expected_cost": overage * leftover + underage * shortage,
+        "short": short,
+    }
+
+
+def optimize_schedule(sample_demand: Callable[[pd.DataFrame], np.ndarray], X: pd.DataFrame,
+                      overage: np.ndarray, underage: np.ndarray, groups: np.ndarray, n_groups: int,
+                      baselines: Optional[Dict[str, np.ndarray]] = None,
+                      chunk_rows: int = CHUNK_ROWS) -> Dict[str, np.ndarray]:
+    """
+    Resuelve el newsvendor para todas las filas (vuelo x producto) por bloques.
+
+    sample_demand(X) devuelve (filas, escenarios); el escenario j es el mismo
+    para todas las filas (p. ej. el árbol j del bosque), así que el riesgo de
+    quiebre por grupo es la fracción de escenarios con algún producto faltante.
+    Las cargas de `baselines` (p. ej. la cantidad estándar) y la demanda media
+    redondeada ('point', el pronóstico puntual) se evalúan en los mismos
+    escenarios para comparar costos.
+    """
+    baselines = dict(baselines or {})
+    baselines["point"] = None
+    ratio = critical_ratio(underage, overage)
+    result: Dict[str, np.ndarray] = {
+        "critical_ratio": ratio,
+        "mean_demand": np.zeros(len(X)),
+        "load": np.zeros(len(X)),
+        "leftover": np.zeros(len(X)),
+        "shortage": np.zeros(len(X)),
+        "stockout_probability": np.zeros(len(X)),
+        "expected_cost": np.zeros(len(X)),
+    }
+    group_short = None
+    for name in baselines:
+        result[f"{name}_expected_cost"] = np.zeros(len(X))
+        result[f"{name}_leftover"] = np.zeros(len(X))
+        result[f"{name}_stockout_probability"] = np.zeros(len(X))
+
+    for start in range(0, len(X), chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        samples = sample_demand(X.iloc[rows])
+        if group_short is None:
+            group_short = np.zeros((n_groups, samples.shape[1]), dtype=bool)
+
+        loads = newsvendor_loads(samples, ratio[rows])
+        evaluation = evaluate_loads(samples, loads, overage[rows], underage[rows])
+        result["mean_demand"][rows] = samples.mean(axis=1)
+        result["load"][rows] = loads
+        for key in ("leftover", "shortage", "stockout_probability", "expected_cost"):
+            result[key][rows] = evaluation[key]
+        np.logical_or.at(group_short, groups[rows], evaluation["short"])
+
+        for name, baseline in baselines.items():
+            baseline_loads = np.ceil(result["mean_demand"][rows]) if baseline is None else baseline[rows]
+            evaluation = evaluate_loads(samples, baseline_loads, overage[rows], underage[rows])
+            result[f"{name}_expected_cost"][rows] = evaluation["expected_cost"]
+            result[f"{name}_leftover"][rows] = evaluation["leftover"]
+            result[f"{name}_stockout_probability"][rows] = evaluation["stockout_probability"]
+
+    result["group_stockout_probability"] = (
+        group_short.mean(axis=1) if group_short is not None else np.zeros(n_groups)
+    )
+    return result
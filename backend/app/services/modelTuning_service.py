@@ -0,0 +1,221 @@
+"""
+Arnés offline de búsqueda de hiperparámetros para los modelos de consumo y frescura.
+
+Uso (desde backend/):
+    python -m app.services.modelTuning_service --task all --cv 5 --workers 4 --min-score 0.7
+"""
+import argparse
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import (
+    ExtraTreesClassifier,
+    ExtraTreesRegressor,
+    HistGradientBoostingClassifier,
+    HistGradientBoostingRegressor,
+    RandomForestClassifier,
+    RandomForestRegressor,
+)
+from sklearn.model_selection import KFold, StratifiedKFold, cross_val_score
+from sklearn.multioutput import MultiOutputRegressor
+
+# Familias de modelos por tarea. HistGradientBoostingRegressor es de una sola
+# salida, por eso se envuelve en MultiOutputRegressor para suggested/overload.
+MODEL_FAMILIES = {
+    "consumption": {
+        "random_forest": lambda **p: RandomForestRegressor(random_state=42, n_jobs=1, **p),
+        "extra_trees": lambda **p: ExtraTreesRegressor(random_state=42, n_jobs=1, **p),
+        "hist_gradient_boosting": lambda **p: MultiOutputRegressor(HistGradientBoostingRegressor(random_state=42, **p)),
+    },
+    "freshness": {
+        "random_forest": lambda **p: RandomForestClassifier(random_state=42, n_jobs=1, **p),
+        "extra_trees": lambda **p: ExtraTreesClassifier(random_state=42, n_jobs=1, **p),
+        "hist_gradient_boosting": lambda **p: HistGradientBoostingClassifier(random_state=42, **p),
+    },
+}
+
+SEARCH_SPACE = {
+    "random_forest": [{"n_estimators": n, "max_depth": d} for n in (25, 50, 100, 200) for d in (None, 4, 8, 16)],
+    "extra_trees": [{"n_estimators": n, "max_depth": d} for n in (50, 100, 200) for d in (None, 8)],
+    "hist_gradient_boosting": [{"max_iter": n, "max_depth": d, "learning_rate": lr}
+                               for n in (50, 100) for d in (None, 4) for lr in (0.05, 0.1)],
+}
+
+SCORING = {"consumption": "r2", "freshness": "accuracy"}
+
+# Datos compartidos por los procesos del pool (se cargan una vez por proceso)
+_worker_data: Dict[str, Any] = {}
+
+
+def _init_worker(task: str, X: pd.DataFrame, y: pd.DataFrame, cv_splits: int):
+    _worker_data.update(task=task, X=X, y=y, cv_splits=cv_splits)
+
+
+def _build_cv(task: str, y, cv_splits: int):
+    if task == "freshness":
+        min_class = int(pd.Series(np.asarray(y)).value_counts().min())
+        if min_class >= 2:
+            return StratifiedKFold(n_splits=min(cv_splits, min_class), shuffle=True, random_state=42)
+    return KFold(n_splits=min(cv_splits, len(y)), shuffle=True, random_state=42)
+
+
+def _measure_latency(model, X: pd.DataFrame, repeats: int = 30) -> Dict[str, float]:
+    single = X.iloc[[0]]
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        model.predict(single)
+        timings.append(time.perf_counter() - started)
+
+    batch = X.iloc[np.resize(np.arange(len(X)), 1000)]
+    started = time.perf_counter()
+    model.predict(batch)
+    batch_seconds = time.perf_counter() - started
+
+    return {
+        "single_row_ms_p50": round(float(np.percentile(timings, 50)) * 1000, 4),
+        "single_row_ms_p99": round(float(np.percentile(timings, 99)) * 1000, 4),
+        "batch_rows_per_second": round(len(batch) / batch_seconds, 1),
+    }
+
+
+def evaluate_candidate(candidate: Tuple[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Valida un candidato con cross-validation y lo reentrena con todos los datos.
+    Devuelve el modelo serializado para medir la latencia fuera del pool.
+    """
+    family, params = candidate
+    task, X, y, cv_splits = (_worker_data[k] for k in ("task", "X", "y", "cv_splits"))
+    target = y if task == "consumption" else np.asarray(y).ravel()
+
+    started = time.perf_counter()
+    scores = cross_val_score(MODEL_FAMILIES[task][family](**params), X, target,
+                             cv=_build_cv(task, target, cv_splits), scoring=SCORING[task])
+    cv_seconds = time.perf_counter() - started
+
+    model = MODEL_FAMILIES[task][family](**params)
+    started = time.perf_counter()
+    model.fit(X, target)
+    fit_seconds = time.perf_counter() - started
+
+    return {
+        "family": family,
+        "params": params,
+        "score_mean": round(float(np.nanmean(scores)), 4),
+        "score_std": round(float(np.nanstd(scores)), 4),
+        "cv_seconds": round(cv_seconds, 4),
+        "fit_seconds": round(fit_seconds, 4),
+        "model": pickle.dumps(model),
+    }
+
+
+def run_search(task: str, X: pd.DataFrame, y, cv_splits: int = 5, workers: Optional[int] = None,
+               families: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Evalúa todo el espacio de búsqueda de la tarea en un pool de procesos
+    """
+    families = families or list(MODEL_FAMILIES[task])
+    candidates = [(family, params) for family in families for params in SEARCH_SPACE[family]]
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(task, X, y, cv_splits)) as pool:
+        results = list(pool.map(evaluate_candidate, candidates))
+
+    # La latencia se mide en serie para que los procesos no compitan por CPU
+    for result in results:
+        serialized = result.pop("model")
+        result["model_size_bytes"] = len(serialized)
+        result.update(_measure_latency(pickle.loads(serialized), X))
+
+    return sorted(results, key=lambda r: r["score_mean"], reverse=True)
+
+
+def select_fastest(results: List[Dict[str, Any]], min_score: float) -> Dict[str, Any]:
+    """
+    Elige el candidato con menor latencia por fila que cumple el score mínimo.
+    Si ninguno lo cumple, devuelve el de mejor score.
+    """
+    eligible = [r for r in results if r["score_mean"] >= min_score]
+    if not eligible:
+        return {"meets_min_score": False, **max(results, key=lambda r: r["score_mean"])}
+    fastest = min(eligible, key=lambda r: (r["single_row_ms_p50"], r["model_size_bytes"]))
+    return {"meets_min_score": True, **fastest}
+
+
+def load_task_data(task: str):
+    """
+    Carga X e y de cada tarea con la misma preparación que usan las rutas
+    """
+    if task == "consumption":
+        from app.routes.consumptionPredictor_routes import load_food_consumption_data
+        df = load_food_consumption_data()
+        return df[['standard_quantity', 'units_returned']], df[['suggested_units', 'overload_units']]
+
+    from app.routes.expirationDateManagement_routes import load_products_data, build_freshness_training_data
+    X, y, _, _, _ = build_freshness_training_data(load_products_data())
+    return X, y
+
+
+def tune(task: str, cv_splits: int = 5, workers: Optional[int] = None, min_score: float = 0.0,
+         families: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Ejecuta la búsqueda completa de una tarea y devuelve el reporte
+    """
+    X, y = load_task_data(task)
+    started = time.perf_counter()
+    results = run_search(task, X, y, cv_splits=cv_splits, workers=workers, families=families)
+    return {
+        "task": task,
+        "scoring": SCORING[task],
+        "samples": len(X),
+        "candidates": len(results),
+        "search_seconds": round(time.perf_counter() - started, 2),
+        "selected": select_fastest(results, min_score),
+        "results": results,
+    }
+
+
+def _print_report(report: Dict[str, Any]):
+    print(f"\n=== {report['task']} ({report['scoring']}, {report['samples']} muestras, "
+          f"{report['candidates']} candidatos en {report['search_seconds']}s) ===")
+    print(f"{'familia':<24}{'params':<52}{'score':>8}{'ms/fila':>10}{'filas/s':>12}{'KB':>10}")
+    for r in report["results"]:
+        params = ", ".join(f"{k}={v}" for k, v in r["params"].items())
+        print(f"{r['family']:<24}{params:<52}{r['score_mean']:>8.4f}{r['single_row_ms_p50']:>10.3f}"
+              f"{r['batch_rows_per_second']:>12.0f}{r['model_size_bytes'] / 1024:>10.1f}")
+    selected = report["selected"]
+    print(f"Seleccionado: {selected['family']} {selected['params']} "
+          f"(score {selected['score_mean']}, {selected['single_row_ms_p50']} ms/fila, "
+          f"cumple mínimo: {selected['meets_min_score']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Búsqueda de hiperparámetros para los modelos de consumo y frescura")
+    parser.add_argument("--task", choices=["consumption", "freshness", "all"], default="all")
+    parser.add_argument("--cv", type=int, default=5, help="Número de folds")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos del pool (por defecto: todos los núcleos)")
+    parser.add_argument("--min-score", type=float, default=0.0, help="Score mínimo para elegir el modelo más rápido")
+    parser.add_argument("--families", nargs="*", default=None, choices=list(SEARCH_SPACE))
+    parser.add_argument("--output", default=None, help="Ruta para guardar el reporte en JSON")
+    args = parser.parse_args()
+
+    tasks = ["consumption", "freshness"] if args.task == "all" else [args.task]
+    reports = [tune(task, cv_splits=args.cv, workers=args.workers, min_score=args.min_score, families=args.families)
+               for task in tasks]
+    for report in reports:
+        _print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+        print(f"\nReporte guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import threading
+from itertools import combinations
+from typing import Dict, Any, Hashable, Optional, Sequence, Tuple
+
+
+class _Cell:
+    __slots__ = ("count", "sum", "at_risk", "expired")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.at_risk = 0
+        self.expired = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "at_risk": self.at_risk,
+            "expired": self.expired,
+        }
+
+
+class RollupCube:
+    """
+    Cubo de agregados sobre varias dimensiones de productos.
+
+    Mantiene materializados todos los group-by posibles (2^n subconjuntos de
+    dimensiones) con conteo, suma y promedio de la medida de frescura y conteos
+    de productos en riesgo y expirados. add()/remove() actualizan cada group-by
+    en O(2^n), así que cualquier rebanada se responde sin recorrer las filas.
+    """
+
+    def __init__(self, dimensions: Sequence[str], measure: str, status_dimension: str,
+                 at_risk_values: Sequence[str], expired_values: Sequence[str]):
+        self.dimensions = tuple(dimensions)
+        self.measure = measure
+        self.status_dimension = status_dimension
+        self.at_risk_values = set(at_risk_values)
+        self.expired_values = set(expired_values)
+
+        self._rollups: Dict[Tuple[str, ...], Dict[Tuple, _Cell]] = {
+            subset: {}
+            for size in range(len(self.dimensions) + 1)
+            for subset in combinations(self.dimensions, size)
+        }
+        # Proyección (dimensiones + medida) de cada miembro, para poder restarlo después
+        self._members: Dict[Hashable, Tuple[Tuple, float]] = {}
+        self._lock = threading.Lock()
+
+    def _project(self, record: Dict[str, Any]) -> Tuple[Tuple, float]:
+        return tuple(record.get(d) for d in self.dimensions), float(record[self.measure])
+
+    def _apply(self, projection: Tuple[Tuple, float], sign: int):
+        values, measure = projection
+        status = values[self.dimensions.index(self.status_dimension)]
+        at_risk = sign if status in self.at_risk_values else 0
+        expired = sign if status in self.expired_values else 0
+        by_dimension = dict(zip(self.dimensions, values))
+
+        for subset, table in self._rollups.items():
+            key = tuple(by_dimension[d] for d in subset)
+            cell = table.get(key)
+            if cell is None:
+                cell = table[key] = _Cell()
+            cell.count += sign
+            cell.sum += sign * measure
+            cell.at_risk += at_risk
+            cell.expired += expired
+            if cell.count == 0:
+                del table[key]
+
+    def add(self, key: Hashable, record: Dict[str, Any]):
+        with self._lock:
+            if key in self._members:
+                self._apply(self._members.pop(key), -1)
+            projection = self._project(record)
+            self._members[key] = projection
+            self._apply(projection, +1)
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            projection = self._members.pop(key, None)
+            if projection is not None:
+                self._apply(projection, -1)
+
+    def sync(self, records: Dict[Hashable, Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Lleva el cubo al conjunto de registros dado aplicando solo las diferencias
+        (altas, bajas y cambios por llave) contra lo que ya contiene
+        """
+        added = updated = removed = 0
+        with self._lock:
+            for key in [k for k in self._members if k not in records]:
+                self._apply(self._members.pop(key), -1)
+                removed += 1
+
+            for key, record in records.items():
+                projection = self._project(record)
+                previous = self._members.get(key)
+                if previous == projection:
+                    continue
+                if previous is not None:
+                    self._apply(previous, -1)
+                    updated += 1
+                else:
+                    added += 1
+                self._members[key] = projection
+                self._apply(projection, +1)
+
+        return {"added": added, "updated": updated, "removed": removed, "members": len(self._members)}
+
+    def rollup(self, group_by: Sequence[str] = (), where: Optional[Dict[str, Any]] = None) -> Dict[Tuple, Dict[str, Any]]:
+        """
+        Agregados agrupados por group_by, restringidos a las dimensiones fijadas en where.
+        Las llaves del resultado siguen el orden de group_by.
+        """
+        where = where or {}
+        unknown = [d for d in list(group_by) + list(where) if d not in self.dimensions]
+        if unknown:
+            raise ValueError(f"Dimensiones desconocidas: {unknown}. Disponibles: {list(self.dimensions)}")
+
+        subset = tuple(d for d in self.dimensions if d in group_by or d in where)
+        positions = {d: subset.index(d) for d in subset}
+
+        result: Dict[Tuple, _Cell] = {}
+        with self._lock:
+            for key, cell in self._rollups[subset].items():
+                if any(key[positions[d]] != value for d, value in where.items()):
+                    continue
+                group_key = tuple(key[positions[d]] for d in group_by)
+                target = result.get(group_key)
+                if target is None:
+                    target = result[group_key] = _Cell()
+                target.count += cell.count
+                target.sum += cell.sum
+                target.at_risk += cell.at_risk
+                target.expired += cell.expired
+            return {key: cell.to_dict() for key, cell in result.items()}
+
+    def totals(self) -> Dict[str, Any]:
+        return self.rollup().get((), _Cell().to_dict())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "dimensions": list(self.dimensions),
+                "members": len(self._members),
+                "rollups": len(self._rollups),
+                "cells": sum(len(table) for table in self._rollups.values()),
+            }
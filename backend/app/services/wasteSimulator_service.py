@@ -0,0 +1,371 @@
+"""
+Simulador Monte Carlo de desperdicio y quiebres de stock por política de carga.
+
+La demanda de cada vuelo x producto se muestrea de las tasas de consumo
+históricas del producto en pastFlights_data (quantity_consumed /
+standard_quantity), con un ruido lognormal opcional, y se escala por la
+cantidad estándar de la fila. Cada lote de escenarios es una matriz
+(escenarios, filas) y todas las políticas se evalúan sobre la misma demanda.
+
+Las corridas grandes se dividen en shards de tamaño fijo con semillas
+independientes (SeedSequence.spawn) y se reparten en un pool de procesos; el
+resultado depende de la semilla y del tamaño de shard, no del número de procesos.
+El pool (inicio "spawn", seguro dentro de un servidor con hilos) se crea una
+sola vez por proceso y lo comparten todas las simulaciones.
+
+Benchmark de simulaciones por segundo (desde backend/):
+    python -m app.services.wasteSimulator_service --scenarios 2000 --workers 1 2 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+DEFAULT_POLICIES = "standard,mean,buffer:10,quantile:90"
+# Escenarios por shard (unidad de trabajo y de semilla)
+SHARD_SCENARIOS = 250
+# Celdas (escenarios x filas) por lote dentro de un shard: acota la memoria
+MAX_BATCH_CELLS = 2_000_000
+# Por debajo de estas celdas en total se corre en el proceso actual: crear el pool cuesta más
+MIN_PARALLEL_CELLS = 10_000_000
+# Procesos del pool compartido: nunca más que los núcleos disponibles
+MAX_WORKERS = os.cpu_count() or 1
+METRICS = ["waste_units", "leftover_units", "shortage_units", "cost", "fill_rate",
+           "item_stockout_rate", "flight_stockout_rate"]
+SUMMARY_PERCENTILES = [5, 50, 95]
+
+Policy = Tuple[str, str, float]
+
+
+def parse_policies(text: str) -> List[Policy]:
+    """
+    'standard,mean,buffer:10,quantile:90' -> [(nombre, tipo, parámetro), ...]
+
+    standard: la cantidad estándar; mean: la demanda esperada; buffer:P: la
+    demanda esperada más P %; quantile:Q: el cuantil Q de la tasa histórica
+    """
+    policies = []
+    for raw in text.split(","):
+        name = raw.strip()
+        if not name:
+            continue
+        kind, _, value = name.partition(":")
+        if kind in ("standard", "mean") and not value:
+            policies.append((name, kind, 0.0))
+        elif kind in ("buffer", "quantile") and value:
+            try:
+                parameter = float(value)
+            except ValueError:
+                raise ValueError(f"Parámetro inválido en la política {name}")
+            if kind == "quantile" and not 0 <= parameter <= 100:
+                raise ValueError(f"Cuantil fuera de rango en la política {name}. Use valores entre 0 y 100")
+            if kind == "buffer" and parameter < -100:
+                raise ValueError(f"Buffer inválido en la política {name}")
+            policies.append((name, kind, parameter))
+        else:
+            raise ValueError(f"Política desconocida: {name}. Opciones: standard, mean, buffer:P, quantile:Q")
+    if not policies:
+        raise ValueError("Debe indicar al menos una política")
+    return list({policy[0]: policy for policy in policies}.values())
+
+
+def historical_rates(history: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tasa de consumo por vuelo histórico: unidades consumidas sobre la cantidad estándar
+    """
+    standard = pd.to_numeric(history['standard_quantity'], errors='coerce')
+    consumed = pd.to_numeric(history['quantity_consumed'], errors='coerce')
+    rates = pd.DataFrame({'product_id': history['product_id'], 'rate': consumed / standard})
+    return rates[np.isfinite(rates['rate']) & (rates['rate'] >= 0)]
+
+
+def build_network(items: pd.DataFrame, rates: pd.DataFrame, overage: np.ndarray, underage: np.ndarray,
+                  waste_share: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Arreglos planos de la red (filas ordenadas por vuelo) para muestrear con NumPy.
+
+    Las tasas de todos los productos se concatenan ordenadas por producto; cada
+    fila guarda dónde empieza y cuántas tiene su producto. Los productos sin
+    historial usan las tasas de toda la red.
+    """
+    order = np.argsort(pd.Index(pd.unique(items['flight_id'])).get_indexer(items['flight_id']), kind='stable')
+    items = items.iloc[order]
+    flights = items['flight_id'].to_numpy()
+    flight_starts = np.flatnonzero(np.r_[True, flights[1:] != flights[:-1]])
+
+    rates = rates.sort_values('product_id', kind='stable')
+    pool = rates['rate'].to_numpy(dtype=float)
+    if len(pool) == 0:
+        raise ValueError("No hay tasas de consumo históricas para muestrear la demanda")
+    grouped = rates.groupby('product_id', sort=True)['rate']
+    counts = grouped.size()
+    starts = np.concatenate([[0], np.cumsum(counts.to_numpy())[:-1]])
+    # Al final del pool se repiten todas las tasas para los productos sin historial
+    pool = np.concatenate([pool, pool])
+    fallback_start, fallback_count = len(rates), len(rates)
+
+    product_index = pd.Index(counts.index).get_indexer(items['product_id'])
+    known = product_index >= 0
+    rate_start = np.where(known, starts[np.maximum(product_index, 0)], fallback_start)
+    rate_count = np.where(known, counts.to_numpy()[np.maximum(product_index, 0)], fallback_count)
+
+    return {
+        "flight_ids": flights,
+        "product_ids": items['product_id'].to_numpy(),
+        "flight_starts": flight_starts,
+        "base": items['standard_quantity'].to_numpy(dtype=float),
+        "rate_pool": pool,
+        "rate_start": rate_start.astype(np.int64),
+        "rate_count": rate_count.astype(np.int64),
+        "overage": np.asarray(overage, dtype=float)[order],
+        "underage": np.asarray(underage, dtype=float)[order],
+        "waste_share": np.asarray(waste_share, dtype=float)[order],
+    }
+
+
+def policy_loads(network: Dict[str, np.ndarray], policies: List[Policy]) -> np.ndarray:
+    """
+    Carga por política y fila (políticas, filas), en unidades enteras
+    """
+    pool, start, count, base = network["rate_pool"], network["rate_start"], network["rate_count"], network["base"]
+    # Media y cuantiles de la tasa de cada fila según los segmentos del pool
+    sums = np.concatenate([[0], np.cumsum(pool)])
+    mean_rate = (sums[start + count] - sums[start]) / count
+
+    loads = []
+    for _, kind, parameter in policies:
+        if kind == "standard":
+            loads.append(np.ceil(base))
+        elif kind == "mean":
+            loads.append(np.ceil(base * mean_rate))
+        elif kind == "buffer":
+            loads.append(np.ceil(base * mean_rate * (1 + parameter / 100)))
+        else:
+            quantile_rate = np.empty(len(base))
+            for segment in np.unique(np.stack([start, count], axis=1), axis=0):
+                rows = (start == segment[0]) & (count == segment[1])
+                quantile_rate[rows] = np.percentile(pool[segment[0]:segment[0] + segment[1]], parameter)
+            loads.append(np.ceil(base * quantile_rate))
+    return np.maximum(np.stack(loads), 0)
+
+
+def sample_demand(network: Dict[str, np.ndarray], rng: np.random.Generator, n_scenarios: int,
+                  demand_noise: float) -> np.ndarray:
+    """
+    Demanda (escenarios, filas): tasa histórica del producto al azar por la cantidad estándar
+    """
+    shape = (n_scenarios, len(network["base"]))
+    picks = network["rate_start"] + (rng.random(shape) * network["rate_count"]).astype(np.int64)
+    rates = network["rate_pool"][picks]
+    if demand_noise > 0:
+        # Lognormal con media 1: agrega variación sin mover la demanda esperada
+        rates *= rng.lognormal(-demand_noise ** 2 / 2, demand_noise, shape)
+    return np.rint(rates * network["base"])
+
+
+def simulate_shard(network: Dict[str, np.ndarray], loads: np.ndarray, n_scenarios: int,
+                   seed: np.random.SeedSequence, demand_noise: float,
+                   max_cells: int = MAX_BATCH_CELLS) -> Dict[str, np.ndarray]:
+    """
+    Métricas de red por política y escenario: arreglos (políticas, escenarios)
+    """
+    rng = np.random.default_rng(seed)
+    n_items = len(network["base"])
+    batch = max(1, max_cells // max(n_items, 1))
+    results = {metric: np.empty((len(loads), n_scenarios)) for metric in METRICS}
+
+    for start in range(0, n_scenarios, batch):
+        size = min(batch, n_scenarios - start)
+        columns = slice(start, start + size)
+        demand = sample_demand(network, rng, size, demand_noise)
+        total_demand = np.maximum(demand.sum(axis=1), 1)
+        for p, load in enumerate(loads):
+            gap = load - demand
+            leftover = np.maximum(gap, 0)
+            shortage = np.maximum(-gap, 0)
+            short = gap < 0
+            # Producto matriz-vector: suma ponderada por escenario en una sola pasada
+            results["waste_units"][p, columns] = leftover @ network["waste_share"]
+            results["leftover_units"][p, columns] = leftover.sum(axis=1)
+            results["shortage_units"][p, columns] = shortage.sum(axis=1)
+            results["cost"][p, columns] = leftover @ network["overage"] + shortage @ network["underage"]
+            results["fill_rate"][p, columns] = 1 - shortage.sum(axis=1) / total_demand
+            results["item_stockout_rate"][p, columns] = short.mean(axis=1)
+            results["flight_stockout_rate"][p, columns] = (
+                np.logical_or.reduceat(short, network["flight_starts"], axis=1).mean(axis=1)
+            )
+    return results
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido, creado la primera vez que se necesita. Usa
+    "spawn": hacer fork de un servidor con hilos puede heredar candados tomados
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_shards(job: Tuple[Dict[str, np.ndarray], np.ndarray, float, List[Tuple[int, np.random.SeedSequence]]]) -> List[Dict[str, np.ndarray]]:
+    # Un trabajo por proceso: la red y las cargas se envían una vez, no una por shard
+    network, loads, demand_noise, tasks = job
+    return [simulate_shard(network, loads, size, seed, demand_noise) for size, seed in tasks]
+
+
+def _distribution(values: np.ndarray) -> Dict[str, float]:
+    percentiles = np.percentile(values, SUMMARY_PERCENTILES)
+    summary = {
+        "mean": round(float(values.mean()), 4),
+        "std": round(float(values.std()), 4),
+        "min": round(float(values.min()), 4),
+        "max": round(float(values.max()), 4),
+    }
+    summary.update({f"p{q}": round(float(v), 4) for q, v in zip(SUMMARY_PERCENTILES, percentiles)})
+    return summary
+
+
+def run_simulation(network: Dict[str, np.ndarray], policies: List[Policy], n_scenarios: int = 1000,
+                   seed: int = 42, workers: Optional[int] = None, demand_noise: float = 0.1,
+                   shard_scenarios: int = SHARD_SCENARIOS) -> Dict[str, Any]:
+    """
+    Corre n_scenarios escenarios para todas las políticas y resume la distribución
+    de cada métrica. Con workers > 1 los shards se reparten en el pool
+    compartido, en a lo más MAX_WORKERS grupos de shards.
+    """
+    loads = policy_loads(network, policies)
+    shard_sizes = [min(shard_scenarios, n_scenarios - start) for start in range(0, n_scenarios, shard_scenarios)]
+    tasks = list(zip(shard_sizes, np.random.SeedSequence(seed).spawn(len(shard_sizes))))
+    workers = min(workers or MAX_WORKERS, MAX_WORKERS, len(tasks))
+    if n_scenarios * len(network["base"]) < MIN_PARALLEL_CELLS:
+        workers = 1
+
+    started = time.perf_counter()
+    if workers <= 1:
+        shards = [simulate_shard(network, loads, size, child, demand_noise) for size, child in tasks]
+    else:
+        groups = [tasks[i::workers] for i in range(workers)]
+        jobs = [(network, loads, demand_noise, group) for group in groups]
+        try:
+            by_group = list(get_pool().map(_run_shards, jobs))
+        except BrokenProcessPool:
+            # Un proceso murió: la siguiente simulación crea un pool nuevo
+            shutdown_pool()
+            raise
+        # De vuelta al orden de los shards: el resultado no depende de cómo se agruparon
+        shards = [None] * len(tasks)
+        for i, group_shards in enumerate(by_group):
+            shards[i::workers] = group_shards
+    elapsed = time.perf_counter() - started
+
+    merged = {metric: np.concatenate([shard[metric] for shard in shards], axis=1) for metric in METRICS}
+    n_items = len(network["base"])
+    return {
+        "policies": {
+            name: {
+                "total_load_units": float(loads[p].sum()),
+                **{metric: _distribution(merged[metric][p]) for metric in METRICS},
+            }
+            for p, (name, _, _) in enumerate(policies)
+        },
+        "network": {
+            "flights": len(network["flight_starts"]),
+            "items": n_items,
+            "expected_demand_units": round(float(_expected_demand(network)), 2),
+        },
+        "performance": {
+            "scenarios": n_scenarios,
+            "shards": len(tasks),
+            "workers": workers,
+            "seconds": round(elapsed, 4),
+            "scenarios_per_second": round(n_scenarios / elapsed, 2) if elapsed > 0 else None,
+            "item_scenarios_per_second": round(n_scenarios * n_items / elapsed, 0) if elapsed > 0 else None,
+        },
+    }
+
+
+def _expected_demand(network: Dict[str, np.ndarray]) -> float:
+    sums = np.concatenate([[0], np.cumsum(network["rate_pool"])])
+    start, count = network["rate_start"], network["rate_count"]
+    return float(((sums[start + count] - sums[start]) / count * network["base"]).sum())
+
+
+def load_network(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                 reusable_recovery: float = 0.8, stockout_penalty: float = 0.0,
+                 default_margin: float = 100.0) -> Dict[str, np.ndarray]:
+    """
+    Red de vuelo x producto del calendario con los mismos costos que /prediction/optimize-loading
+    """
+    from app.routes.consumptionPredictor_routes import (
+        build_catering_plan_items,
+        build_item_costs,
+        load_past_flights_data,
+    )
+    items = build_catering_plan_items(start_date, end_date)
+    if items.empty:
+        raise ValueError("No hay vuelos en el rango de fechas")
+    costs = build_item_costs(items, default_margin)
+    unit_cost = costs['unit_cost'].to_numpy()
+    reusable = costs['reusable'].to_numpy()
+    waste_share = np.where(reusable, 1 - reusable_recovery, 1.0)
+    underage = np.maximum(costs['price'].to_numpy() - unit_cost, 0) + stockout_penalty
+    return build_network(items, historical_rates(load_past_flights_data()), unit_cost * waste_share,
+                         underage, waste_share)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del simulador Monte Carlo de desperdicio y quiebres")
+    parser.add_argument("--scenarios", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, os.cpu_count() or 1],
+                        help="Números de procesos a comparar")
+    parser.add_argument("--policies", default=DEFAULT_POLICIES)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Ruta para guardar el reporte en JSON")
+    args = parser.parse_args()
+
+    network = load_network()
+    policies = parse_policies(args.policies)
+    reports = []
+    print(f"\nRed: {len(network['flight_starts'])} vuelos, {len(network['base'])} filas, {args.scenarios} escenarios")
+    print(f"{'procesos':>9}{'shards':>8}{'segundos':>10}{'escenarios/s':>14}{'filas-escenario/s':>20}")
+    for workers in args.workers:
+        report = run_simulation(network, policies, n_scenarios=args.scenarios, seed=args.seed, workers=workers)
+        performance = report["performance"]
+        print(f"{performance['workers']:>9}{performance['shards']:>8}{performance['seconds']:>10.3f}"
+              f"{performance['scenarios_per_second']:>14.1f}{performance['item_scenarios_per_second']:>20.0f}")
+        reports.append(report)
+
+    for name, summary in reports[-1]["policies"].items():
+        print(f"{name:<14} costo p50 {summary['cost']['p50']:>12.2f}  desperdicio p50 {summary['waste_units']['p50']:>10.1f}"
+              f"  fill rate p50 {summary['fill_rate']['p50']:.4f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+        print(f"\nReporte guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
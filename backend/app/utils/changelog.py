@@ -0,0 +1,252 @@
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Callable, Hashable, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from app.utils.metrics import registry
+from app.utils.utils import get_dataset_version
+
+# Eventos que se conservan; un cliente que se quedó más atrás debe recargar completo
+MAX_EVENTS = 100000
+
+
+def _normalize(value: Any) -> Any:
+    """
+    Valor comparable y serializable: escalares numpy a Python y NaN a None
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _records(frame: pd.DataFrame, keys: List[Hashable]) -> Dict[Hashable, Dict[str, Any]]:
+    """
+    Registros normalizados de las llaves dadas, en el mismo orden
+    """
+    rows = frame.loc[keys].to_dict(orient='records') if keys else []
+    return {key: {field: _normalize(value) for field, value in row.items()} for key, row in zip(keys, rows)}
+
+
+class _Entity:
+    __slots__ = ("datasets", "loader", "version", "frame", "hashes", "key_seqs", "baseline_seq")
+
+    def __init__(self, datasets: Sequence[str], loader: Optional[Callable]):
+        self.datasets = list(datasets)
+        self.loader = loader
+        self.version: Optional[Tuple[str, ...]] = None
+        # Último snapshot (índice = llave) y hash de cada fila por llave
+        self.frame: Optional[pd.DataFrame] = None
+        self.hashes: Dict[Hashable, int] = {}
+        # Llave (como texto, igual que en las rutas) -> (seq, epoch) de su último cambio
+        self.key_seqs: Dict[str, Tuple[int, float]] = {}
+        self.baseline_seq = 0
+
+
+class ChangeLog:
+    """
+    Registro de cambios (inserts, updates, deletes) de los datasets por llave primaria.
+
+    Cada loader llama a capture() cuando recarga su dataset: el snapshot nuevo se
+    compara contra el anterior por llave y cada diferencia recibe un número de
+    secuencia. La comparación usa un hash por fila (hash_pandas_object), así que
+    solo se arman registros para las llaves que cambiaron. Los números son
+    consecutivos y empiezan en el arranque del proceso en microsegundos: siguen
+    creciendo entre reinicios y un cursor de una ejecución anterior se reconoce
+    como vencido. La primera captura de cada entidad es la línea base: no
+    genera eventos.
+    """
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self.max_events = max_events
+        self._entities: Dict[str, _Entity] = {}
+        self._events: List[Dict[str, Any]] = []
+        self._last_seq = time.time_ns() // 1000
+        # Secuencia del evento más antiguo conservado
+        self._first_seq = self._last_seq + 1
+        self._lock = threading.Lock()
+
+    def register_source(self, entity: str, datasets: Sequence[str], loader: Optional[Callable] = None):
+        """
+        Declara una entidad, los datasets de los que sale y el loader que la
+        recarga (y captura sus cambios) si su versión quedó atrás
+        """
+        with self._lock:
+            current = self._entities.get(entity)
+            if current is None:
+                self._entities[entity] = _Entity(datasets, loader)
+            else:
+                current.datasets, current.loader = list(datasets), loader
+
+    def entities(self) -> List[str]:
+        return list(self._entities)
+
+    def _current_version(self, entity: _Entity) -> Tuple[str, ...]:
+        return tuple(get_dataset_version(dataset) for dataset in entity.datasets)
+
+    def capture(self, entity: str, frame: pd.DataFrame) -> Dict[str, int]:
+        """
+        Compara el snapshot completo de la entidad (una fila por llave, la llave
+        en el índice) contra el anterior y agrega un evento por cada llave nueva,
+        modificada o eliminada. Si una llave se repite gana la última fila.
+        """
+        frame = frame[~frame.index.duplicated(keep='last')]
+        hashes = dict(zip(frame.index, pd.util.hash_pandas_object(frame, index=False).tolist()))
+        now = time.time()
+        inserted = updated = deleted = 0
+
+        with self._lock:
+            state = self._entities.get(entity)
+            if state is None:
+                state = self._entities[entity] = _Entity([], None)
+            version = self._current_version(state)
+
+            if state.version is None:
+                state.baseline_seq = self._last_seq
+                state.key_seqs = {str(key): (self._last_seq, now) for key in hashes}
+            else:
+                previous = state.hashes
+                for key in [key for key in previous if key not in hashes]:
+                    self._append(entity, "delete", key, None, None, now)
+                    state.key_seqs.pop(str(key), None)
+                    deleted += 1
+
+                changed_keys = [key for key, value in hashes.items() if previous.get(key) != value]
+                records = _records(frame, changed_keys)
+                old_records = _records(state.frame, [key for key in changed_keys if key in previous])
+                for key, record in records.items():
+                    old = old_records.get(key)
+                    if old is None:
+                        seq = self._append(entity, "insert", key, record, None, now)
+                        inserted += 1
+                    else:
+                        # Un cambio de tipo (1 -> 1.0) cambia el hash sin cambiar el valor
+                        changed = [field for field in record if old.get(field) != record[field]]
+                        changed += [field for field in old if field not in record]
+                        if not changed:
+                            continue
+                        seq = self._append(entity, "update", key, record, changed, now)
+                        updated += 1
+                    state.key_seqs[str(key)] = (seq, now)
+                self._trim()
+
+            state.frame = frame
+            state.hashes = hashes
+            state.version = version
+
+        if inserted or updated or deleted:
+            print(f"Cambios en {entity}: {inserted} inserts, {updated} updates, {deleted} deletes")
+        return {"inserted": inserted, "updated": updated, "deleted": deleted, "keys": len(hashes)}
+
+    def _append(self, entity: str, op: str, key: Hashable, data: Optional[Dict[str, Any]],
+                changed: Optional[List[str]], timestamp: float) -> int:
+        self._last_seq += 1
+        event = {
+            "seq": self._last_seq,
+            "entity": entity,
+            "op": op,
+            "key": _normalize(key),
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat(timespec="seconds"),
+        }
+        if changed is not None:
+            event["changed"] = changed
+        if data is not None:
+            event["data"] = data
+        self._events.append(event)
+        return self._last_seq
+
+    def _trim(self):
+        excess = len(self._events) - self.max_events
+        if excess > 0:
+            del self._events[:excess]
+        self._first_seq = self._last_seq + 1 - len(self._events)
+
+    def refresh(self, entities: Optional[Sequence[str]] = None):
+        """
+        Llama a los loaders de las entidades cuya versión de datos cambió desde la
+        última captura; cada loader captura sus cambios al recargar
+        """
+        for name in entities or self.entities():
+            state = self._entities.get(name)
+            if state is not None and state.loader is not None and not self.is_current(name):
+                state.loader()
+
+    def is_current(self, entity: str) -> bool:
+        state = self._entities.get(entity)
+        return state is not None and state.version is not None and state.version == self._current_version(state)
+
+    def key_version(self, entity: str, key: Hashable) -> Optional[Tuple[int, float]]:
+        """
+        (seq, epoch) del último cambio de una llave, o None si la entidad no está
+        al día con sus datasets o la llave no existe
+        """
+        if not self.is_current(entity):
+            return None
+        return self._entities[entity].key_seqs.get(str(key))
+
+    def latest_seq(self) -> int:
+        return self._last_seq
+
+    def since(self, seq: int, entities: Optional[Sequence[str]] = None, limit: int = 1000) -> Dict[str, Any]:
+        """
+        Eventos con secuencia mayor a `seq`, en orden. Las entidades cuyo
+        historial no cubre ese cursor (línea base posterior, eventos ya
+        descartados o cursor de otra ejecución) se listan en reset_required:
+        el cliente debe recargarlas completas y seguir desde next_since.
+        """
+        with self._lock:
+            names = list(entities) if entities else list(self._entities)
+            unknown = [name for name in names if name not in self._entities]
+            if unknown:
+                raise ValueError(f"Entidades desconocidas: {unknown}. Disponibles: {list(self._entities)}")
+
+            stale = seq < self._first_seq - 1 or seq > self._last_seq
+            reset_required = [
+                name for name in names
+                if stale or self._entities[name].version is None or seq < self._entities[name].baseline_seq
+            ]
+            wanted = set(names) - set(reset_required)
+
+            events: List[Dict[str, Any]] = []
+            next_since = max(seq, self._first_seq - 1) if not stale else self._last_seq
+            if wanted and not stale:
+                for event in self._events[seq + 1 - self._first_seq:]:
+                    if len(events) >= limit:
+                        break
+                    next_since = event["seq"]
+                    if event["entity"] in wanted:
+                        events.append(event)
+                else:
+                    next_since = self._last_seq
+            elif not wanted:
+                next_since = self._last_seq
+
+            return {
+                "since": seq,
+                "next_since": next_since,
+                "latest_seq": self._last_seq,
+                "has_more": next_since < self._last_seq,
+                "reset_required": reset_required,
+                "changes": events,
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "events": len(self._events),
+                "first_seq": self._first_seq,
+                "latest_seq": self._last_seq,
+                "entities": {
+                    name: {"keys": len(state.hashes), "baseline_seq": state.baseline_seq, "captured": state.version is not None}
+                    for name, state in self._entities.items()
+                },
+            }
+
+
+change_log = ChangeLog()
+
+change_log_events = registry.gauge("app_change_log_events", "Eventos conservados en el registro de cambios")
+registry.register_collector(lambda: change_log_events.set(change_log.stats()["events"]))
@@ -0,0 +1,164 @@
+import gzip
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+from app.utils.http_cache import get_cache_policy, compute_validators
+from app.utils.metrics import registry, record_cache
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se ofrece gzip
+    brotli = None
+
+# Respuestas más pequeñas que esto no valen la pena comprimir
+MIN_COMPRESS_BYTES = 1024
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=9)
+    return gzip.compress(body, compresslevel=6)
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Elige la codificación soportada con mayor q en Accept-Encoding (br antes que gzip en empate)
+    """
+    if not accept_encoding:
+        return None
+
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best = None
+    best_q = 0.0
+    for encoding in supported_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressedResponseCache:
+    """
+    Cuerpos ya comprimidos por (ETag, codificación). El ETag incluye la versión de
+    los datasets, la ruta y los parámetros, así que cada cuerpo se comprime una
+    sola vez por versión de datos. La compresión corre en un hilo de fondo.
+    """
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._pending: set = set()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compression")
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag: str, encoding: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get((etag, encoding))
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end((etag, encoding))
+                self.hits += 1
+        record_cache("compressed_response", entry is not None)
+        return entry
+
+    def schedule(self, etag: str, body: bytes, media_type: Optional[str]):
+        """
+        Encola la compresión del cuerpo en todas las codificaciones soportadas
+        """
+        for encoding in supported_encodings():
+            key = (etag, encoding)
+            with self._lock:
+                if key in self._entries or key in self._pending:
+                    continue
+                self._pending.add(key)
+            self._executor.submit(self._compress_and_store, key, body, media_type)
+
+    def _compress_and_store(self, key: Tuple[str, str], body: bytes, media_type: Optional[str]):
+        try:
+            compressed = _compress(body, key[1])
+            with self._lock:
+                self._entries[key] = {"body": compressed, "media_type": media_type, "original_size": len(body)}
+                self._size += len(compressed)
+                while self._size > self.max_bytes and self._entries:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted["body"])
+        except Exception as e:
+            print(f"Error comprimiendo respuesta: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "encodings": list(supported_encodings()),
+            }
+
+
+compressed_cache = CompressedResponseCache()
+
+compressed_cache_bytes = registry.gauge("app_compressed_cache_bytes", "Bytes ocupados por cuerpos precomprimidos")
+registry.register_collector(lambda: compressed_cache_bytes.set(compressed_cache.stats()["bytes"]))
+
+
+async def compression_cache_middleware(request: Request, call_next):
+    """
+    Sirve cuerpos precomprimidos según Accept-Encoding sin ejecutar el endpoint.
+    En un fallo se responde sin comprimir y el cuerpo se comprime en segundo plano.
+    """
+    policy = get_cache_policy(request.url.path)
+    if request.method != "GET" or policy is None or policy["cache_control"] == "no-store":
+        return await call_next(request)
+
+    etag, _ = compute_validators(request, policy)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+
+    if encoding is not None:
+        entry = compressed_cache.get(etag, encoding)
+        if entry is not None:
+            return Response(
+                content=entry["body"],
+                media_type=entry["media_type"],
+                headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+            )
+
+    response = await call_next(request)
+    response.headers["Vary"] = "Accept-Encoding"
+    if response.status_code != 200 or "content-encoding" in response.headers:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    # Solo se guarda si las versiones no cambiaron mientras corría el endpoint
+    if len(body) >= MIN_COMPRESS_BYTES and compute_validators(request, policy)[0] == etag:
+        compressed_cache.schedule(etag, body, response.media_type or response.headers.get("content-type"))
+
+    headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    return Response(content=body, status_code=response.status_code, headers=headers)
@@ -0,0 +1,208 @@
+import hashlib
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Any, List, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+from app.utils.metrics import record_cache
+from app.utils.utils import current_time_step, get_dataset_version, get_dataset_mtime
+from app.utils.changelog import change_log
+
+# Políticas de caché por prefijo de ruta (se usa el prefijo más largo que coincida).
+#   datasets:       archivos de data/ de los que depende la respuesta
+#   sources:        versiones en memoria (modelos entrenados, feature store)
+#   date_dependent: la respuesta cambia con la hora actual (días para expirar), en pasos
+#                   de CLOCK_STEP_MINUTES
+#   cache_control:  valor de Cache-Control; las rutas no-store no llevan validadores
+#   key_entity:     entidad del registro de cambios cuyas llaves son el último segmento
+#                   (p. ej. /data/{flight_id}): el detalle se valida con la versión de
+#                   su llave, así que un cambio solo invalida las llaves afectadas
+ALL_DATASETS = ['flight_data.csv', 'pastFlights_data.csv', 'products_data_augmented.csv', 'productivity_data.csv']
+
+CACHE_POLICIES: Dict[str, Dict[str, Any]] = {
+    "/data": {
+        "datasets": ['flight_data.csv'],
+        "sources": [],
+        "date_dependent": False,
+        "cache_control": "public, max-age=60, must-revalidate",
+        "key_entity": "flights",
+    },
+    "/products": {
+        "datasets": ['products_data_augmented.csv'],
+        "sources": [],
+        "date_dependent": True,
+        "cache_control": "private, no-cache",
+    },
+    "/productivity": {
+        "datasets": ['productivity_data.csv', 'flight_data.csv'],
+        "sources": [],
+        "date_dependent": False,
+        "cache_control": "public, max-age=60, must-revalidate",
+        "key_entity": "sessions",
+    },
+    "/productivity/detecciones": {"cache_control": "no-store"},
+    "/prediction": {
+        "datasets": ['products_data_augmented.csv', 'products_data.csv', 'flight_data.csv', 'pastFlights_data.csv'],
+        "sources": ["model:consumption", "feature_store"],
+        "date_dependent": False,
+        "cache_control": "private, no-cache",
+    },
+    "/prediction/train-model": {"cache_control": "no-store"},
+    "/expiration": {
+        "datasets": ['products_data_augmented.csv'],
+        "sources": ["model:freshness"],
+        "date_dependent": True,
+        "cache_control": "private, no-cache",
+    },
+    "/expiration/train-model": {"cache_control": "no-store"},
+    # La asignación FEFO cruza los lotes con el plan de catering de los vuelos
+    "/expiration/allocation": {
+        "datasets": ['products_data_augmented.csv', 'products_data.csv', 'flight_data.csv', 'pastFlights_data.csv'],
+        "sources": ["model:freshness", "model:consumption", "feature_store"],
+        "date_dependent": True,
+        "cache_control": "private, no-cache",
+    },
+    "/changes": {"cache_control": "no-store"},
+    "/bundles": {
+        "datasets": ALL_DATASETS,
+        "sources": ["model:consumption", "feature_store"],
+        "date_dependent": True,
+        "cache_control": "private, no-cache",
+    },
+}
+
+_PREFIXES = sorted(CACHE_POLICIES, key=len, reverse=True)
+
+# Versiones de los datos que viven en memoria: se incrementan con bump_version()
+_source_versions: Dict[str, Tuple[int, float]] = {}
+_source_lock = threading.Lock()
+
+
+def bump_version(name: str):
+    """
+    Marca que un recurso en memoria cambió (p. ej. se reentrenó un modelo),
+    invalidando los ETag de las rutas que dependen de él
+    """
+    with _source_lock:
+        counter, _ = _source_versions.get(name, (0, 0.0))
+        _source_versions[name] = (counter + 1, time.time())
+
+
+def get_source_version(name: str) -> Tuple[int, float]:
+    return _source_versions.get(name, (0, 0.0))
+
+
+def get_cache_policy(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Devuelve la política del prefijo más largo que coincide con la ruta
+    """
+    for prefix in _PREFIXES:
+        if path == prefix or path.startswith(prefix + "/"):
+            return CACHE_POLICIES[prefix]
+    return None
+
+
+def _key_version(path: str, policy: Dict[str, Any]) -> Optional[Tuple[int, float]]:
+    """
+    Versión de la llave de una ruta de detalle (prefijo + un segmento) según el
+    registro de cambios. None si la ruta no es de detalle, la llave no existe o
+    el registro aún no capturó la versión vigente del dataset
+    """
+    entity = policy.get("key_entity")
+    parent, _, key = path.rpartition("/")
+    if entity is None or not key or CACHE_POLICIES.get(parent) is not policy:
+        return None
+    return change_log.key_version(entity, key)
+
+
+def compute_validators(request: Request, policy: Dict[str, Any]) -> Tuple[str, float]:
+    """
+    Calcula (ETag, Last-Modified en epoch) a partir de las versiones de los
+    datasets, las fuentes en memoria y los parámetros de la petición
+    """
+    datasets = policy.get("datasets", [])
+    sources = policy.get("sources", [])
+
+    parts: List[str] = [request.url.path, "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))]
+    key_version = _key_version(request.url.path, policy)
+    if key_version is not None:
+        parts.append(f"key:{key_version[0]}")
+        timestamps = [key_version[1]]
+    else:
+        parts += [f"{name}:{get_dataset_version(name)}" for name in datasets]
+        timestamps = [get_dataset_mtime(name) for name in datasets]
+    parts += [f"{name}:{get_source_version(name)[0]}" for name in sources]
+    timestamps += [get_source_version(name)[1] for name in sources]
+
+    if policy.get("date_dependent"):
+        step = current_time_step()
+        parts.append(step.isoformat())
+        timestamps.append(step.timestamp())
+
+    digest = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:32]
+    return f'W/"{digest}"', max(timestamps, default=0.0)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # La comparación débil ignora el prefijo W/
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def _not_modified_since(if_modified_since: str, last_modified: float) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # Last-Modified tiene precisión de segundos
+    return int(last_modified) <= since
+
+
+async def conditional_cache_middleware(request: Request, call_next):
+    """
+    Agrega ETag, Last-Modified y Cache-Control a las rutas GET/HEAD y responde
+    304 antes de ejecutar el endpoint si el cliente ya tiene la versión vigente
+    """
+    policy = get_cache_policy(request.url.path)
+    if policy is None or request.method not in ("GET", "HEAD"):
+        return await call_next(request)
+
+    cache_control = policy["cache_control"]
+    if cache_control == "no-store":
+        response = await call_next(request)
+        response.headers["Cache-Control"] = cache_control
+        return response
+
+    etag, last_modified = compute_validators(request, policy)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+        "Cache-Control": cache_control,
+    }
+
+    # If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110)
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        not_modified = if_modified_since is not None and _not_modified_since(if_modified_since, last_modified)
+    record_cache("http_conditional", not_modified)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+
+    # Si el endpoint cambió alguna versión (p. ej. entrenó un modelo de forma
+    # diferida) el ETag calculado antes ya no describe la respuesta
+    if compute_validators(request, policy)[0] != etag:
+        response.headers["Cache-Control"] = cache_control
+        return response
+
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,41 @@
+from typing import Dict, Any, Iterable, List, Hashable
+import pandas as pd
+
+
+def stable_product_id(batch_number: Any, airline: Any) -> str:
+    """
+    ID de producto derivado del lote y la aerolínea, independiente de la posición de la fila
+    """
+    batch = str(batch_number).strip().lower()
+    airline_key = str(airline).replace(' ', '').lower()
+    return f"prod-{batch}-{airline_key}"
+
+
+def assign_product_ids(df: pd.DataFrame) -> List[str]:
+    """
+    Genera los IDs estables de todas las filas. Si un lote se repite para la misma
+    aerolínea se agrega un sufijo -2, -3... en orden de aparición. Las filas sin
+    Batch_Number conservan el ID por posición.
+    """
+    batches = df['Batch_Number'] if 'Batch_Number' in df.columns else pd.Series(None, index=df.index)
+    ids = []
+    seen: Dict[str, int] = {}
+    for position, (batch, airline) in enumerate(zip(batches, df['aerolinea'])):
+        if pd.isna(batch) or str(batch).strip() == "":
+            product_id = f"prod-{position:03d}-{str(airline).replace(' ', '').lower()}"
+        else:
+            product_id = stable_product_id(batch, airline)
+        seen[product_id] = seen.get(product_id, 0) + 1
+        ids.append(product_id if seen[product_id] == 1 else f"{product_id}-{seen[product_id]}")
+    return ids
+
+
+def build_pk_index(keys: Iterable[Hashable]) -> Dict[Hashable, int]:
+    """
+    Índice de llave primaria: llave -> posición de la fila.
+    Si una llave se repite se conserva la primera aparición.
+    """
+    index: Dict[Hashable, int] = {}
+    for position, key in enumerate(keys):
+        index.setdefault(key, position)
+    return index
@@ -0,0 +1,47 @@
+import functools
+import threading
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from app.utils.metrics import record_cache
+from app.utils.singleflight import flight_group
+from app.utils.utils import current_time_step, get_dataset_version
+
+
+def versioned_memo(name: str, datasets: Optional[List[str]] = None, date_dependent: bool = False):
+    """
+    Decorador: guarda el resultado mientras la versión de los datasets (y el paso
+    del reloj, si aplica) no cambie. Solo se conserva la versión vigente por argumentos y el
+    recálculo tras un cambio pasa por single-flight.
+    El resultado se comparte entre peticiones: debe tratarse como de solo lectura.
+    """
+    datasets = datasets or []
+
+    def decorator(fn: Callable):
+        entries: Dict[Tuple, Tuple[Tuple, Any]] = {}
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            call_key = (args, tuple(sorted(kwargs.items())))
+            version = (
+                tuple(get_dataset_version(dataset) for dataset in datasets),
+                current_time_step() if date_dependent else None,
+            )
+            with lock:
+                cached = entries.get(call_key)
+            if cached is not None and cached[0] == version:
+                record_cache(f"memo:{name}", True)
+                return cached[1]
+            record_cache(f"memo:{name}", False)
+
+            result = flight_group.do((name, call_key, version), fn, *args, **kwargs)
+            with lock:
+                entries[call_key] = (version, result)
+            return result
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
@@ -0,0 +1,286 @@
+"""
+Métricas de rendimiento en formato de texto de Prometheus (ver GET /metrics).
+
+Sin dependencias externas: contadores, gauges e histogramas con etiquetas,
+más funciones para medir etapas internas (carga de CSV, enriquecimiento,
+agregación, inferencia, serialización) y aciertos de las cachés.
+"""
+import functools
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterable, List, Optional, Sequence, Tuple
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+# Segundos: de 1 ms a 30 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000, 10000, 100000, 1000000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} espera las etiquetas {list(self.labelnames)}, recibió {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por etiqueta: [conteos por bucket (no acumulados)..., +Inf], suma
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+
+        lines = self.header()
+        bucket_labels = self.labelnames + ("le",)
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, key + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {round(total, 6)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica duplicada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], None]):
+        """
+        Función que se llama antes de cada lectura para actualizar gauges
+        con el estado de otros componentes (tamaño de cachés, etc.)
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Error actualizando métricas: {e}")
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests_total = registry.counter(
+    "http_requests_total", "Peticiones HTTP atendidas", ["method", "route", "status"])
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP", ["method", "route"])
+http_requests_in_progress = registry.gauge(
+    "http_requests_in_progress", "Peticiones HTTP en curso", ["method"])
+stage_duration_seconds = registry.histogram(
+    "app_stage_duration_seconds", "Tiempo en etapas internas (csv_load, enrichment, aggregation, inference, serialization)",
+    ["stage", "name"])
+cache_requests_total = registry.counter(
+    "app_cache_requests_total", "Consultas a cachés internas por resultado (hit/miss)", ["cache", "result"])
+inference_batch_size = registry.histogram(
+    "app_model_inference_batch_size", "Filas por llamada al modelo", ["model"], buckets=BATCH_SIZE_BUCKETS)
+
+
+@contextmanager
+def time_stage(stage: str, name: str = ""):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_duration_seconds.observe(time.perf_counter() - started, stage=stage, name=name)
+
+
+def timed_stage(stage: str, name: Optional[str] = None):
+    """
+    Decorador: registra la duración de cada llamada como una etapa
+    (por defecto con el nombre de la función)
+    """
+    def decorator(fn: Callable):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with time_stage(stage, label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def time_inference(model: str, batch_size: int):
+    inference_batch_size.observe(batch_size, model=model)
+    with time_stage("inference", model):
+        yield
+
+
+def record_cache(cache: str, hit: bool):
+    cache_requests_total.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class TimedJSONResponse(JSONResponse):
+    """
+    JSONResponse que registra el tiempo de convertir el contenido a bytes
+    """
+
+    def render(self, content: Any) -> bytes:
+        with time_stage("serialization", "json"):
+            return super().render(content)
+
+
+_route_patterns: Optional[List[Tuple[re.Pattern, str]]] = None
+
+
+def _compile_route_patterns(paths: Iterable[str]) -> List[Tuple[re.Pattern, str]]:
+    patterns = []
+    for path in paths:
+        regex = re.sub(r"\\\{[^/]+?\\\}", "[^/]+", re.escape(path))
+        patterns.append((re.compile(f"^{regex}$"), path))
+    return patterns
+
+
+def route_template(request: Request) -> str:
+    """
+    Plantilla de la ruta (p. ej. /data/{flight_id}) para no crear una serie por
+    cada id. Las respuestas que se resuelven antes del router (304, cuerpos
+    precomprimidos) no llevan la ruta en el scope: se busca en el esquema OpenAPI.
+    """
+    global _route_patterns
+
+    route = request.scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+
+    if _route_patterns is None:
+        _route_patterns = _compile_route_patterns(request.app.openapi()["paths"])
+    for pattern, template in _route_patterns:
+        if pattern.match(request.url.path):
+            return template
+    return "unmatched"
+
+
+async def metrics_middleware(request: Request, call_next):
+    """
+    Cuenta peticiones y mide su latencia por método, ruta y código de respuesta
+    """
+    method = request.method
+    http_requests_in_progress.inc(method=method)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        http_requests_in_progress.dec(method=method)
+        route = route_template(request)
+        http_requests_total.inc(method=method, route=route, status=status)
+        http_request_duration_seconds.observe(elapsed, method=method, route=route)
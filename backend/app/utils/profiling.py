@@ -0,0 +1,296 @@
+"""
+Perfilado opcional por petición con un muestreador de pilas.
+
+Se activa solo si PROFILING_ENABLED=1 y la petición lo pide con el header
+`X-Profile: 1` o el parámetro `?profile=1`, o bien por muestreo aleatorio con
+PROFILING_SAMPLE_RATE (0 a 1). Mientras corre la petición un hilo toma las
+pilas de todos los hilos cada PROFILING_INTERVAL_MS (sys._current_frames) y al
+terminar se conservan las del hilo del threadpool que ejecutó el endpoint y las
+del event loop cuando no está ocioso. Se usa muestreo en lugar de cProfile
+porque los endpoints síncronos corren en otro hilo y cProfile solo ve el suyo.
+
+El perfil queda en memoria (los últimos PROFILING_MAX_STORED) y se descarga en
+/profiles/{id} como pilas colapsadas (flamegraph.pl, speedscope) o como archivo
+de speedscope. La respuesta perfilada lleva el header X-Profile-Id.
+"""
+import os
+import random
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from types import CodeType
+from typing import Dict, Any, List, Optional, Tuple
+from fastapi import Request
+
+# Rutas que nunca se perfilan
+EXCLUDED_PREFIXES = ("/profiles", "/metrics", "/health")
+# Headers que se quitan para que el endpoint se ejecute en lugar de responder desde caché
+CACHE_HEADERS = (b"if-none-match", b"if-modified-since", b"accept-encoding")
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_STDLIB_DIR = sysconfig.get_paths()["stdlib"]
+
+Stack = Tuple[CodeType, ...]
+
+
+def profiling_enabled() -> bool:
+    return os.environ.get("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+
+
+def get_sample_rate() -> float:
+    try:
+        return min(max(float(os.environ.get("PROFILING_SAMPLE_RATE", "0")), 0.0), 1.0)
+    except ValueError:
+        return 0.0
+
+
+def get_interval_seconds() -> float:
+    try:
+        return max(float(os.environ.get("PROFILING_INTERVAL_MS", "5")), 0.5) / 1000
+    except ValueError:
+        return 0.005
+
+
+def _frame_label(code: CodeType) -> str:
+    filename = code.co_filename
+    if filename.startswith(_BACKEND_DIR):
+        filename = os.path.relpath(filename, _BACKEND_DIR)
+    elif "site-packages" in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    elif filename.startswith(_STDLIB_DIR):
+        filename = os.path.relpath(filename, _STDLIB_DIR)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _is_idle(stack: Stack) -> bool:
+    # El event loop esperando eventos (selectors) no es trabajo de la petición
+    return bool(stack) and stack[-1].co_filename.endswith("selectors.py")
+
+
+class StackSampler:
+    """
+    Toma las pilas de todos los hilos a intervalos fijos. Cada muestra es la
+    tupla de code objects de la raíz a la hoja, contada por hilo.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> float:
+        self._stop.set()
+        self._thread.join()
+        return time.perf_counter() - self.started
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                self.samples[(thread_id, tuple(reversed(codes)))] += 1
+
+
+class RequestProfile:
+    def __init__(self, request: Request, trigger: str, interval: float, duration: float,
+                 stacks: Counter, status_code: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = request.method
+        self.path = request.url.path
+        self.query = str(request.url.query)
+        route = request.scope.get("route")
+        self.route = getattr(route, "path", None)
+        self.trigger = trigger
+        self.interval = interval
+        self.duration = duration
+        self.status_code = status_code
+        self.created_at = time.time()
+        # Pilas ya convertidas a etiquetas legibles: {(frame, ...): muestras}
+        self.stacks: Counter = Counter()
+        for stack, count in stacks.items():
+            self.stacks[tuple(_frame_label(code) for code in stack)] += count
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "route": self.route,
+            "trigger": self.trigger,
+            "status_code": self.status_code,
+            "duration_ms": round(self.duration * 1000, 2),
+            "samples": sum(self.stacks.values()),
+            "interval_ms": round(self.interval * 1000, 2),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.created_at)),
+        }
+
+    def collapsed(self) -> str:
+        """
+        Formato de pilas colapsadas: 'raíz;...;hoja muestras' por línea
+        """
+        lines = [";".join(stack) + f" {count}" for stack, count in sorted(self.stacks.items())]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> Dict[str, Any]:
+        """
+        Archivo de speedscope (perfil 'sampled'); se abre en https://www.speedscope.app
+        """
+        frame_index: Dict[str, int] = {}
+        frames: List[Dict[str, Any]] = []
+        samples: List[List[int]] = []
+        weights: List[float] = []
+        interval_ms = self.interval * 1000
+
+        for stack, count in self.stacks.items():
+            indexes = []
+            for label in stack:
+                if label not in frame_index:
+                    frame_index[label] = len(frames)
+                    name, _, location = label.partition(" (")
+                    file, _, line = location.rstrip(")").rpartition(":")
+                    frames.append({"name": name, "file": file, "line": int(line) if line.isdigit() else None})
+                indexes.append(frame_index[label])
+            samples.append(indexes)
+            weights.append(round(count * interval_ms, 3))
+
+        name = f"{self.method} {self.path}"
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": name,
+            "activeProfileIndex": 0,
+            "exporter": "gategroup-backend",
+        }
+
+    def top_functions(self, limit: int = 25) -> List[Dict[str, Any]]:
+        """
+        Funciones con más muestras propias (hoja) y totales (en la pila)
+        """
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            for label in set(stack):
+                total_counts[label] += count
+
+        samples = max(sum(self.stacks.values()), 1)
+        return [
+            {
+                "function": label,
+                "self_samples": self_counts[label],
+                "total_samples": total,
+                "total_pct": round(total / samples * 100, 1),
+            }
+            for label, total in sorted(total_counts.items(), key=lambda item: (-self_counts[item[0]], -item[1]))[:limit]
+        ]
+
+
+class ProfileStore:
+    def __init__(self, max_profiles: int = 50):
+        self._profiles: "deque[RequestProfile]" = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return next((p for p in self._profiles if p.id == profile_id), None)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [profile.summary() for profile in reversed(self._profiles)]
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+profile_store = ProfileStore(int(os.environ.get("PROFILING_MAX_STORED", "50")))
+
+
+def profiling_trigger(request: Request) -> Optional[str]:
+    """
+    Motivo por el que se perfila la petición ('header', 'query', 'sampling') o None
+    """
+    if request.url.path.startswith(EXCLUDED_PREFIXES):
+        return None
+    if profiling_enabled():
+        if request.headers.get("x-profile", "").lower() in ("1", "true", "yes"):
+            return "header"
+        if request.query_params.get("profile", "").lower() in ("1", "true", "yes"):
+            return "query"
+    rate = get_sample_rate()
+    if rate > 0 and random.random() < rate:
+        return "sampling"
+    return None
+
+
+def _request_stacks(sampler: StackSampler, loop_thread: int, endpoint_code: Optional[CodeType]) -> Counter:
+    """
+    Se quedan las pilas que ejecutan el endpoint (hilo del threadpool o el loop
+    para endpoints async) y las del event loop que no está esperando eventos
+    (middlewares, serialización). Otra petición concurrente al mismo endpoint
+    también aparecería: el perfil es más fiel con tráfico bajo.
+    """
+    stacks: Counter = Counter()
+    for (thread_id, stack), count in sampler.samples.items():
+        runs_endpoint = endpoint_code is not None and endpoint_code in stack
+        if runs_endpoint or (thread_id == loop_thread and not _is_idle(stack)):
+            stacks[stack] += count
+    return stacks
+
+
+async def profiling_middleware(request: Request, call_next):
+    """
+    Perfila la petición si se pidió (y está habilitado) o si cae en el muestreo
+    """
+    trigger = profiling_trigger(request)
+    if trigger is None:
+        return await call_next(request)
+
+    request.scope["headers"] = [(key, value) for key, value in request.scope["headers"] if key not in CACHE_HEADERS]
+
+    sampler = StackSampler(get_interval_seconds())
+    loop_thread = threading.get_ident()
+    sampler.start()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        duration = sampler.stop()
+        route = request.scope.get("route")
+        endpoint = getattr(route, "endpoint", None)
+        profile = RequestProfile(request, trigger, sampler.interval, duration,
+                                 _request_stacks(sampler, loop_thread, getattr(endpoint, "__code__", None)),
+                                 status_code)
+        profile_store.add(profile)
+        print(f"Perfil {profile.id} capturado para {profile.method} {profile.path} ({profile.summary()['duration_ms']} ms, {trigger})")
+
+    response.headers["X-Profile-Id"] = profile.id
+    return response
@@ -0,0 +1,95 @@
+import functools
+import threading
+from typing import Dict, Any, Callable, Hashable, List, Optional
+from app.utils.metrics import record_cache
+from app.utils.utils import current_time_step, get_dataset_version
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Deduplica cómputos idénticos concurrentes: mientras una llamada con cierta
+    clave está en curso, las demás esperan su resultado en lugar de repetirla.
+    No es una caché: al terminar la llamada la clave se libera.
+
+    Los endpoints son síncronos y FastAPI los ejecuta en un threadpool, por eso
+    la espera es con threading.Event. El resultado se comparte entre todos los
+    que esperaban, así que debe tratarse como de solo lectura.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+        record_cache("single_flight", not leader)
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executed": self.executed,
+                "shared": self.shared,
+            }
+
+
+flight_group = SingleFlight()
+
+
+def single_flight(name: str, datasets: Optional[List[str]] = None, date_dependent: bool = False):
+    """
+    Decorador: las llamadas concurrentes con los mismos argumentos y la misma
+    versión de los datasets comparten una sola ejecución
+    """
+    datasets = datasets or []
+
+    def decorator(fn: Callable):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (
+                name,
+                args,
+                tuple(sorted(kwargs.items())),
+                tuple(get_dataset_version(dataset) for dataset in datasets),
+                current_time_step() if date_dependent else None,
+            )
+            return flight_group.do(key, fn, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,97 @@
+"""
+Perfil de arranque de la aplicación.
+
+En ejecución registra la duración de cada etapa del arranque (ver /health/startup).
+Como script mide el costo de importar cada módulo con `python -X importtime`:
+    python -m app.utils.startup_profile --top 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List
+
+# Módulos pesados que deben cargarse de forma diferida
+HEAVY_MODULES = ["sklearn", "joblib", "scipy"]
+
+
+class StartupProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._stages: List[Dict[str, Any]] = []
+        self._marks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._stages.append({"stage": name, "seconds": round(time.perf_counter() - started, 4)})
+
+    def mark(self, name: str):
+        with self._lock:
+            self._marks.setdefault(name, round(time.perf_counter() - self.started, 4))
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stages": list(self._stages),
+                "marks_seconds_since_import": dict(self._marks),
+                "heavy_modules_loaded": {name: name in sys.modules for name in HEAVY_MODULES},
+                "uptime_seconds": round(time.perf_counter() - self.started, 2),
+            }
+
+
+startup_profile = StartupProfile()
+
+
+def profile_imports(module: str = "app.main", top: int = 20) -> Dict[str, Any]:
+    """
+    Importa el módulo en un proceso nuevo con -X importtime y devuelve los
+    módulos con mayor tiempo acumulado
+    """
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=backend_dir, capture_output=True, text=True, check=True
+    )
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # Formato: "import time: <propio us> | <acumulado us> | <módulo indentado>"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append({"module": name.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+
+    total = next((e["cumulative_ms"] for e in entries if e["module"] == module), None)
+    return {
+        "module": module,
+        "total_import_ms": total,
+        "top_cumulative": sorted(entries, key=lambda e: e["cumulative_ms"], reverse=True)[:top],
+        "heavy_modules_imported": sorted({e["module"].split(".")[0] for e in entries} & set(HEAVY_MODULES)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de importación del arranque")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    report = profile_imports(args.module, args.top)
+    print(f"Importar {report['module']}: {report['total_import_ms']} ms")
+    print(f"Módulos pesados importados: {report['heavy_modules_imported'] or 'ninguno'}")
+    print(f"{'módulo':<60}{'acumulado ms':>14}{'propio ms':>12}")
+    for entry in report["top_cumulative"]:
+        print(f"{entry['module']:<60}{entry['cumulative_ms']:>14.1f}{entry['self_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
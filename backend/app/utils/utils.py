@@ -0,0 +1,61 @@
+import os
+from datetime import datetime
+
+# Los cálculos que dependen del reloj (días para expirar) avanzan en pasos de este tamaño
+CLOCK_STEP_MINUTES = 15
+
+
+def get_data_dir() -> str:
+    """
+    Devuelve la ruta absoluta al directorio data/ en la raíz del proyecto,
+    o al directorio indicado en la variable de entorno DATA_DIR
+    """
+    override = os.environ.get("DATA_DIR")
+    if override:
+        return os.path.abspath(override)
+    
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    app_dir = os.path.dirname(current_dir)  # Salir de utils a app
+    backend_dir = os.path.dirname(app_dir)  # Salir de app a backend
+    project_root = os.path.dirname(backend_dir)  # Salir de backend al root del proyecto
+    return os.path.abspath(os.path.join(project_root, 'data'))
+
+
+def get_data_path(filename: str) -> str:
+    """
+    Construye la ruta absoluta a un archivo dentro de data/
+    """
+    return os.path.join(get_data_dir(), filename)
+
+
+def get_dataset_version(filename: str) -> str:
+    """
+    Versión de un archivo de data/ derivada de su fecha de modificación y tamaño.
+    Cambia cada vez que el archivo se reescribe.
+    """
+    try:
+        stat = os.stat(get_data_path(filename))
+    except FileNotFoundError:
+        return "missing"
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def get_dataset_mtime(filename: str) -> float:
+    """
+    Fecha de modificación (epoch) de un archivo de data/, 0 si no existe
+    """
+    try:
+        return os.stat(get_data_path(filename)).st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def current_time_step() -> datetime:
+    """
+    Hora actual truncada al paso de CLOCK_STEP_MINUTES. Es el "ahora" de los
+    cálculos que dependen del reloj y forma parte de la llave de sus cachés y
+    ETags, así que todos ven la misma hora y quedan atrasados a lo más un paso
+    """
+    now = datetime.now()
+    return now.replace(minute=now.minute - now.minute % CLOCK_STEP_MINUTES, second=0, microsecond=0)
+
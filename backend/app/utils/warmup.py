@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from typing import Dict, Any, Callable
+
+# MODEL_WARMUP=background (por defecto) entrena en un hilo sin bloquear el arranque,
+# sync entrena antes de aceptar tráfico (comportamiento anterior) y off no entrena
+WARMUP_MODES = ("background", "sync", "off")
+
+
+def get_warmup_mode() -> str:
+    mode = os.environ.get("MODEL_WARMUP", "background").lower()
+    return mode if mode in WARMUP_MODES else "background"
+
+
+class ModelWarmup:
+    """
+    Estado de calentamiento de los modelos. El servidor acepta tráfico mientras
+    los modelos se entrenan; /health/ready reporta cuándo están listos.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str):
+        with self._lock:
+            self._tasks.setdefault(name, {"status": "pending"})
+
+    def start(self, name: str, fn: Callable[[], Any]):
+        """
+        Entrena el modelo según MODEL_WARMUP; los errores quedan en el estado del modelo
+        """
+        mode = get_warmup_mode()
+        self.register(name)
+        if mode == "off":
+            with self._lock:
+                self._tasks[name] = {"status": "skipped"}
+            return
+
+        if mode == "sync":
+            self._run(name, fn)
+            return
+
+        thread = threading.Thread(target=self._run, args=(name, fn), name=f"warmup-{name}", daemon=True)
+        thread.start()
+
+    def _run(self, name: str, fn: Callable[[], Any]):
+        started = time.perf_counter()
+        with self._lock:
+            self._tasks[name] = {"status": "warming", "started_at": time.time()}
+        try:
+            fn()
+            status = {"status": "ready"}
+        except Exception as e:
+            print(f"Error calentando el modelo {name}: {e}")
+            status = {"status": "failed", "error": str(e)}
+        with self._lock:
+            self._tasks[name].update(status, seconds=round(time.perf_counter() - started, 4))
+
+    def mark_ready(self, name: str):
+        """
+        Marca un modelo como listo cuando se entrena fuera del calentamiento (p. ej. /train-model)
+        """
+        with self._lock:
+            task = self._tasks.setdefault(name, {})
+            if task.get("status") != "warming":
+                task["status"] = "ready"
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: dict(task) for name, task in self._tasks.items()}
+
+    def all_ready(self) -> bool:
+        with self._lock:
+            return all(task["status"] == "ready" for task in self._tasks.values())
+
+
+model_warmup = ModelWarmup()
@@ -0,0 +1,205 @@
+"""
+Generador de datos sintéticos para los benchmarks.
+
+Produce flight_data, pastFlights_data, products_data_augmented y
+productivity_data con el mismo esquema que los CSV de data/ a la escala
+pedida. Las columnas categóricas se muestrean de las filas reales (así las
+combinaciones aerolínea/avión/ruta siguen siendo coherentes), los
+identificadores se vuelven únicos y los numéricos derivados se recalculan
+para que sigan cuadrando (vendidos <= capacidad, servidos = consumidos +
+devueltos, etc.). Se escribe por bloques para no tener 10M filas en memoria.
+
+Desde backend/:
+    python -m benchmarks.generate_data --rows 10k --output benchmarks/data/10k
+"""
+import argparse
+import os
+import shutil
+import time
+from typing import Callable, Dict, Any
+import numpy as np
+import pandas as pd
+from app.utils.utils import get_data_path
+
+SCALES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+CHUNK_ROWS = 250_000
+# Productos por vuelo en pastFlights (filas = vuelos x productos)
+PRODUCTS_PER_FLIGHT = 10
+BASE_DATE = np.datetime64("2024-01-01")
+# Columnas de pastFlights que describen el vuelo (el resto describe el producto servido)
+PAST_FLIGHT_COLUMNS = ["airline", "airline_icon", "aircraft", "max_capacity", "duration",
+                       "origin", "destination", "meal_service_type"]
+
+
+def parse_rows(value: str) -> int:
+    """
+    Acepta una escala con nombre (10k, 1m, 10m) o un número de filas
+    """
+    key = value.strip().lower()
+    if key in SCALES:
+        return SCALES[key]
+    return int(float(key.replace("_", "")))
+
+
+def _sample(base: pd.DataFrame, rng: np.random.Generator, rows: int) -> pd.DataFrame:
+    return base.iloc[rng.integers(0, len(base), size=rows)].reset_index(drop=True)
+
+
+def _random_dates(rng: np.random.Generator, rows: int, span_days: int = 365) -> np.ndarray:
+    return BASE_DATE + rng.integers(0, span_days, size=rows).astype("timedelta64[D]")
+
+
+def _random_times(rng: np.random.Generator, rows: int) -> pd.Series:
+    minutes = rng.integers(0, 24 * 60, size=rows)
+    return pd.Series([f"{m // 60:02d}:{m % 60:02d}" for m in minutes])
+
+
+def flights_chunk(base: pd.DataFrame, rng: np.random.Generator, start: int, rows: int) -> pd.DataFrame:
+    df = _sample(base, rng, rows)
+    df["flight_id"] = [f"FL{i:08d}" for i in range(start, start + rows)]
+    capacity = df["max_capacity"].to_numpy()
+    df["tickets_sold"] = (capacity * rng.uniform(0.55, 1.0, size=rows)).astype(int)
+    df["duration"] = np.round(df["duration"].to_numpy() * rng.uniform(0.8, 1.2, size=rows), 1)
+    df["departure_date"] = pd.Series(_random_dates(rng, rows)).dt.strftime("%Y-%m-%d")
+    df["departure_time"] = _random_times(rng, rows)
+    return df
+
+
+def past_flights_chunk(base: pd.DataFrame, rng: np.random.Generator, start: int, rows: int) -> pd.DataFrame:
+    df = _sample(base, rng, rows)
+    # Las filas de un mismo vuelo comparten aerolínea, avión, ruta, fecha, hora y ocupación
+    flight_number = (np.arange(start, start + rows) // PRODUCTS_PER_FLIGHT)
+    first_flight = flight_number[0]
+    flights = flight_number[-1] - first_flight + 1
+    offsets = flight_number - first_flight
+
+    flight_rows = _sample(base[PAST_FLIGHT_COLUMNS], rng, flights)
+    for column in PAST_FLIGHT_COLUMNS:
+        df[column] = flight_rows[column].to_numpy()[offsets]
+    df["flight_id"] = [f"PF{n:08d}" for n in flight_number]
+    dates = pd.Series(_random_dates(rng, flights, span_days=730)).dt.strftime("%Y-%m-%d").to_numpy()
+    times = _random_times(rng, flights).to_numpy()
+    occupancy = rng.uniform(0.55, 1.0, size=flights)
+    df["departure_date"] = dates[offsets]
+    df["departure_time"] = times[offsets]
+    df["tickets_sold"] = (df["max_capacity"].to_numpy() * occupancy[offsets]).astype(int)
+
+    standard = df["standard_quantity"].to_numpy()
+    served = np.maximum((standard * rng.uniform(0.8, 1.1, size=rows)).astype(int), 1)
+    consumed = (served * rng.uniform(0.5, 1.0, size=rows)).astype(int)
+    returned = served - consumed
+    df["quantity_served"] = served
+    df["quantity_consumed"] = consumed
+    df["quantity_returned"] = returned
+    df["consumption_rate"] = np.round(consumed / served * 100, 1)
+    df["food_waste_percentage"] = np.round(returned / served * 100, 1)
+    df["passenger_satisfaction"] = np.round(rng.uniform(3.0, 5.0, size=rows), 1)
+    return df
+
+
+def products_chunk(base: pd.DataFrame, rng: np.random.Generator, start: int, rows: int) -> pd.DataFrame:
+    df = _sample(base, rng, rows)
+    df["Batch_Number"] = [f"B{i:08d}B" for i in range(start, start + rows)]
+
+    standard = df["standard_quantity"].to_numpy()
+    returned = (standard * rng.uniform(0.0, 0.4, size=rows)).astype(int)
+    df["units_returned"] = returned
+    df["units_consumed"] = standard - returned
+    df["freshness_score"] = np.round(rng.uniform(5.0, 100.0, size=rows), 1)
+    df["acceptance_rate"] = np.round(rng.uniform(50.0, 100.0, size=rows), 1)
+    df["CO2_Footprint"] = np.round(rng.uniform(0.5, 6.0, size=rows), 2)
+    return df
+
+
+def productivity_chunk(base: pd.DataFrame, rng: np.random.Generator, start: int, rows: int) -> pd.DataFrame:
+    df = _sample(base, rng, rows)
+    df["sesion_id"] = [f"SES{i:08d}" for i in range(start, start + rows)]
+
+    starts = pd.Series(_random_dates(rng, rows)) + pd.to_timedelta(rng.integers(6 * 3600, 20 * 3600, size=rows), unit="s")
+    seconds = rng.integers(1800, 4 * 3600, size=rows)
+    minutes = seconds // 60
+    items = np.maximum((minutes * rng.uniform(1.5, 4.5, size=rows)).astype(int), 1)
+    fps = np.round(rng.uniform(24.0, 31.0, size=rows), 1)
+    left = np.round(rng.uniform(10.0, 50.0, size=rows), 1)
+
+    df["fecha_inicio"] = starts.dt.strftime("%Y-%m-%d %H:%M:%S")
+    df["fecha_fin"] = (starts + pd.to_timedelta(seconds, unit="s")).dt.strftime("%Y-%m-%d %H:%M:%S")
+    df["duracion_sesion_seg"] = seconds
+    df["duracion_sesion_min"] = minutes
+    df["conteo_total_items"] = items
+    df["tasa_items_por_minuto"] = np.round(items / minutes, 2)
+    df["eficiencia_operario"] = np.round(rng.uniform(60.0, 99.0, size=rows), 1)
+    df["fps_promedio"] = fps
+    df["frames_procesados"] = (seconds * fps).astype(int)
+    df["errores_deteccion"] = rng.integers(0, 30, size=rows)
+    df["precision_promedio"] = np.round(rng.uniform(85.0, 99.5, size=rows), 1)
+    df["uso_brazo_izquierdo"] = left
+    df["uso_brazo_derecho"] = np.round(100.0 - left, 1)
+    df["movimientos_eficientes"] = np.round(rng.uniform(60.0, 98.0, size=rows), 1)
+    return df
+
+
+GENERATORS: Dict[str, Callable[[pd.DataFrame, np.random.Generator, int, int], pd.DataFrame]] = {
+    "flight_data.csv": flights_chunk,
+    "pastFlights_data.csv": past_flights_chunk,
+    "products_data_augmented.csv": products_chunk,
+    "productivity_data.csv": productivity_chunk,
+}
+
+# Catálogo que no escala con la carga: se copia tal cual
+COPIED_FILES = ["products_data.csv"]
+
+
+def generate_file(filename: str, rows: int, output_dir: str, seed: int = 42, chunk_rows: int = CHUNK_ROWS) -> str:
+    base = pd.read_csv(get_data_path(filename))
+    columns = list(base.columns)
+    generator = GENERATORS[filename]
+    path = os.path.join(output_dir, filename)
+
+    # Una semilla independiente por bloque: misma semilla, mismos archivos
+    seeds = np.random.SeedSequence([seed, list(GENERATORS).index(filename)]).spawn((rows + chunk_rows - 1) // chunk_rows)
+    with open(path, "w", encoding="utf-8", newline="") as handle:
+        for chunk_index, start in enumerate(range(0, rows, chunk_rows)):
+            size = min(chunk_rows, rows - start)
+            chunk = generator(base, np.random.default_rng(seeds[chunk_index]), start, size)
+            chunk[columns].to_csv(handle, header=(start == 0), index=False)
+    return path
+
+
+def generate_dataset(rows: int, output_dir: str, seed: int = 42) -> Dict[str, Any]:
+    """
+    Genera todos los archivos en output_dir; devuelve filas y segundos por archivo
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    report: Dict[str, Any] = {"rows": rows, "output_dir": os.path.abspath(output_dir), "files": {}}
+
+    for filename in GENERATORS:
+        started = time.perf_counter()
+        path = generate_file(filename, rows, output_dir, seed)
+        report["files"][filename] = {
+            "seconds": round(time.perf_counter() - started, 2),
+            "mb": round(os.path.getsize(path) / 1024 ** 2, 1),
+        }
+        print(f"  {filename}: {rows:,} filas en {report['files'][filename]['seconds']}s ({report['files'][filename]['mb']} MB)")
+
+    for filename in COPIED_FILES:
+        shutil.copyfile(get_data_path(filename), os.path.join(output_dir, filename))
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos con el esquema de data/")
+    parser.add_argument("--rows", default="10k", help="10k, 1m, 10m o un número de filas")
+    parser.add_argument("--output", default=None, help="Directorio destino (por defecto benchmarks/data/<rows>)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = parse_rows(args.rows)
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", args.rows.lower())
+    print(f"Generando {rows:,} filas por archivo en {output}")
+    generate_dataset(rows, output, args.seed)
+
+
+if __name__ == "__main__":
+    main()
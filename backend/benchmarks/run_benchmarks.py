@@ -0,0 +1,341 @@
+"""
+Benchmark de todos los endpoints de la API contra datos sintéticos.
+
+Por cada escala genera los datos (si no existen), levanta la app en un proceso
+nuevo con DATA_DIR apuntando a esos datos y la recorre en proceso vía ASGI
+(TestClient, sin red). Para cada endpoint registra la primera llamada (carga en
+frío de CSV y modelos), p50/p99 y throughput de las siguientes, y el pico de
+RSS del proceso. Cada escala corre en su propio proceso para que el pico de
+memoria de una no contamine a la siguiente.
+
+Desde backend/:
+    python -m benchmarks.run_benchmarks --scales 10k 1m
+    python -m benchmarks.run_benchmarks --scales 10k --compare benchmarks/results/10k.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, Any, List, Optional
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+from benchmarks.generate_data import parse_rows, generate_dataset
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+# Endpoints que reentrenan modelos: solo se miden con --include-training
+TRAINING_ENDPOINTS = {"/prediction/train-model", "/expiration/train-model"}
+# Endpoints sin datos que medir: los perfiles solo existen tras perfilar otra petición
+SKIPPED_PREFIXES = ("/profiles",)
+# Una p50 mayor a este factor respecto a la base se marca como regresión
+REGRESSION_FACTOR = 1.25
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def build_samples(data_dir: str) -> Dict[str, Any]:
+    """
+    Valores reales (primeras filas de cada CSV) para llenar parámetros de ruta, query y body
+    """
+    from app.utils.indexes import stable_product_id
+
+    products = pd.read_csv(os.path.join(data_dir, "products_data_augmented.csv"), nrows=5)
+    flights = pd.read_csv(os.path.join(data_dir, "flight_data.csv"), nrows=5)
+    history = pd.read_csv(os.path.join(data_dir, "pastFlights_data.csv"), nrows=20)
+    sessions = pd.read_csv(os.path.join(data_dir, "productivity_data.csv"), nrows=200)
+
+    product = products.iloc[0].to_dict()
+    past = history.iloc[0].to_dict()
+    session = sessions.iloc[0].to_dict()
+    cities = list(dict.fromkeys(sessions["ciudad"].astype(str)))[:3]
+
+    freshness_features = {
+        "unit_cost": product["unit_cost"],
+        "vida_util_dias": product["vida_util_dias"],
+        "precio_consumidor": product["precio_consumidor"],
+        "standard_quantity": product["standard_quantity"],
+        "units_returned": product["units_returned"],
+        "units_consumed": product["units_consumed"],
+        "tipo": product["tipo"],
+        "aerolinea": product["aerolinea"],
+    }
+
+    return {
+        "path": {
+            "product_id": stable_product_id(product["Batch_Number"], product["aerolinea"]),
+            "flight_id": str(flights.iloc[0]["flight_id"]),
+            "sesion_id": str(session["sesion_id"]),
+            "nombre_operario": str(session["nombre_operario"]),
+            "country": str(session["country"]),
+            "ciudad": str(session["ciudad"]),
+        },
+        "query": {
+            "/prediction/predict": {
+                "standard_quantity": product["standard_quantity"],
+                "units_returned": product["units_returned"],
+            },
+            "/prediction/predict-rich": {
+                "standard_quantity": past["standard_quantity"],
+                "units_returned": past["quantity_returned"],
+                "duration": past["duration"],
+                "tickets_sold": past["tickets_sold"],
+                "passenger_count": past["tickets_sold"],
+                "aerolinea": past["airline"],
+                "tipo": past["product_category"],
+                "meal_service_type": past["meal_service_type"],
+            },
+            "/prediction/batch-predict": {
+                "flight_data": ";".join(f"{row.standard_quantity},{row.units_returned}" for row in products.itertuples()),
+            },
+            "/prediction/predict-intervals": {
+                "flight_data": ";".join(f"{row.standard_quantity},{row.units_returned}" for row in products.itertuples()),
+            },
+            "/prediction/simulate-policies": {"scenarios": 100},
+            "/prediction/features": {"product_id": past["product_id"]},
+            "/productivity/ciudades/comparacion": {"ciudades": ",".join(cities)},
+            # Lote vacío: registra la sesión para /resumen sin escribir partes en el directorio de datos
+            "/productivity/detecciones/ingesta": {"sesion_id": str(session["sesion_id"])},
+            "/expiration/predict-freshness": freshness_features,
+        },
+        "body": {
+            # Registros ya presentes en el histórico: la ingesta los descarta como duplicados
+            # y el estado del feature store no cambia entre iteraciones
+            "/prediction/features/flights": history.to_dict(orient="records"),
+            "/expiration/predict-freshness/batch": [freshness_features] * 20,
+        },
+    }
+
+
+def build_requests(openapi: Dict[str, Any], samples: Dict[str, Any], include_training: bool = False,
+                   only: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Un request por operación del esquema OpenAPI, con los parámetros obligatorios llenos
+    """
+    requests = []
+    for path, operations in openapi["paths"].items():
+        if path in TRAINING_ENDPOINTS and not include_training:
+            continue
+        if path.startswith(SKIPPED_PREFIXES):
+            continue
+        if only and not any(fragment in path for fragment in only):
+            continue
+        for method, operation in operations.items():
+            url = path
+            for parameter in operation.get("parameters", []):
+                if parameter["in"] == "path":
+                    url = url.replace("{" + parameter["name"] + "}", quote(samples["path"][parameter["name"]], safe=""))
+            requests.append({
+                "name": f"{method.upper()} {path}",
+                "method": method.upper(),
+                "url": url,
+                "params": samples["query"].get(path),
+                "json": samples["body"].get(path) if "requestBody" in operation else None,
+            })
+    return requests
+
+
+def measure_endpoint(client, request: Dict[str, Any], max_requests: int, max_seconds: float) -> Dict[str, Any]:
+    headers = {"Accept-Encoding": "identity"}
+
+    def call():
+        started = time.perf_counter()
+        response = client.request(request["method"], request["url"], params=request["params"],
+                                  json=request["json"], headers=headers)
+        return time.perf_counter() - started, response
+
+    cold_seconds, response = call()
+    statuses = Counter({response.status_code: 1})
+    response_bytes = len(response.content)
+
+    latencies: List[float] = []
+    budget_started = time.perf_counter()
+    while len(latencies) < max_requests and time.perf_counter() - budget_started < max_seconds:
+        seconds, response = call()
+        latencies.append(seconds)
+        statuses[response.status_code] += 1
+    elapsed = time.perf_counter() - budget_started
+
+    warm = np.array(latencies) * 1000 if latencies else np.array([cold_seconds * 1000])
+    return {
+        "cold_ms": round(cold_seconds * 1000, 2),
+        "requests": len(latencies),
+        "p50_ms": round(float(np.percentile(warm, 50)), 3),
+        "p99_ms": round(float(np.percentile(warm, 99)), 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if latencies and elapsed > 0 else 0.0,
+        "response_bytes": response_bytes,
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def run_worker(data_dir: str, max_requests: int, max_seconds: float, include_training: bool,
+               only: Optional[List[str]]) -> Dict[str, Any]:
+    """
+    Corre dentro del proceso hijo: DATA_DIR y MODEL_WARMUP ya vienen en el entorno
+    """
+    started = time.perf_counter()
+    from fastapi.testclient import TestClient
+    from app.main import app
+    import_seconds = time.perf_counter() - started
+
+    samples = build_samples(data_dir)
+    results: Dict[str, Any] = {}
+    with TestClient(app) as client:
+        startup_seconds = time.perf_counter() - started
+        rss_after_startup = _peak_rss_mb()
+
+        # El modelo enriquecido solo se entrena bajo demanda; sin él /predict-rich responde 503
+        training_started = time.perf_counter()
+        client.get("/prediction/train-model", params={"feature_set": "rich"})
+        rich_training_seconds = time.perf_counter() - training_started
+
+        for request in build_requests(app.openapi(), samples, include_training, only):
+            results[request["name"]] = measure_endpoint(client, request, max_requests, max_seconds)
+            summary = results[request["name"]]
+            print(f"  {request['name']:<55} p50 {summary['p50_ms']:>9.2f} ms  p99 {summary['p99_ms']:>9.2f} ms  "
+                  f"{summary['status_codes']}", file=sys.stderr, flush=True)
+
+    return {
+        "data_dir": data_dir,
+        "import_seconds": round(import_seconds, 3),
+        "startup_seconds": round(startup_seconds, 3),
+        "rss_after_startup_mb": rss_after_startup,
+        "rich_training_seconds": round(rich_training_seconds, 3),
+        "peak_rss_mb": _peak_rss_mb(),
+        "endpoints": results,
+    }
+
+
+def run_scale(scale: str, args) -> Dict[str, Any]:
+    rows = parse_rows(scale)
+    data_dir = os.path.join(args.data_root, scale.lower())
+    marker = os.path.join(data_dir, ".complete")
+    if not os.path.exists(marker) or args.regenerate:
+        print(f"Generando datos {scale} ({rows:,} filas) en {data_dir}")
+        generate_dataset(rows, data_dir, args.seed)
+        open(marker, "w").close()
+
+    env = dict(os.environ, DATA_DIR=data_dir, MODEL_WARMUP="sync")
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as handle:
+        result_path = handle.name
+
+    command = [sys.executable, "-m", "benchmarks.run_benchmarks", "--worker", "--result", result_path,
+               "--requests", str(args.requests), "--max-seconds", str(args.max_seconds)]
+    if args.include_training:
+        command.append("--include-training")
+    if args.only:
+        command += ["--only", *args.only]
+
+    # Los logs de la app (stdout del hijo) van a un archivo; el progreso sale por stderr
+    log_path = os.path.join(args.output, f"{scale.lower()}.log")
+    print(f"Escala {scale}: midiendo endpoints (log de la app en {log_path})")
+    try:
+        with open(log_path, "w", encoding="utf-8") as log:
+            subprocess.run(command, cwd=BACKEND_DIR, env=env, stdout=log, check=True)
+        with open(result_path, encoding="utf-8") as handle:
+            result = json.load(handle)
+    finally:
+        os.remove(result_path)
+
+    result.update({"scale": scale, "rows": rows, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")})
+    return result
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    p50 actual contra la base por endpoint; marca regresiones mayores a REGRESSION_FACTOR
+    """
+    rows = []
+    for name, summary in current["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous or not previous["p50_ms"]:
+            continue
+        ratio = summary["p50_ms"] / previous["p50_ms"]
+        rows.append({
+            "endpoint": name,
+            "baseline_p50_ms": previous["p50_ms"],
+            "p50_ms": summary["p50_ms"],
+            "ratio": round(ratio, 2),
+            "regression": ratio > REGRESSION_FACTOR,
+        })
+    return rows
+
+
+def render_markdown(result: Dict[str, Any], comparison: Optional[List[Dict[str, Any]]] = None) -> str:
+    lines = [
+        f"## Escala {result['scale']} ({result['rows']:,} filas)",
+        "",
+        f"Import {result['import_seconds']}s, arranque con modelos {result['startup_seconds']}s, "
+        f"entrenamiento enriquecido {result['rich_training_seconds']}s, "
+        f"RSS tras arranque {result['rss_after_startup_mb']} MB, pico {result['peak_rss_mb']} MB",
+        "",
+        "| Endpoint | Frío ms | p50 ms | p99 ms | req/s | Status | Pico RSS MB |",
+        "|---|---:|---:|---:|---:|---|---:|",
+    ]
+    for name, summary in result["endpoints"].items():
+        statuses = " ".join(f"{code}×{count}" for code, count in summary["status_codes"].items())
+        lines.append(f"| `{name}` | {summary['cold_ms']} | {summary['p50_ms']} | {summary['p99_ms']} | "
+                     f"{summary['throughput_rps']} | {statuses} | {summary['peak_rss_mb']} |")
+
+    if comparison:
+        lines += ["", "| Endpoint | p50 base ms | p50 ms | Factor |", "|---|---:|---:|---:|"]
+        for row in comparison:
+            flag = " **regresión**" if row["regression"] else ""
+            lines.append(f"| `{row['endpoint']}` | {row['baseline_p50_ms']} | {row['p50_ms']} | {row['ratio']}{flag} |")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark en proceso de todos los endpoints")
+    parser.add_argument("--scales", nargs="+", default=["10k"], help="10k, 1m, 10m o número de filas")
+    parser.add_argument("--requests", type=int, default=50, help="Máximo de requests medidos por endpoint")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="Presupuesto de tiempo por endpoint")
+    parser.add_argument("--only", nargs="+", default=None, help="Solo endpoints cuya ruta contenga alguno de estos textos")
+    parser.add_argument("--include-training", action="store_true")
+    parser.add_argument("--data-root", default=os.path.join(BENCHMARKS_DIR, "data"))
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "results"))
+    parser.add_argument("--compare", default=None, help="JSON de una corrida anterior (misma escala) para comparar")
+    parser.add_argument("--regenerate", action="store_true", help="Vuelve a generar los datos aunque existan")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(os.environ["DATA_DIR"], args.requests, args.max_seconds, args.include_training, args.only)
+        with open(args.result, "w", encoding="utf-8") as handle:
+            json.dump(result, handle)
+        return
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+
+    os.makedirs(args.output, exist_ok=True)
+    for scale in args.scales:
+        result = run_scale(scale, args)
+        comparison = compare_results(result, baseline) if baseline else None
+        json_path = os.path.join(args.output, f"{scale.lower()}.json")
+        with open(json_path, "w", encoding="utf-8") as handle:
+            json.dump(result, handle, indent=2, ensure_ascii=False)
+        with open(os.path.join(args.output, f"{scale.lower()}.md"), "w", encoding="utf-8") as handle:
+            handle.write(render_markdown(result, comparison))
+        print(f"Resultados en {json_path}")
+        if comparison:
+            regressions = [row["endpoint"] for row in comparison if row["regression"]]
+            print(f"Regresiones (p50 > {REGRESSION_FACTOR}x): {regressions or 'ninguna'}")
+
+
+if __name__ == "__main__":
+    main()
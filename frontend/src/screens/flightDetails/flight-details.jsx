@@ -25,34 +25,20 @@ export function FlightDetails({ flightId, onBack }) {
         setLoading(true);
         setError(null);
 
-        const [detailsResponse, productsResponse, predictionResponse, operatorResponse] =
-          await Promise.all([
-            fetch(`/data/${flightId}`),
-            fetch(`/products/all`),
-            fetch(`/prediction/flight-recommendation/${flightId}`),
-            fetch(`/productivity/recomendacion/vuelo/${flightId}`),
-          ]);
-
-        if (!detailsResponse.ok)
-          throw new Error(
-            `Error fetching flight details: ${detailsResponse.status}`
-          );
-        if (!productsResponse.ok)
+        // Un solo request con vuelo, productos, predicción y operarios
+        const bundleResponse = await fetch(`/bundles/flight/${flightId}`);
+
+        if (!bundleResponse.ok)
           throw new Error(
-            `Error fetching products: ${productsResponse.status}`
+            `Error fetching flight details: ${bundleResponse.status}`
           );
 
-        const [detailsData, productsData, predictionData, operatorData] = await Promise.all([
-          detailsResponse.json(),
-          productsResponse.json(),
-          predictionResponse.ok ? predictionResponse.json() : null,
-          operatorResponse.ok ? operatorResponse.json() : null,
-        ]);
-
-        setFlightDetails(detailsData);
-        setProducts(productsData.products || []);
-        setConsumptionPredictions(predictionData || {});
-        setRecommendedOperators(operatorData);
+        const bundleData = await bundleResponse.json();
+
+        setFlightDetails(bundleData.flight);
+        setProducts(bundleData.products?.products || []);
+        setConsumptionPredictions(bundleData.consumption_prediction || {});
+        setRecommendedOperators(bundleData.recommended_operators);
       } catch (err) {
         console.error(err);
         setError(err.message);
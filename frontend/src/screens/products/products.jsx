@@ -105,22 +105,18 @@ export function ProductsTable({ onProductSelect }) {
                 setLoading(true);
                 console.log("🔄 Iniciando fetch de datos de productos desde /products...");
 
-                const [productsResponse, statsResponse, categoryResponse, airlineResponse] =
-                    await Promise.all([
-                        fetch("/products/all"),
-                        fetch("/products/dashboard/stats"),
-                        fetch("/products/analysis/category"),
-                        fetch("/products/analysis/airline"),
-                    ]);
-
-                if (!productsResponse.ok) {
+                // Un solo request: el backend carga y enriquece los productos una vez
+                const bundleResponse = await fetch("/bundles/products");
+
+                if (!bundleResponse.ok) {
                     throw new Error("Error fetching products data");
                 }
 
-                const productsData = await productsResponse.json();
-                const statsData = statsResponse.ok ? await statsResponse.json() : null;
-                const categoryData = categoryResponse.ok ? await categoryResponse.json() : { analysis_by_category: {} };
-                const airlineData = airlineResponse.ok ? await airlineResponse.json() : { analysis_by_airline: {} };
+                const bundleData = await bundleResponse.json();
+                const productsData = bundleData.products;
+                const statsData = bundleData.dashboard_stats || null;
+                const categoryData = bundleData.analysis_by_category || { analysis_by_category: {} };
+                const airlineData = bundleData.analysis_by_airline || { analysis_by_airline: {} };
 
                 console.log("📦 Estructura completa de productsData:", productsData);
 